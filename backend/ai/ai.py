@@ -1,18 +1,55 @@
 import litellm
+from litellm.utils import supports_prompt_caching
+import asyncio
 import json
 import base64
-from PIL import Image
-import pytesseract
 import cv2
 import os
+import re
+import time
 import datetime
 from db.db import db
+from ai import memory, ocr, retrieval, usage
 import features.create_functions as create_functions
 import uuid
 
 from dotenv import load_dotenv
 load_dotenv()
 
+# Short conversational turns go to the small model; long turns and anything
+# with an image or document instructions get the large vision model. A call
+# that times out or hits a 5xx is retried once on the other tier.
+SMALL_MODEL = os.getenv("SMALL_MODEL", "anthropic/claude-haiku-4-5-20251001")
+LARGE_MODEL = os.getenv("LARGE_MODEL", "anthropic/claude-sonnet-4-5-20250929")
+FALLBACKS = {
+    SMALL_MODEL: os.getenv("SMALL_FALLBACK_MODEL", LARGE_MODEL),
+    LARGE_MODEL: os.getenv("LARGE_FALLBACK_MODEL", SMALL_MODEL),
+}
+SHORT_TURN_WORDS = int(os.getenv("SHORT_TURN_WORDS", "40"))
+
+# Whole-turn budgets in seconds, tool rounds and fallback included. The device
+# gives up on /transcript/ after 30 s and on a document after 60 s (OCR and
+# upload take part of that), so answer comfortably inside both.
+CHAT_DEADLINE = float(os.getenv("CHAT_DEADLINE", "25"))
+DOCUMENT_DEADLINE = float(os.getenv("DOCUMENT_DEADLINE", "45"))
+# Share of the remaining budget the first model gets, so a hung call still
+# leaves the fallback time to answer
+PRIMARY_SHARE = 0.6
+
+SYSTEM_PROMPT = """You are LILY, an assistant for caregiving. Only call the notify_caretaker tool if the user
+            explicitly asks you to send an alert or notify their caretaker. Never call it on your own judgment.
+            """
+
+# Anthropic caches the prompt up to each block marked with cache_control, so
+# the tools, the system prompt (plus any fixed instructions) and the rolling
+# summary are marked and only the changing tail is billed at full price.
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Caps how many completions this process keeps in flight at once. Turns past the
+# limit wait on the semaphore instead of piling more requests onto the provider.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+_llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
 # take_photo and record_audio removed — the microcontroller is a separate
 # physical device that handles camera and audio itself, posting to the backend
 # over HTTP. The AI never needs to trigger hardware.
@@ -54,8 +91,106 @@ tools = [
 ]
 
 
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
+# Same schemas with a cache breakpoint on the last tool, which covers them all
+cached_tools = [*tools[:-1], {**tools[-1], "cache_control": CACHE_CONTROL}]
+
+
+def supports_caching(model: str) -> bool:
+    try:
+        return supports_prompt_caching(model)
+    except Exception:
+        return False
+
+
+def tools_for(model: str) -> list[dict]:
+    return cached_tools if supports_caching(model) else tools
+
+
+def text_block(text: str, cache: bool = False) -> dict:
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = CACHE_CONTROL
+    return block
+
+
+def pick_model(user_message: str, image=None, instructions: str = None) -> str:
+    if image or instructions or len(user_message.split()) > SHORT_TURN_WORDS:
+        return LARGE_MODEL
+    return SMALL_MODEL
+
+
+def should_fall_back(e: Exception) -> bool:
+    if isinstance(e, (litellm.Timeout, litellm.APIConnectionError, TimeoutError)):
+        return True
+    status = getattr(e, "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+
+def remaining(deadline_at: float, share: float = 1.0) -> float:
+    left = deadline_at - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("LLM deadline exceeded")
+    return left * share
+
+
+def complete(model: str, messages: list, deadline_at: float, **kwargs):
+    """One completion with per-call timeout and a single fallback hop."""
+    fallback = FALLBACKS.get(model) if FALLBACKS.get(model) != model else None
+
+    def attempt(name, share=1.0):
+        start = time.perf_counter()
+        try:
+            response = litellm.completion(
+                model=name, messages=messages, tools=tools_for(name),
+                timeout=remaining(deadline_at, share), max_retries=0, **kwargs
+            )
+        except Exception as e:
+            usage.record_error(name, e)
+            raise
+        usage.record(name, response, latency=time.perf_counter() - start)
+        return response
+
+    try:
+        return attempt(model, PRIMARY_SHARE if fallback else 1.0)
+    except Exception as e:
+        if not fallback or not should_fall_back(e):
+            raise
+        usage.record_fallback(model, fallback, e)
+        return attempt(fallback)
+
+
+async def acomplete(model: str, messages: list, deadline_at: float, **kwargs):
+    """Async complete(). With stream=True the fallback only covers opening the
+    stream; once tokens are flowing a failure is the caller's to handle."""
+    fallback = FALLBACKS.get(model) if FALLBACKS.get(model) != model else None
+
+    async def attempt(name, share=1.0):
+        start = time.perf_counter()
+        try:
+            response = await litellm.acompletion(
+                model=name, messages=messages, tools=tools_for(name),
+                timeout=remaining(deadline_at, share), max_retries=0, **kwargs
+            )
+        except Exception as e:
+            usage.record_error(name, e)
+            raise
+        if not kwargs.get("stream"):
+            usage.record(name, response, latency=time.perf_counter() - start)
+        return name, response
+
+    try:
+        return await attempt(model, PRIMARY_SHARE if fallback else 1.0)
+    except Exception as e:
+        if not fallback or not should_fall_back(e):
+            raise
+        usage.record_fallback(model, fallback, e)
+        return await attempt(fallback)
+
+
+def encode_image(image: str | bytes):
+    if isinstance(image, bytes):
+        return base64.b64encode(image).decode('utf-8')
+    with open(image, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
 
@@ -63,40 +198,16 @@ def build_data_url(base64_string: str, mime_type: str = "image/jpeg") -> str:
     return f"data:{mime_type};base64,{base64_string}"
 
 
-def extract_text_from_image(image_path: str) -> str:
-    image = Image.open(image_path)
-    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-
-    lines = {}
-    for i, word in enumerate(data["text"]):
-        if word.strip() and int(data["conf"][i]) > 0:
-            block_line_key = (data["block_num"][i], data["line_num"][i])
-            if block_line_key not in lines:
-                lines[block_line_key] = {
-                    "words": [],
-                    "x": data["left"][i],
-                    "y": data["top"][i],
-                    "width": data["width"][i],
-                    "height": data["height"][i]
-                }
-            else:
-                lines[block_line_key]["width"] = (data["left"][i] + data["width"][i]) - lines[block_line_key]["x"]
-            lines[block_line_key]["words"].append(word)
-
-    result = ""
-    for global_line_num, (key, line) in enumerate(sorted(lines.items()), start=1):
-        x, y, w, h = line["x"], line["y"], line["width"], line["height"]
-        text = " ".join(line["words"])
-        result += f"[LN:{global_line_num}][{x} {y} {w} {h}] {text}\n"
-
-    return result
+def extract_text_from_image(image: str | bytes) -> str:
+    return ocr.extract_text(image)
 
 
 def get_latest_doc_id(convo_id: str) -> str | None:
-    row = db.execute(
-        "SELECT document_id FROM documents WHERE convo_id = ? ORDER BY created_at DESC LIMIT 1",
-        (convo_id,)
-    ).fetchone()
+    with db.read() as conn:
+        row = conn.execute(
+            "SELECT document_id FROM documents WHERE convo_id = ? ORDER BY created_at DESC LIMIT 1",
+            (convo_id,)
+        ).fetchone()
     return row["document_id"] if row else None
 
 
@@ -123,12 +234,44 @@ def handle_tool(call, convo_id: str = None):
         return {"status": "success"}
 
 
-def run(user_message, model="anthropic/claude-sonnet-4-5-20250929", image: str = None, mime_type: str = "image/jpeg", audio_transcript: str = None, convo_id: str = None):
+def load_history(convo_id: str | None, user_message: str) -> list[dict]:
+    """Summary and recent turns for the prompt. Folds overflow into the summary first."""
+    if not convo_id:
+        return []
+    context = memory.load_context(convo_id, user_message)
+    if context.overflow and memory.compact(convo_id, SMALL_MODEL):
+        context = memory.load_context(convo_id, user_message)
+    return context.messages()
 
-    system = """You are LILY, an assistant for caregiving. Only call the notify_caretaker tool if the user
-            explicitly asks you to send an alert or notify their caretaker. Never call it on your own judgment.
-            """
 
+async def aload_history(convo_id: str | None, user_message: str) -> list[dict]:
+    """Like load_history(), but the summary catches up in the background; this
+    turn goes out with the bounded window it already has."""
+    if not convo_id:
+        return []
+    context = await asyncio.to_thread(memory.load_context, convo_id, user_message)
+    if context.overflow:
+        memory.schedule_compaction(convo_id, SMALL_MODEL)
+    return context.messages()
+
+
+def load_notes(convo_id: str | None, user_message: str, image=None, instructions: str = None) -> str | None:
+    """Past documents and conversations relevant to this turn. Document reads
+    (image or instructions) only report what's on the page, so they get none."""
+    if not convo_id or image or instructions:
+        return None
+    try:
+        return retrieval.recall(convo_id, user_message)
+    except Exception as e:
+        print(f"[retrieval] lookup failed for convo {convo_id}: {e}")
+        return None
+
+
+async def aload_notes(convo_id: str | None, user_message: str, image=None, instructions: str = None) -> str | None:
+    return await asyncio.to_thread(load_notes, convo_id, user_message, image, instructions)
+
+
+def build_messages(user_message, image: str = None, mime_type: str = "image/jpeg", audio_transcript: str = None, history: list[dict] = None, instructions: str = None, cache: bool = False, notes: str = None):
     content = user_message
     if audio_transcript:
         content += f"\n\nAudio transcript: {audio_transcript}"
@@ -139,13 +282,37 @@ def run(user_message, model="anthropic/claude-sonnet-4-5-20250929", image: str =
             {"type": "text", "text": content}
         ]
 
-    messages = [
+    # Stable parts first so they form a cacheable prefix; the breakpoint goes on the last of them
+    system = [text_block(SYSTEM_PROMPT)]
+    if instructions:
+        system.append(text_block(instructions))
+    system[-1] = text_block(system[-1]["text"], cache)
+
+    history = list(history or [])
+    if cache and history and history[0]["role"] == "system":
+        history[0] = {"role": "system", "content": [text_block(history[0]["content"], cache)]}
+
+    # Recalled notes change every turn, so they go after the cached prefix
+    recalled = [{"role": "system", "content": notes}] if notes else []
+
+    return [
         {"role": "system", "content": system},
+        *history,
+        *recalled,
         {"role": "user", "content": content}
     ]
 
+
+def run(user_message, model: str = None, image: str = None, mime_type: str = "image/jpeg", audio_transcript: str = None, convo_id: str = None, instructions: str = None, deadline: float = None):
+    history = load_history(convo_id, user_message)
+    notes = load_notes(convo_id, user_message, image, instructions)
+    model = model or pick_model(user_message, image, instructions)
+    deadline_at = time.monotonic() + (deadline or (DOCUMENT_DEADLINE if image or instructions else CHAT_DEADLINE))
+    cache = supports_caching(model)
+    messages = build_messages(user_message, image, mime_type, audio_transcript, history, instructions, cache, notes)
+
     while True:
-        response = litellm.completion(model=model, messages=messages, tools=tools)
+        response = complete(model, messages, deadline_at)
         msg = response.choices[0].message
 
         if msg.tool_calls:
@@ -161,17 +328,110 @@ def run(user_message, model="anthropic/claude-sonnet-4-5-20250929", image: str =
             return msg.content
 
 
-def document_summary(image_path: str):
-    extracted_text = extract_text_from_image(image_path)
-    image_b64 = encode_image(image_path)
+async def ahandle_tool(call, convo_id: str = None):
+    if call.function.name == "analyze_document":
+        args = json.loads(call.function.arguments)
+        return await adocument_summary(args["text"])
 
-    prompt = f"""You are a document scanner. Your only job is to report what is physically present in this document.
+    # notify_caretaker only touches the DB, so hand it to a worker thread
+    return await asyncio.to_thread(handle_tool, call, convo_id)
 
-                <extracted_text>
-                {extracted_text}
-                </extracted_text>
 
-                Using ONLY the extracted text above, provide:
+async def arun(user_message, model: str = None, image: str = None, mime_type: str = "image/jpeg", audio_transcript: str = None, convo_id: str = None, instructions: str = None, deadline: float = None):
+    """Async twin of run(): the event loop stays free while the model thinks, and
+    every tool call from one assistant message is executed concurrently."""
+    history, notes = await asyncio.gather(
+        aload_history(convo_id, user_message),
+        aload_notes(convo_id, user_message, image, instructions)
+    )
+    model = model or pick_model(user_message, image, instructions)
+    deadline_at = time.monotonic() + (deadline or (DOCUMENT_DEADLINE if image or instructions else CHAT_DEADLINE))
+    cache = supports_caching(model)
+    messages = build_messages(user_message, image, mime_type, audio_transcript, history, instructions, cache, notes)
+
+    while True:
+        async with _llm_slots:
+            _, response = await acomplete(model, messages, deadline_at)
+        msg = response.choices[0].message
+
+        if msg.tool_calls:
+            messages.append(msg)
+            results = await asyncio.gather(
+                *(ahandle_tool(call, convo_id=convo_id) for call in msg.tool_calls)
+            )
+            for call, result in zip(msg.tool_calls, results):
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": call.id,
+                    "content": str(result),
+                })
+        else:
+            return msg.content
+
+
+async def astream_run(user_message, model: str = None, image: str = None, mime_type: str = "image/jpeg", audio_transcript: str = None, convo_id: str = None, instructions: str = None, deadline: float = None):
+    """Streaming variant of arun(): yields text deltas as the model produces them.
+    Tool rounds are resolved in between, so only the spoken answer is yielded."""
+    history, notes = await asyncio.gather(
+        aload_history(convo_id, user_message),
+        aload_notes(convo_id, user_message, image, instructions)
+    )
+    model = model or pick_model(user_message, image, instructions)
+    deadline_at = time.monotonic() + (deadline or (DOCUMENT_DEADLINE if image or instructions else CHAT_DEADLINE))
+    cache = supports_caching(model)
+    messages = build_messages(user_message, image, mime_type, audio_transcript, history, instructions, cache, notes)
+
+    while True:
+        chunks = []
+        start = time.perf_counter()
+        async with _llm_slots:
+            used, stream = await acomplete(model, messages, deadline_at, stream=True, stream_options={"include_usage": True})
+            async for chunk in stream:
+                chunks.append(chunk)
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+        response = litellm.stream_chunk_builder(chunks, messages=messages)
+        usage.record(used, response, "stream", latency=time.perf_counter() - start)
+        msg = response.choices[0].message
+
+        if not msg.tool_calls:
+            return
+
+        messages.append(msg)
+        results = await asyncio.gather(
+            *(ahandle_tool(call, convo_id=convo_id) for call in msg.tool_calls)
+        )
+        for call, result in zip(msg.tool_calls, results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call.id,
+                "content": str(result),
+            })
+
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+async def stream_sentences(deltas):
+    """Regroups a stream of text deltas into whole sentences so TTS on the
+    device always gets something it can pronounce naturally."""
+    buffer = ""
+    async for delta in deltas:
+        buffer += delta
+        *sentences, buffer = SENTENCE_END.split(buffer)
+        for sentence in sentences:
+            if sentence.strip():
+                yield sentence.strip()
+
+    if buffer.strip():
+        yield buffer.strip()
+
+
+DOCUMENT_INSTRUCTIONS = """You are a document scanner. Your only job is to report what is physically present in this document.
+
+                Using ONLY the extracted text in the user message, provide:
                 1. The heading for section and what it contains
                 2. A concise summary of the most important sections
                 3. Any fields that require action (e.g. signature required, date needed, checkbox unchecked)
@@ -182,7 +442,27 @@ def document_summary(image_path: str):
                 - Do NOT make inferences
                 - Only report what is literally there"""
 
-    return run(prompt, image=image_b64)
+
+def document_prompt(extracted_text: str) -> str:
+    # The fixed instructions go in the (cached) system prompt; only the text varies
+    return f"""<extracted_text>
+                {extracted_text}
+                </extracted_text>"""
+
+
+def document_summary(image_path: str):
+    extracted_text = extract_text_from_image(image_path)
+    image_b64 = encode_image(image_path)
+
+    return run(document_prompt(extracted_text), image=image_b64, instructions=DOCUMENT_INSTRUCTIONS)
+
+
+async def adocument_summary(image: str | bytes, extracted_text: str = None):
+    if extracted_text is None:
+        extracted_text = await asyncio.to_thread(extract_text_from_image, image)
+    image_b64 = await asyncio.to_thread(encode_image, image)
+
+    return await arun(document_prompt(extracted_text), image=image_b64, instructions=DOCUMENT_INSTRUCTIONS)
 
 
 def start_conversation(needer_id: str):
@@ -212,7 +492,7 @@ def start_conversation(needer_id: str):
 
 if __name__ == "__main__":
     test_user_id = str(uuid.uuid4())
-    db.execute("INSERT INTO users (id, provider, subject) VALUES (?, ?, ?)", (test_user_id, "email", "test@test.com"))
-    db.execute("INSERT INTO careneeders (user_id, first_name, last_name) VALUES (?, ?, ?)", (test_user_id, "Test", "User"))
-    db.commit()
+    with db.write() as conn:
+        conn.execute("INSERT INTO users (id, provider, subject) VALUES (?, ?, ?)", (test_user_id, "email", "test@test.com"))
+        conn.execute("INSERT INTO careneeders (user_id, first_name, last_name) VALUES (?, ?, ?)", (test_user_id, "Test", "User"))
     start_conversation(test_user_id)
\ No newline at end of file
@@ -0,0 +1,56 @@
+# bench_memory.py
+#
+# Prompt size as a conversation grows: plays N turns into a throwaway
+# database and prints how many history tokens LILY's prompt carries and how
+# often the summarizer ran. The summarizer is stubbed (it just truncates), so
+# no API key is needed; what matters is that the prompt stays flat:
+#
+#     cd backend && python -m ai.bench_memory [turns]
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from db import migrations
+from ai import memory
+from features.create_functions import create_convo, create_transcript_item
+
+NEEDER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def fake_completion(model, messages, max_tokens):
+    fake_completion.calls += 1
+    prompt = messages[0]["content"]
+    text = prompt[prompt.index("<new_turns>"):][:max_tokens * 3]
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+fake_completion.calls = 0
+
+
+def main(turns: int) -> None:
+    migrations.migrate()
+    memory.litellm = SimpleNamespace(completion=fake_completion)
+    convo_id = create_convo(NEEDER_ID)
+
+    print(f"{'turn':>6} {'history tokens':>15} {'turns kept':>11} {'load ms':>8} {'summaries':>10}")
+    for turn in range(1, turns + 1):
+        create_transcript_item(convo_id, "careneeder", f"Turn {turn}: can you remind me about the pharmacy appointment on Tuesday? " * 2)
+        start = time.perf_counter()
+        context = memory.load_context(convo_id, None)
+        if context.overflow:
+            memory.compact(convo_id, "stub")
+            context = memory.load_context(convo_id, None)
+        elapsed = time.perf_counter() - start
+        create_transcript_item(convo_id, "LILY", f"Of course. Your appointment is on Tuesday at ten, turn {turn}.")
+
+        if turn in (1, 10, 50, 100, 250, 500, 1000) or turn == turns:
+            tokens = sum(memory.estimate_tokens(m["content"]) for m in context.messages())
+            print(f"{turn:>6} {tokens:>15} {len(context.turns):>11} {elapsed * 1000:>8.2f} {fake_completion.calls:>10}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
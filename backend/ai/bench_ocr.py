@@ -0,0 +1,81 @@
+# ai/bench_ocr.py
+#
+# Time per image and word accuracy of extract_text_from_image, with and
+# without the preprocessing stage, then throughput per core of each OCR
+# backend that is installed (one thread, then OCR_THREADS threads sharing the
+# engine pool). A fixture is any image; if a .txt with the same name sits next
+# to it, that is the ground truth for word accuracy. By default it runs on the
+# scanned testdocument.jpeg plus the synthetic skewed, tall and low-contrast
+# fixtures that ai/make_ocr_fixtures.py writes to fixtures/ocr/.
+#
+#     cd backend && python -m ai.bench_ocr [image ...]
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from ai import ocr
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_FIXTURES = [BACKEND_DIR / "testdocument.jpeg", *sorted((BACKEND_DIR / "fixtures" / "ocr").glob("*.jpg"))]
+LINE_PREFIX = re.compile(r"^\[LN:\d+\]\[[-\d ]+\] ", re.MULTILINE)
+
+
+def words(text: str) -> Counter:
+    return Counter(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def word_accuracy(output: str, truth: str) -> float:
+    # Share of ground-truth words (with multiplicity) that the OCR recovered
+    expected = words(truth)
+    found = words(LINE_PREFIX.sub("", output))
+    return sum((expected & found).values()) / max(1, sum(expected.values()))
+
+
+def raw_extract(image_path: str) -> str:
+    # The old path: the camera frame straight into Tesseract (the same engine), no cleanup or tiling
+    gray = np.asarray(Image.open(image_path).convert("L"))
+    return ocr.group_lines([(0, 0, 1.0, ocr.ocr_tile(gray))])
+
+
+def bench(image_path: Path, repeat: int = 3) -> None:
+    truth_path = image_path.with_suffix(".txt")
+    truth = truth_path.read_text() if truth_path.exists() else None
+
+    for name, extract in (("raw", raw_extract), ("preprocessed", ocr.extract_text)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = extract(str(image_path))
+            timings.append(time.perf_counter() - start)
+        accuracy = f"{word_accuracy(output, truth):6.1%}" if truth else "   n/a"
+        print(f"{image_path.name:<24} {name:<13} {min(timings) * 1000:8.0f} ms  accuracy {accuracy}")
+
+
+def throughput(fixtures: list[Path], rounds: int = 5) -> None:
+    images = [p.read_bytes() for p in fixtures] * rounds
+    for backend in ("pytesseract", "tesserocr"):
+        try:
+            ocr.extract_text(images[0], backend)     # start an engine and fill the page cache
+        except Exception as e:
+            print(f"{backend:<13} unavailable: {type(e).__name__}: {e}")
+            continue
+
+        for threads in sorted({1, ocr.OCR_THREADS}):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(lambda image: ocr.extract_text(image, backend), images))
+            elapsed = time.perf_counter() - start
+            print(f"{backend:<13} {threads:>2} thread(s) {len(images) / elapsed:7.2f} images/s  {len(images) / elapsed / threads:7.2f} images/s per core")
+
+
+if __name__ == "__main__":
+    fixtures = [Path(p) for p in sys.argv[1:]] or DEFAULT_FIXTURES
+    for fixture in fixtures:
+        bench(fixture)
+    throughput(fixtures)
@@ -0,0 +1,77 @@
+# bench_retrieval.py
+#
+# Semantic lookup latency as a needer's history grows: seeds N chunks for one
+# needer (and as many again for others, so the scoping is exercised) into a
+# throwaway database and vector file, then times retrieval.search(). Seeded
+# vectors are random, since the point is the gather-and-rank cost, not
+# relevance; the query is embedded for real with whichever model is active:
+#
+#     cd backend && python -m ai.bench_retrieval [chunks]
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import numpy as np
+
+from db.db import db
+from db import migrations
+from ai import retrieval
+
+QUERIES = (
+    "what did that letter from the clinic say",
+    "when is my next appointment",
+    "did the pharmacy call about my refill",
+)
+
+
+def seed(needer_id: str, chunks: int, rng: np.random.Generator) -> None:
+    model = retrieval.embedder()
+    store = retrieval.vector_file(model.name, model.dim, needer_id)
+    for start in range(0, chunks, 10_000):
+        n = min(10_000, chunks - start)
+        vectors = rng.standard_normal((n, model.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        with db.write() as conn:
+            first = store.append(vectors)
+            conn.executemany(
+                "INSERT INTO embedding_chunks (model, row, needer_id, kind, ref_id, convo_id, at, text) VALUES (?, ?, ?, ?, ?, NULL, ?, ?)",
+                [(model.name, first + i, needer_id, "document" if i % 5 == 0 else "transcript", str(uuid.uuid4()), time.time(), f"chunk {start + i}")
+                 for i in range(n)]
+            )
+
+
+def main(chunks: int) -> None:
+    migrations.migrate()
+    model = retrieval.embedder()
+    needer_id, other_id = str(uuid.uuid4()), str(uuid.uuid4())
+    rng = np.random.default_rng(7)
+
+    start = time.perf_counter()
+    seed(needer_id, chunks, rng)
+    seed(other_id, chunks, rng)
+    print(f"model={model.name} dim={model.dim}: seeded {2 * chunks} chunks in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    for q in QUERIES * 10:
+        model.embed_query(q)
+    print(f"query embedding: {(time.perf_counter() - start) / (len(QUERIES) * 10) * 1000:.2f} ms")
+
+    with db.read() as conn:
+        retrieval.search(conn, needer_id, QUERIES[0])     # map the file
+        timings = []
+        for _ in range(20):
+            for q in QUERIES:
+                start = time.perf_counter()
+                hits = retrieval.search(conn, needer_id, q)
+                timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"search over {chunks} chunks: p50 {statistics.median(timings):.2f} ms  p95 {timings[int(len(timings) * 0.95)]:.2f} ms  ({len(hits)} hits)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30_000)
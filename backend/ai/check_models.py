@@ -0,0 +1,151 @@
+# check_models.py
+#
+# Regression check for model tiering and fallback, run against a local mock
+# OpenAI-compatible completion server (no API keys, no network). Each mock
+# model is told how to misbehave: answer, hang past the deadline, or fail with
+# a 5xx / 4xx. Exits non-zero on the first wrong routing decision:
+#
+#     cd backend && python -m ai.check_models
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BEHAVIOUR = {}      # mock model name -> "ok" | "slow" | "500" | "400"
+SERVED = []         # model names that actually answered, in order
+
+
+class MockCompletions(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        try:
+            self.respond()
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # the client gave up on a slow answer, as intended
+
+    def respond(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        model = body["model"]
+        behaviour = BEHAVIOUR.get(model, "ok")
+        if behaviour == "slow":
+            time.sleep(10)
+        if behaviour in ("500", "400"):
+            self.send_response(int(behaviour))
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": {"message": f"mock {behaviour}", "type": "mock"}}).encode())
+            return
+
+        SERVED.append(model)
+        text = f"reply from {model}."
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for delta in ({"role": "assistant", "content": text}, {}):
+                chunk = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None if delta else "stop"}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            usage = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": model, "choices": [],
+                     "usage": {"prompt_tokens": 10, "completion_tokens": 4, "total_tokens": 14}}
+            self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+            return
+
+        payload = {
+            "id": "c", "object": "chat.completion", "created": 0, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 4, "total_tokens": 14},
+        }
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), MockCompletions)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+os.environ.update(
+    OPENAI_API_KEY="mock",
+    OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_port}/v1",
+    SMALL_MODEL="openai/small",
+    LARGE_MODEL="openai/large",
+)
+
+from ai import ai, usage
+
+failures = 0
+
+
+def check(name: str, condition: bool) -> None:
+    global failures
+    print(f"{'ok' if condition else 'FAIL':<5} {name}")
+    failures += not condition
+
+
+def scenario(small: str = "ok", large: str = "ok") -> None:
+    BEHAVIOUR.update(small=small, large=large)
+    SERVED.clear()
+
+
+async def main() -> None:
+    scenario()
+    reply = await ai.arun("what's on my calendar today")
+    check("short turn goes to the small model", SERVED == ["small"] and reply == "reply from small.")
+
+    scenario()
+    await ai.arun("tell me about the letter " * 30)
+    check("long turn goes to the large model", SERVED == ["large"])
+
+    scenario()
+    await ai.arun("summarize", instructions="document instructions")
+    check("document prompt goes to the large model", SERVED == ["large"])
+
+    scenario(small="500")
+    reply = await ai.arun("hello there")
+    check("5xx falls back to the large model", SERVED == ["large"] and reply == "reply from large.")
+
+    scenario(small="slow")
+    start = time.monotonic()
+    reply = await ai.arun("hello there", deadline=6)
+    check("timeout falls back within the deadline", SERVED == ["large"] and time.monotonic() - start < 6)
+
+    scenario(small="400")
+    try:
+        await ai.arun("hello there")
+        check("4xx is not retried on another model", False)
+    except Exception:
+        check("4xx is not retried on another model", SERVED == [])
+
+    scenario(small="slow", large="slow")
+    start = time.monotonic()
+    try:
+        await ai.arun("hello there", deadline=1.5)
+        check("deadline is enforced across the fallback", False)
+    except Exception:
+        check("deadline is enforced across the fallback", time.monotonic() - start < 2.5)
+
+    scenario(small="500")
+    sentences = [s async for s in ai.stream_sentences(ai.astream_run("hello there"))]
+    check("streaming falls back before the first token", sentences == ["reply from large."])
+
+    scenario()
+    reply = await asyncio.to_thread(ai.run, "hello there")
+    check("sync run uses the same policy", SERVED == ["small"] and reply == "reply from small.")
+
+    stats = usage.stats()
+    check("per-model metrics recorded", stats["openai/small"]["errors"] >= 3 and stats["openai/small"]["fallbacks"] >= 3
+          and stats["openai/large"]["calls"] >= 5 and stats["openai/large"]["latency_ms_avg"] > 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    server.shutdown()
+    sys.exit(1 if failures else 0)
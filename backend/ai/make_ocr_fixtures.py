@@ -0,0 +1,143 @@
+# ai/make_ocr_fixtures.py
+#
+# Writes the synthetic OCR fixtures in fixtures/ocr/ that bench_ocr runs on
+# next to testdocument.jpeg. Each one stresses a different preprocessing step,
+# and the text it was rendered from is saved beside it as ground truth:
+#   - skewed_letter:       a letter photographed 7° off square (deskew)
+#   - tall_receipt:        a long pharmacy receipt, several tiles tall (tiling)
+#   - low_contrast_notice: faint print under a shadow, with sensor noise (binarize)
+# Rendering uses Pillow's bundled font and a fixed seed, so re-running gives
+# the same images:
+#
+#     cd backend && python -m ai.make_ocr_fixtures
+import textwrap
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+FIXTURE_DIR = Path(__file__).resolve().parent.parent / "fixtures" / "ocr"
+
+LETTER = """\
+Riverside Family Clinic
+220 Oak Street, Springfield
+March 3, 2026
+Dear Mrs. Washington,
+This letter is to remind you of your follow-up appointment with Dr. Alvarez on Tuesday, March 17 at 10:30 AM. Please arrive fifteen minutes early to update your insurance information at the front desk.
+Bring a list of all medicines you are taking, including vitamins and supplements. Do not eat or drink anything except water after midnight before your visit, because we will draw blood for your cholesterol test.
+If you need to reschedule, call our office at 555-201-4477 at least two days before your appointment. A fee of 25 dollars may apply to missed visits.
+Sincerely,
+Maria Lopez
+Patient Services Coordinator
+"""
+
+RECEIPT_HEADER = """\
+GREENLEAF PHARMACY
+Store 1042 Main Street
+Phone 555-310-8800
+Patient: Gertrude Washington
+Date: 02/27/2026 Time: 14:32
+"""
+
+RECEIPT_ITEMS = [
+    ("Lisinopril 10 mg tablets", "30", "4.00"),
+    ("Metformin 500 mg tablets", "60", "6.50"),
+    ("Atorvastatin 20 mg tablets", "30", "9.25"),
+    ("Vitamin D3 1000 IU softgels", "90", "11.99"),
+    ("Aspirin low dose 81 mg", "120", "5.49"),
+    ("Omeprazole 20 mg capsules", "14", "8.79"),
+    ("Calcium 600 mg tablets", "60", "7.39"),
+    ("Saline nasal spray", "1", "3.99"),
+    ("Blood pressure monitor cuff", "1", "39.95"),
+    ("Glucose test strips", "50", "24.50"),
+    ("Lancets sterile", "100", "6.25"),
+    ("Cotton balls", "200", "2.79"),
+    ("Hand lotion unscented", "1", "5.59"),
+    ("Reading glasses plus two", "1", "14.99"),
+    ("Pill organizer weekly", "1", "4.49"),
+    ("Compression socks medium", "2", "18.00"),
+    ("Antacid chewable tablets", "96", "7.89"),
+    ("Eye drops lubricant", "1", "9.49"),
+    ("Bandages assorted", "60", "4.99"),
+    ("Thermometer digital", "1", "12.49"),
+]
+
+RECEIPT_FOOTER = """\
+Subtotal 218.71
+Insurance paid 142.50
+Tax 3.84
+Total due 80.05
+Paid with card ending 4417
+Refills remaining for Lisinopril: 3
+Refills remaining for Metformin: 5
+Ask your pharmacist about flu shots this season.
+Thank you for choosing Greenleaf Pharmacy.
+"""
+
+NOTICE = """\
+SPRINGFIELD WATER AND POWER
+Final Notice Before Service Interruption
+Account number 7730-2291-05
+Our records show a past due balance of 146.20 dollars on your account. To avoid interruption of service, payment must be received by April 2, 2026.
+You can pay online, by phone at 555-400-9100, or in person at any customer service center. If you have already paid, please disregard this notice.
+Customers over age 65 may qualify for a medical certificate or a payment plan. Call us to learn whether you are eligible.
+"""
+
+
+def render(lines: list[str], width: int, font_size: int, margin: int, ink: int = 20, spacing: float = 1.6) -> Image.Image:
+    font = ImageFont.load_default(size=font_size)
+    line_height = int(font_size * spacing)
+    page = Image.new("L", (width, margin * 2 + line_height * len(lines)), 255)
+    draw = ImageDraw.Draw(page)
+    for i, line in enumerate(lines):
+        draw.text((margin, margin + i * line_height), line, fill=ink, font=font)
+    return page
+
+
+def wrap(text: str, columns: int) -> list[str]:
+    lines = []
+    for paragraph in text.splitlines():
+        lines.extend(textwrap.wrap(paragraph, columns) or [""])
+    return lines
+
+
+def with_noise(page: np.ndarray, sigma: float, rng: np.random.Generator) -> np.ndarray:
+    return np.clip(page.astype(np.float32) + rng.normal(0, sigma, page.shape), 0, 255).astype(np.uint8)
+
+
+def skewed_letter(rng: np.random.Generator) -> tuple[Image.Image, str]:
+    page = render(wrap(LETTER, 60), width=1700, font_size=34, margin=120)
+    page = page.rotate(7, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return Image.fromarray(with_noise(np.asarray(page), 4, rng)), LETTER
+
+
+def tall_receipt(rng: np.random.Generator) -> tuple[Image.Image, str]:
+    items = []
+    for i, (name, qty, price) in enumerate(RECEIPT_ITEMS):
+        items += [f"{name:<30} x{qty:>4} {price:>7}", f"  Rx {4471200 + 37 * i} filled by K. Patel"]
+    lines = RECEIPT_HEADER.splitlines() + [""] + items + [""] + RECEIPT_FOOTER.splitlines()
+    page = render(lines, width=1000, font_size=30, margin=60, spacing=1.9)
+    truth = "\n".join(lines)
+    return Image.fromarray(with_noise(np.asarray(page), 3, rng)), truth
+
+
+def low_contrast_notice(rng: np.random.Generator) -> tuple[Image.Image, str]:
+    page = np.asarray(render(wrap(NOTICE, 58), width=1600, font_size=34, margin=110, ink=130)).astype(np.float32)
+    # A shadow falling across the page: paper goes from white to mid gray
+    h, w = page.shape
+    shadow = np.linspace(1.0, 0.62, w)[None, :] * np.linspace(1.0, 0.85, h)[:, None]
+    return Image.fromarray(with_noise(page * shadow, 6, rng)), NOTICE
+
+
+def main() -> None:
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(7)
+    for make in (skewed_letter, tall_receipt, low_contrast_notice):
+        image, truth = make(rng)
+        image.save(FIXTURE_DIR / f"{make.__name__}.jpg", quality=85)
+        (FIXTURE_DIR / f"{make.__name__}.txt").write_text(truth)
+        print(f"{make.__name__}: {image.size[0]}x{image.size[1]}")
+
+
+if __name__ == "__main__":
+    main()
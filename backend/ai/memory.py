@@ -0,0 +1,183 @@
+# ai/memory.py
+#
+# What LILY remembers of a conversation. Replaying every transcript item would
+# make each turn slower and pricier than the last, so the prompt instead gets
+#   - a rolling summary of older turns, kept in convo_memory
+#   - the most recent turns that fit in MEMORY_TOKEN_BUDGET
+# Turns that fall out of the window are folded into the summary in batches
+# (down to half the budget), so the summarizer runs every few turns rather
+# than on every one, and prompt size stays flat however long the convo gets.
+import asyncio
+import os
+from dataclasses import dataclass, field
+
+import litellm
+
+from ai import usage
+from db.db import db
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "20"))
+SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+FOLD_BATCH = 200
+
+SPEAKER_ROLES = {"careneeder": "user", "LILY": "assistant"}
+
+SUMMARY_PROMPT = """You maintain LILY's memory of a conversation with the person she cares for.
+Rewrite the summary so it also covers the new turns. Keep facts that may matter later:
+names, appointments, medications, documents discussed, requests and promises made.
+Drop small talk. Write plain sentences, at most {max_words} words.
+
+<summary>
+{summary}
+</summary>
+
+<new_turns>
+{turns}
+</new_turns>"""
+
+_compacting: set[str] = set()
+_background: set[asyncio.Task] = set()
+
+
+@dataclass
+class Context:
+    summary: str = ""
+    turns: list[dict] = field(default_factory=list)   # oldest first, as chat messages
+    overflow: bool = False                            # unsummarized turns were left out
+
+    def messages(self) -> list[dict]:
+        summary = [{"role": "system", "content": f"Summary of the conversation so far:\n{self.summary}"}] if self.summary else []
+        return summary + self.turns
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per English token; good enough for budgeting and far
+    # cheaper than running a tokenizer on every turn
+    return len(text) // 4 + 1
+
+
+def _memory_row(conn, convo_id: str) -> tuple[str, int]:
+    row = conn.execute("SELECT summary, summarized_rowid FROM convo_memory WHERE convo_id = ?", (convo_id,)).fetchone()
+    return (row["summary"], row["summarized_rowid"]) if row else ("", 0)
+
+
+def _recent(conn, convo_id: str, after_rowid: int, limit: int) -> list:
+    """Unsummarized turns, newest first."""
+    return conn.execute(
+        "SELECT rowid AS _rowid, speaker, content FROM transcript_items WHERE convo_id = ? AND rowid > ? ORDER BY timestamp DESC, rowid DESC LIMIT ?",
+        (convo_id, after_rowid, limit)
+    ).fetchall()
+
+
+def _window(rows: list, budget: int) -> int:
+    """How many of `rows` (newest first) fit in `budget` tokens."""
+    used = 0
+    for i, row in enumerate(rows):
+        used += estimate_tokens(row["content"])
+        if used > budget:
+            return i
+    return len(rows)
+
+
+def load_context(convo_id: str, user_message: str | None = None) -> Context:
+    """
+    Summary plus recent turns for `convo_id`. The routes store the user's
+    utterance as soon as it is heard, before calling the model, so if the
+    newest turn is `user_message` it is skipped here rather than sent twice.
+    """
+    with db.read() as conn:
+        summary, summarized_rowid = _memory_row(conn, convo_id)
+        rows = _recent(conn, convo_id, summarized_rowid, MEMORY_MAX_TURNS + 2)
+
+    if rows and rows[0]["speaker"] == "careneeder" and rows[0]["content"] == user_message:
+        rows = rows[1:]
+
+    kept = min(_window(rows, MEMORY_TOKEN_BUDGET - estimate_tokens(summary)), MEMORY_MAX_TURNS)
+    overflow = kept < len(rows)
+    turns = [{"role": SPEAKER_ROLES.get(row["speaker"], "user"), "content": row["content"]} for row in reversed(rows[:kept])]
+
+    # The model wants the history to open with the user speaking
+    while turns and turns[0]["role"] != "user":
+        turns.pop(0)
+    return Context(summary, turns, overflow)
+
+
+def _pending_fold(convo_id: str) -> tuple[str, list] | None:
+    """The current summary and the oldest unsummarized turns that no longer fit in half the budget."""
+    with db.read() as conn:
+        summary, summarized_rowid = _memory_row(conn, convo_id)
+        rows = _recent(conn, convo_id, summarized_rowid, MEMORY_MAX_TURNS + 2)
+        kept = min(_window(rows, MEMORY_TOKEN_BUDGET // 2), MEMORY_MAX_TURNS // 2)
+        if kept == len(rows):
+            return None
+        keep_from = rows[kept - 1]["_rowid"] if kept else rows[0]["_rowid"] + 1
+        fold = conn.execute(
+            "SELECT rowid AS _rowid, speaker, content FROM transcript_items WHERE convo_id = ? AND rowid > ? AND rowid < ? ORDER BY timestamp, rowid LIMIT ?",
+            (convo_id, summarized_rowid, keep_from, FOLD_BATCH)
+        ).fetchall()
+    return (summary, fold) if fold else None
+
+
+def _summary_request(summary: str, fold: list, model: str) -> dict:
+    turns = "\n".join(f"{row['speaker']}: {row['content']}" for row in fold)
+    prompt = SUMMARY_PROMPT.format(summary=summary or "(empty)", turns=turns, max_words=SUMMARY_MAX_TOKENS * 3 // 4)
+    return {"model": model, "messages": [{"role": "user", "content": prompt}], "max_tokens": SUMMARY_MAX_TOKENS}
+
+
+def _save(convo_id: str, summary: str, summarized_rowid: int) -> None:
+    with db.write() as conn:
+        # Never move the watermark backwards if two compactions raced
+        conn.execute(
+            """
+            INSERT INTO convo_memory (convo_id, summary, summarized_rowid) VALUES (?, ?, ?)
+            ON CONFLICT(convo_id) DO UPDATE SET
+                summary = excluded.summary,
+                summarized_rowid = excluded.summarized_rowid,
+                updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+            WHERE convo_memory.summarized_rowid < excluded.summarized_rowid
+            """,
+            (convo_id, summary, summarized_rowid)
+        )
+
+
+def compact(convo_id: str, model: str) -> bool:
+    """Folds overflowing turns into the summary. Returns whether anything changed."""
+    pending = _pending_fold(convo_id)
+    if pending is None:
+        return False
+    summary, fold = pending
+    response = litellm.completion(**_summary_request(summary, fold, model))
+    usage.record(model, response, "memory summary")
+    _save(convo_id, response.choices[0].message.content.strip(), fold[-1]["_rowid"])
+    return True
+
+
+async def acompact(convo_id: str, model: str) -> bool:
+    pending = await asyncio.to_thread(_pending_fold, convo_id)
+    if pending is None:
+        return False
+    summary, fold = pending
+    response = await litellm.acompletion(**_summary_request(summary, fold, model))
+    usage.record(model, response, "memory summary")
+    await asyncio.to_thread(_save, convo_id, response.choices[0].message.content.strip(), fold[-1]["_rowid"])
+    return True
+
+
+def schedule_compaction(convo_id: str, model: str) -> None:
+    """Runs acompact in the background so the turn that triggered it isn't kept waiting."""
+    if convo_id in _compacting:
+        return
+    _compacting.add(convo_id)
+
+    async def job():
+        try:
+            await acompact(convo_id, model)
+        except Exception as e:
+            print(f"[memory] compaction failed for convo {convo_id}: {e}")
+        finally:
+            _compacting.discard(convo_id)
+
+    task = asyncio.create_task(job())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
@@ -0,0 +1,361 @@
+# ai/ocr.py
+#
+# Image cleanup and line grouping around Tesseract. Camera frames are large,
+# noisy and slightly rotated; shrinking them to ~300 DPI, binarizing and
+# straightening first makes Tesseract both faster and more accurate.
+#
+# Recognition goes through an engine pool. With tesserocr installed each
+# engine is a Tesseract API instance that loads its language data once and is
+# reused for every tile; otherwise pytesseract runs the tesseract binary per
+# tile (a fork, a temp file and a language-data load each time).
+#
+# OCR_THREADS engines (and tile threads) per process. The document worker's
+# OCR processes each get their share of the cores through warm_up(), so a box
+# runs about one engine per core in total.
+import contextlib
+import functools
+import io
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image, ImageSequence
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+PAGE_WIDTH_INCHES = 8.5                      # assume the photo spans a letter-size page
+MAX_DESKEW_DEGREES = 15.0
+TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", str(OCR_TARGET_DPI * 4)))
+PROBE_HEIGHT = int(OCR_TARGET_DPI * 1.5)    # rows probe_text() reads: a few lines of body text
+OCR_THREADS = int(os.getenv("OCR_THREADS", str(os.cpu_count() or 1)))
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")      # auto, tesserocr or pytesseract
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+DATA_KEYS = ("text", "conf", "block_num", "line_num", "left", "top", "width", "height")
+
+# Where distro and Homebrew packages put the language data. The tesserocr wheel
+# bundles its own libtesseract, which doesn't know about any of them.
+TESSDATA_DIRS = (
+    "/usr/share/tesseract-ocr/5/tessdata",
+    "/usr/share/tesseract-ocr/4.00/tessdata",
+    "/usr/share/tessdata",
+    "/usr/local/share/tessdata",
+    "/opt/homebrew/share/tessdata",
+)
+
+
+def load_pages(image: str | bytes) -> list[np.ndarray]:
+    """Every page of the image as a grayscale array (TIFF/PDF-style multi-frame images give several)."""
+    with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as image:
+        return [np.asarray(frame.convert("L")) for frame in ImageSequence.Iterator(image)]
+
+
+def downscale(gray: np.ndarray) -> tuple[np.ndarray, float]:
+    target_width = int(PAGE_WIDTH_INCHES * OCR_TARGET_DPI)
+    scale = min(1.0, target_width / gray.shape[1])
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+
+def deskew(gray: np.ndarray) -> np.ndarray:
+    # The min-area rectangle around all ink gives the dominant text angle
+    ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return gray
+
+    # OpenCV versions disagree on the angle range; fold it into [-45, 45)
+    angle = (cv2.minAreaRect(points)[2] + 45) % 90 - 45
+    if abs(angle) < 0.3 or abs(angle) > MAX_DESKEW_DEGREES:
+        return gray
+
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    # Adaptive threshold copes with shadows and uneven phone-camera lighting
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+def preprocess(gray: np.ndarray) -> tuple[np.ndarray, float]:
+    gray, scale = downscale(gray)
+    return binarize(deskew(gray)), scale
+
+
+def _emptiest_row(ink_per_row: np.ndarray, target: int, window: int) -> int:
+    lo, hi = max(0, target - window), min(len(ink_per_row), target + window)
+    return lo + int(np.argmin(ink_per_row[lo:hi])) if hi > lo else target
+
+
+def split_tiles(binary: np.ndarray, tile_height: int = TILE_HEIGHT) -> list[tuple[int, np.ndarray]]:
+    """
+    Cuts a tall page into horizontal strips of about `tile_height` rows so they
+    can be OCR'd in parallel. Each cut lands on the emptiest row near the
+    target so no text line is sliced in half.
+    """
+    h = binary.shape[0]
+    if h <= tile_height * 1.5:
+        return [(0, binary)]
+
+    ink_per_row = (binary < 128).sum(axis=1)
+    window = tile_height // 4
+    cuts = [0]
+    while h - cuts[-1] > tile_height * 1.5:
+        cuts.append(_emptiest_row(ink_per_row, cuts[-1] + tile_height, window))
+    cuts.append(h)
+
+    return [(top, binary[top:bottom]) for top, bottom in zip(cuts, cuts[1:])]
+
+
+class PytesseractEngine:
+    """Runs the tesseract binary once per call."""
+
+    name = "pytesseract"
+
+    def image_to_data(self, tile: np.ndarray) -> dict:
+        return pytesseract.image_to_data(Image.fromarray(tile), lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+
+    def close(self) -> None:
+        pass
+
+
+class TesserocrEngine:
+    """
+    One initialized Tesseract instance. Not thread-safe, so the pool hands it
+    to one thread at a time; recognition itself releases the GIL. Returns the
+    word rows of pytesseract's image_to_data dict, which is all group_lines
+    reads.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        self.api = tesserocr.PyTessBaseAPI(path=tessdata_dir() or "./", lang=OCR_LANG, psm=tesserocr.PSM.AUTO)
+
+    def image_to_data(self, tile: np.ndarray) -> dict:
+        tile = np.ascontiguousarray(tile, dtype=np.uint8)
+        h, w = tile.shape
+        self.api.SetImageBytes(tile.tobytes(), w, h, 1, w)
+        self.api.Recognize()
+
+        data = {key: [] for key in DATA_KEYS}
+        block = line = 0
+        level = tesserocr.RIL.WORD
+        iterator = self.api.GetIterator()
+        if iterator is not None:
+            for word in tesserocr.iterate_level(iterator, level):
+                if word.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block += 1
+                if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                box = word.BoundingBox(level)
+                if box is None:
+                    continue
+                x1, y1, x2, y2 = box
+                data["text"].append(word.GetUTF8Text(level) or "")
+                data["conf"].append(word.Confidence(level))
+                data["block_num"].append(block)
+                data["line_num"].append(line)
+                data["left"].append(x1)
+                data["top"].append(y1)
+                data["width"].append(x2 - x1)
+                data["height"].append(y2 - y1)
+        self.api.Clear()
+        return data
+
+    def close(self) -> None:
+        self.api.End()
+
+
+@functools.cache
+def tessdata_dir() -> str | None:
+    """The first directory holding OCR_LANG's language data (TESSDATA_PREFIX first)."""
+    candidates = [os.getenv("TESSDATA_PREFIX"), *TESSDATA_DIRS]
+    for path in filter(None, candidates):
+        if os.path.exists(os.path.join(path, f"{OCR_LANG.split('+')[0]}.traineddata")):
+            return path.rstrip("/") + "/"
+    return None
+
+
+def backend() -> str:
+    if OCR_BACKEND == "auto":
+        return "tesserocr" if tesserocr is not None and tessdata_dir() else "pytesseract"
+    return OCR_BACKEND
+
+
+class EnginePool:
+    """
+    Up to `size` engines, created on first use and kept for the life of the
+    process, so each worker core keeps one warm engine. An engine that raised
+    is closed rather than handed out again.
+    """
+
+    def __init__(self, factory, size: int | None = None):
+        size = size or OCR_THREADS
+        self.factory = factory
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def engine(self):
+        with self._slots:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                engine = self.factory()
+            try:
+                yield engine
+            except BaseException:
+                engine.close()
+                raise
+            self._idle.put(engine)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def engines(name: str | None = None) -> EnginePool:
+    """The process-wide pool for `name` (default: the configured backend)."""
+    return _pool(name or backend())
+
+
+@functools.cache
+def _pool(name: str) -> EnginePool:
+    if name == "tesserocr":
+        if tesserocr is None:
+            raise RuntimeError("OCR_BACKEND=tesserocr but tesserocr is not installed")
+        return EnginePool(TesserocrEngine)
+    if name == "pytesseract":
+        return EnginePool(PytesseractEngine)
+    raise ValueError(f"Unknown OCR backend {name!r}")
+
+
+def warm_up(threads: int | None = None) -> None:
+    """
+    Initializes one engine now (e.g. in a worker process) so the first document
+    doesn't pay for it. `threads` overrides OCR_THREADS for this process.
+    """
+    global OCR_THREADS
+    if threads:
+        OCR_THREADS = threads
+    try:
+        with engines().engine():
+            pass
+    except Exception as e:
+        # Leave it to the first job to fail (and retry) rather than break the process pool
+        print(f"[ocr] could not start a {backend()} engine: {e}")
+
+
+def ocr_tile(tile: np.ndarray, backend_name: str | None = None) -> dict:
+    with engines(backend_name).engine() as engine:
+        return engine.image_to_data(tile)
+
+
+def group_lines(results: list[tuple[int, int, float, dict]]) -> str:
+    """
+    Collapses Tesseract's word rows into `[LN:n][x y w h] text` lines.
+
+    `results` is (tile index, y offset, scale, image_to_data dict) per tile.
+    Boxes are mapped back to the coordinates of the original photo.
+    """
+    tiles, offsets, scales, texts, confs, blocks, line_nums, lefts, tops, widths, heights = ([] for _ in range(11))
+    for tile_index, y_offset, scale, data in results:
+        n = len(data["text"])
+        tiles.append(np.full(n, tile_index))
+        offsets.append(np.full(n, y_offset))
+        scales.append(np.full(n, scale))
+        texts.extend(data["text"])
+        for column, key in ((confs, "conf"), (blocks, "block_num"), (line_nums, "line_num"),
+                            (lefts, "left"), (tops, "top"), (widths, "width"), (heights, "height")):
+            column.append(np.asarray(data[key], dtype=np.float64))
+
+    if not texts:
+        return ""
+
+    text = np.asarray([t.strip() for t in texts], dtype=object)
+    conf, block, line_num = (np.concatenate(c) for c in (confs, blocks, line_nums))
+    left, top, width, height = (np.concatenate(c) for c in (lefts, tops, widths, heights))
+    tile, y_offset, scale = np.concatenate(tiles), np.concatenate(offsets), np.concatenate(scales)
+
+    keep = (text != "") & (conf > 0)
+    if not keep.any():
+        return ""
+    text, tile, block, line_num, scale = text[keep], tile[keep], block[keep], line_num[keep], scale[keep]
+    left, top, width, height = left[keep], top[keep] + y_offset[keep], width[keep], height[keep]
+
+    # One group per (tile, block, line); words keep Tesseract's reading order
+    keys = np.stack([tile, block, line_num], axis=1)
+    _, first, group = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    group = group.ravel()
+    n_groups = len(first)
+    last = np.zeros(n_groups, dtype=np.int64)
+    np.maximum.at(last, group, np.arange(len(group)))
+
+    x = left[first]
+    y = top[first]
+    w = left[last] + width[last] - x
+    h = height[first]
+    x, y, w, h = (np.rint(v / scale[first]).astype(np.int64) for v in (x, y, w, h))
+
+    order = np.argsort(group, kind="stable")
+    bounds = np.cumsum(np.bincount(group, minlength=n_groups))[:-1]
+    words = np.split(text[order], bounds)
+
+    return "".join(
+        f"[LN:{i + 1}][{x[i]} {y[i]} {w[i]} {h[i]}] {' '.join(words[i])}\n"
+        for i in range(n_groups)
+    )
+
+
+def probe_text(image: str | bytes, backend_name: str | None = None) -> str:
+    """
+    OCR of just the PROBE_HEIGHT strip of the first page with the most ink,
+    in extract_text's format. A cheap sample of what a page says, for telling
+    a new photo of a known letter from a different one with the same layout.
+    """
+    binary, scale = preprocess(load_pages(image)[0])
+    ink_per_row = (binary < 128).sum(axis=1)
+    if len(ink_per_row) > PROBE_HEIGHT:
+        ink_per_window = np.convolve(ink_per_row, np.ones(PROBE_HEIGHT, dtype=np.int64), mode="valid")
+        start = int(np.argmax(ink_per_window))
+        top = _emptiest_row(ink_per_row, start, PROBE_HEIGHT // 8)
+        bottom = _emptiest_row(ink_per_row, start + PROBE_HEIGHT, PROBE_HEIGHT // 8)
+        binary = binary[top:bottom]
+    else:
+        top = 0
+    return group_lines([(0, top, scale, ocr_tile(binary, backend_name))])
+
+
+def extract_text(image: str | bytes, backend_name: str | None = None) -> str:
+    """`image` is a file path or the encoded image bytes; `backend_name` overrides OCR_BACKEND."""
+    pages = load_pages(image)
+
+    jobs = []   # (tile index, y offset, scale, image)
+    for page in pages:
+        binary, scale = preprocess(page)
+        for top, tile in split_tiles(binary):
+            jobs.append((len(jobs), top, scale, tile))
+
+    if len(jobs) == 1:
+        data = [ocr_tile(jobs[0][3], backend_name)]
+    else:
+        # Both backends recognize outside the GIL, so threads are enough to use every core
+        with ThreadPoolExecutor(max_workers=min(OCR_THREADS, len(jobs))) as pool:
+            data = list(pool.map(functools.partial(ocr_tile, backend_name=backend_name), (tile for *_, tile in jobs)))
+
+    return group_lines([(index, top, scale, d) for (index, top, scale, _), d in zip(jobs, data)])
@@ -0,0 +1,428 @@
+# ai/retrieval.py
+#
+# Semantic recall over a care-needer's past documents and conversations, so
+# "what did that letter from the clinic say?" can be answered from a document
+# scanned weeks ago. Document overviews and transcript turns are embedded on a
+# local CPU model as they are created; vectors sit in a flat float32 file per
+# needer and model (memory-mapped for lookups) and their metadata in
+# embedding_chunks (migration 009). Because a needer's vectors are contiguous,
+# a lookup is one matrix-vector product over the mapped file, and only the
+# few best rows are looked up in SQLite.
+#
+# The embedding model is fastembed's ONNX bge-small when fastembed is
+# installed; otherwise a hashed bag of words and character n-grams stands in,
+# which needs no download and still matches paraphrases that share word stems.
+import datetime
+import functools
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from db.db import db
+from features import metrics
+from features.search import STOPWORDS
+
+try:
+    from fastembed import TextEmbedding
+except ImportError:
+    TextEmbedding = None
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")   # "hash" skips fastembed
+EMBEDDINGS_DIR = Path(os.getenv("EMBEDDINGS_DIR", str(db.path.parent / "embeddings")))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE")) if os.getenv("RETRIEVAL_MIN_SCORE") else None
+CHUNK_WORDS = int(os.getenv("RETRIEVAL_CHUNK_WORDS", "120"))
+CHUNK_OVERLAP = 20
+MIN_CHUNK_WORDS = 4
+MIN_UTTERANCE_WORDS = 2    # "thanks" / "what time is it" turns aren't worth recalling
+EMBED_BATCH = 256
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class HashEmbedder:
+    """Signed feature hashing of words and character 4-grams into `dim` buckets."""
+
+    min_score = 0.2
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            if word in STOPWORDS:
+                continue
+            features = [word] + [f"#{g}" for g in (f" {word} "[i:i + 4] for i in range(len(word) - 1))]
+            for j, feature in enumerate(features):
+                h = zlib.crc32(feature.encode())
+                vector[h % self.dim] += (1.0 if j == 0 else 0.5) * (1.0 if h & 0x80000000 else -1.0)
+        return vector
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.stack([self._vector(t) for t in texts]) if texts else np.zeros((0, self.dim), np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+class FastEmbedder:
+    """A fastembed ONNX model (normalized outputs, so dot product is cosine)."""
+
+    min_score = 0.55
+
+    def __init__(self, model_name: str):
+        self.model = TextEmbedding(model_name)
+        self.name = model_name
+        self.dim = len(next(iter(self.model.embed(["probe"]))))
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), np.float32)
+        return np.asarray(list(self.model.embed(texts, batch_size=EMBED_BATCH)), dtype=np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return np.asarray(next(iter(self.model.query_embed(text))), dtype=np.float32)
+
+
+@functools.cache
+def embedder() -> HashEmbedder | FastEmbedder:
+    if EMBEDDING_MODEL != "hash" and TextEmbedding is not None:
+        try:
+            return FastEmbedder(EMBEDDING_MODEL)
+        except Exception as e:
+            print(f"[retrieval] could not load {EMBEDDING_MODEL} ({e}); using hashed embeddings")
+    elif EMBEDDING_MODEL != "hash":
+        print("[retrieval] fastembed is not installed; using hashed embeddings")
+    return HashEmbedder()
+
+
+class VectorFile:
+    """
+    Append-only float32 matrix on disk. Rows are appended (and the file is
+    rewritten by compact()) while the caller holds db.write(), which also
+    serializes writers across processes; readers memory-map it and re-map
+    once it has grown or been replaced.
+    """
+
+    def __init__(self, path: Path, dim: int):
+        self.path = path
+        self.dim = dim
+        self.row_bytes = dim * np.dtype(np.float32).itemsize
+        self._map: np.memmap | None = None
+        self._mapped: tuple[int, int] | None = None     # (inode, rows) of the current map
+        self._lock = threading.Lock()
+
+    def rows(self) -> int:
+        return self.path.stat().st_size // self.row_bytes if self.path.exists() else 0
+
+    def append(self, vectors: np.ndarray) -> int:
+        """Writes `vectors` after the last whole row and returns the first row number."""
+        start = self.rows()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "r+b" if self.path.exists() else "wb") as f:
+            f.seek(start * self.row_bytes)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        return start
+
+    def rewrite(self, keep: list[int]) -> None:
+        """Replaces the file with just the rows in `keep`: row keep[i] becomes row i."""
+        if not keep:
+            self.path.unlink(missing_ok=True)
+        else:
+            vectors = np.fromfile(self.path, dtype=np.float32, count=self.rows() * self.dim).reshape(-1, self.dim)
+            tmp = self.path.with_suffix(".f32.tmp")
+            vectors[keep].tofile(tmp)
+            os.replace(tmp, self.path)
+        with self._lock:
+            self._map = self._mapped = None
+
+    def matrix(self) -> np.memmap | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        rows = stat.st_size // self.row_bytes
+        with self._lock:
+            if rows and self._mapped != (stat.st_ino, rows):
+                self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+                self._mapped = (stat.st_ino, rows)
+            return self._map if rows else None
+
+
+@functools.cache
+def model_dir(name: str, dim: int) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9.-]+", "-", name).strip("-")
+    path = EMBEDDINGS_DIR / f"embeddings-{slug}-{dim}"
+    # Files used to sit right next to the database
+    legacy = db.path.parent / path.name
+    if legacy.is_dir() and not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        legacy.rename(path)
+    return path
+
+
+@functools.lru_cache(maxsize=1024)
+def vector_file(name: str, dim: int, needer_id: str) -> VectorFile:
+    return VectorFile(model_dir(name, dim) / f"{needer_id}.f32", dim)
+
+
+def chunk_text(text: str, words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    """Windows of `words` words, each overlapping the previous by `overlap`."""
+    tokens = text.split()
+    if len(tokens) < MIN_CHUNK_WORDS:
+        return []
+    step = words - overlap
+    return [" ".join(tokens[i:i + words]) for i in range(0, max(len(tokens) - overlap, 1), step)]
+
+
+def worth_recalling(utterance: str) -> bool:
+    return sum(word not in STOPWORDS for word in _WORD.findall(utterance.lower())) >= MIN_UTTERANCE_WORDS
+
+
+def turn_text(utterance: str, reply: str | None) -> str:
+    return f"careneeder: {utterance}\nLILY: {reply}" if reply else f"careneeder: {utterance}"
+
+
+_stats_lock = threading.Lock()
+_stats = {"chunks_indexed": 0, "lookups": 0, "hits": 0, "lookup_ms_avg": 0.0, "lookup_ms_max": 0.0}
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "model": embedder().name if embedder.cache_info().currsize else None}
+
+
+metrics.register("retrieval", stats)
+
+
+def _store(entries: list[tuple], texts: list[str]) -> int:
+    """
+    Embeds `texts` and records them. Each entry is (needer_id, kind, ref_id,
+    convo_id, at) for the text at the same position; any chunks already held
+    for those ref_ids under this model are replaced.
+    """
+    if not texts:
+        return 0
+    model = embedder()
+    vectors = model.embed(texts)
+    by_needer: dict[str, list[int]] = {}
+    for i, entry in enumerate(entries):
+        by_needer.setdefault(entry[0], []).append(i)
+
+    with db.write() as conn:
+        conn.executemany(
+            "DELETE FROM embedding_chunks WHERE ref_id = ? AND model = ?",
+            [(ref_id, model.name) for ref_id in dict.fromkeys(entry[2] for entry in entries)]
+        )
+        for needer_id, positions in by_needer.items():
+            start = vector_file(model.name, model.dim, needer_id).append(vectors[positions])
+            conn.executemany(
+                "INSERT INTO embedding_chunks (model, row, needer_id, kind, ref_id, convo_id, at, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(model.name, start + n, *entries[i], texts[i]) for n, i in enumerate(positions)]
+            )
+    with _stats_lock:
+        _stats["chunks_indexed"] += len(texts)
+    return len(texts)
+
+
+def index_document(document_id: str) -> int:
+    """(Re-)embeds a document's overview. Blocking; returns the number of chunks written."""
+    with db.read() as conn:
+        row = conn.execute(
+            "SELECT document_id, convo_id, needer_id, overview, (julianday(created_at) - 2440587.5) * 86400.0 AS at FROM documents WHERE document_id = ?",
+            (document_id,)
+        ).fetchone()
+    if not row or not row["needer_id"] or not row["overview"]:
+        return 0
+    chunks = chunk_text(row["overview"])
+    entry = (row["needer_id"], "document", document_id, row["convo_id"], row["at"])
+    return _store([entry] * len(chunks), chunks)
+
+
+def index_turn(convo_id: str, transcript_item_id: str, utterance: str, reply: str | None, at: float) -> int:
+    """Embeds one utterance/reply pair, keyed by the utterance's transcript item."""
+    if not worth_recalling(utterance):
+        return 0
+    with db.read() as conn:
+        row = conn.execute("SELECT needer_id FROM conversations WHERE convo_id = ?", (convo_id,)).fetchone()
+    if not row:
+        return 0
+    return _store([(row["needer_id"], "transcript", transcript_item_id, convo_id, at)], [turn_text(utterance, reply)])
+
+
+def compact() -> int:
+    """
+    Rewrites each of the current model's vector files with only the rows
+    embedding_chunks still points at, renumbering them to match, so vectors
+    of re-indexed or deleted documents and turns stop being scored. Returns
+    the number of rows dropped.
+    """
+    model = embedder()
+    directory = model_dir(model.name, model.dim)
+    if not directory.is_dir():
+        return 0
+    dropped = 0
+    for path in directory.glob("*.f32"):
+        store = vector_file(model.name, model.dim, path.stem)
+        with db.write() as conn:
+            rows = conn.execute(
+                "SELECT chunk_id, row FROM embedding_chunks WHERE model = ? AND needer_id = ? ORDER BY row",
+                (model.name, path.stem)
+            ).fetchall()
+            total = store.rows()
+            if len(rows) == total:
+                continue
+            # Rows only move down, in order, so no two ever share a number on the way
+            conn.executemany(
+                "UPDATE embedding_chunks SET row = ? WHERE chunk_id = ?",
+                [(i, r["chunk_id"]) for i, r in enumerate(rows)]
+            )
+            store.rewrite([r["row"] for r in rows])
+        dropped += total - len(rows)
+    if dropped:
+        print(f"[retrieval] compacted away {dropped} orphaned row(s)")
+    return dropped
+
+
+def reindex() -> int:
+    """
+    Compacts the vector files, then embeds whatever the current model hasn't
+    seen yet: everything from before this index existed, or from before the
+    model changed. Safe to rerun.
+    """
+    compact()
+    model = embedder()
+    total = 0
+    with db.read() as conn:
+        documents = [r["document_id"] for r in conn.execute(
+            """
+            SELECT document_id FROM documents d
+            WHERE overview IS NOT NULL AND status = 'done'
+              AND NOT EXISTS (SELECT 1 FROM embedding_chunks e WHERE e.ref_id = d.document_id AND e.model = ?)
+            """,
+            (model.name,)
+        )]
+        turns = conn.execute(
+            """
+            SELECT t.transcript_item_id, t.convo_id, c.needer_id, t.timestamp, t.content, t.reply FROM (
+                SELECT transcript_item_id, convo_id, speaker, timestamp, content,
+                    CASE WHEN LEAD(speaker) OVER w = 'LILY' THEN LEAD(content) OVER w END AS reply
+                FROM transcript_items
+                WINDOW w AS (PARTITION BY convo_id ORDER BY timestamp, rowid)
+            ) t
+            JOIN conversations c ON c.convo_id = t.convo_id
+            WHERE t.speaker = 'careneeder'
+              AND NOT EXISTS (SELECT 1 FROM embedding_chunks e WHERE e.ref_id = t.transcript_item_id AND e.model = ?)
+            """,
+            (model.name,)
+        ).fetchall()
+
+    for document_id in documents:
+        total += index_document(document_id)
+
+    turns = [t for t in turns if worth_recalling(t["content"])]
+    for i in range(0, len(turns), EMBED_BATCH):
+        batch = turns[i:i + EMBED_BATCH]
+        total += _store(
+            [(t["needer_id"], "transcript", t["transcript_item_id"], t["convo_id"], t["timestamp"]) for t in batch],
+            [turn_text(t["content"], t["reply"]) for t in batch]
+        )
+    if total:
+        print(f"[retrieval] indexed {total} chunk(s) with {model.name}")
+    return total
+
+
+# One indexing thread: embedding is CPU-bound and appends are serialized anyway
+index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval")
+
+
+def schedule(fn, *args) -> None:
+    """Runs an index_* call in the background so the request that triggered it isn't kept waiting."""
+    def report(future):
+        if future.exception():
+            print(f"[retrieval] {fn.__name__} failed: {future.exception()}")
+
+    index_executor.submit(fn, *args).add_done_callback(report)
+
+
+def search(conn, needer_id: str, query: str, k: int = RETRIEVAL_TOP_K, exclude_convo: str | None = None) -> list[dict]:
+    """
+    The `k` chunks of `needer_id`'s history closest to `query`, best first.
+    Transcript turns from `exclude_convo` are skipped; the live conversation
+    already reaches the prompt through ai.memory.
+
+    Every vector in the needer's file is scored, then the best rows are
+    checked against embedding_chunks, which drops the excluded turns and any
+    rows orphaned since the last compact(); the candidate pool widens until k
+    survive.
+    """
+    model = embedder()
+    matrix = vector_file(model.name, model.dim, needer_id).matrix()
+    if matrix is None:
+        return []
+    scores = matrix @ model.embed_query(query)
+
+    hits, checked, pool = [], 0, k * 4
+    while len(hits) < k and checked < len(scores):
+        pool = min(pool, len(scores))
+        top = np.argpartition(-scores, pool - 1)[:pool] if pool < len(scores) else np.arange(pool)
+        top = top[np.argsort(-scores[top])][checked:]
+        candidates = {int(row): float(scores[row]) for row in top}
+        checked = pool
+        pool *= 4
+        hits += [
+            {**dict(r), "score": candidates[r["row"]]}
+            for r in conn.execute(
+                f"""
+                SELECT row, kind, ref_id, convo_id, at, text FROM embedding_chunks
+                WHERE model = ? AND needer_id = ? AND row IN ({','.join('?' * len(candidates))})
+                  AND (kind = 'document' OR convo_id IS NOT ?)
+                """,
+                (model.name, needer_id, *candidates, exclude_convo)
+            )
+        ]
+    return sorted(hits, key=lambda h: -h["score"])[:k]
+
+
+def recall(convo_id: str, query: str) -> str | None:
+    """Relevant past notes for `convo_id`'s needer, formatted for the prompt, or None. Blocking."""
+    start = time.perf_counter()
+    with db.read() as conn:
+        row = conn.execute("SELECT needer_id FROM conversations WHERE convo_id = ?", (convo_id,)).fetchone()
+        hits = search(conn, row["needer_id"], query, exclude_convo=convo_id) if row else []
+    min_score = RETRIEVAL_MIN_SCORE if RETRIEVAL_MIN_SCORE is not None else embedder().min_score
+    hits = [h for h in hits if h["score"] >= min_score]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    with _stats_lock:
+        _stats["lookups"] += 1
+        _stats["hits"] += len(hits)
+        _stats["lookup_ms_avg"] += (elapsed_ms - _stats["lookup_ms_avg"]) / _stats["lookups"]
+        _stats["lookup_ms_max"] = max(_stats["lookup_ms_max"], elapsed_ms)
+
+    if not hits:
+        return None
+    lines = []
+    for hit in hits:
+        day = datetime.datetime.fromtimestamp(hit["at"]).strftime("%b %d, %Y") if hit["at"] else "unknown date"
+        lines.append(f"- {hit['kind']} from {day}: {hit['text']}")
+    return "Notes from earlier documents and conversations that may be relevant:\n" + "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # cd backend && python -m ai.retrieval reindex
+    if sys.argv[1:] == ["reindex"]:
+        reindex()
+    else:
+        print("usage: python -m ai.retrieval reindex")
@@ -0,0 +1,152 @@
+# ai/router.py
+#
+# Cheap intents ("thank you", "what time is it", "say that again") don't need
+# a Sonnet round-trip. route() matches an utterance against a small phrase
+# table and answers it locally when the phrase covers nearly the whole
+# utterance (all of it for the time and date, where one extra word like
+# "tomorrow" or "there" changes the answer); anything open-ended is
+# escalated to the model.
+#
+# Every decision is logged with its coverage score and the latency it saved
+# (measured against a running average of real model turns) so the
+# ROUTER_MIN_COVERAGE threshold can be tuned from the logs.
+import datetime
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
+
+from db.db import db
+from features import metrics
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"
+ROUTER_MIN_COVERAGE = float(os.getenv("ROUTER_MIN_COVERAGE", "0.75"))
+EXACT_INTENTS = {"time", "date"}     # answered locally only when the phrase is the whole utterance
+TIMEZONE = ZoneInfo(os.getenv("LILY_TIMEZONE")) if os.getenv("LILY_TIMEZONE") else None
+
+# Words that carry no intent of their own
+FILLER = {"lily", "please", "hey", "oh", "um", "uh", "so", "well", "just", "again", "now", "the", "a"}
+
+INTENTS = {
+    "thanks": ("thank you", "thanks", "thank you so much", "thanks a lot", "much appreciated"),
+    "ack": ("ok", "okay", "got it", "alright", "all right", "sounds good", "i see", "great", "perfect"),
+    "greeting": ("hi", "hello", "good morning", "good afternoon", "good evening", "how are you"),
+    "time": ("what time is it", "what's the time", "what is the time", "tell me the time"),
+    "date": ("what day is it", "what's the date", "what is the date", "what's today's date", "what day is today", "what is today",
+             "what day is it today", "what's the date today", "what is today's date"),
+    "repeat": ("repeat that", "say that again", "what did you say", "can you repeat that", "come again", "pardon", "sorry what"),
+}
+
+_WORD = re.compile(r"[a-z']+")
+
+
+@dataclass
+class Route:
+    intent: str | None        # None means escalate to the model
+    coverage: float
+    reply: str | None = None
+
+
+def _words(text: str) -> list[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in FILLER]
+
+
+_PHRASES = sorted(
+    ((intent, tuple(_words(phrase))) for intent, phrases in INTENTS.items() for phrase in phrases),
+    key=lambda item: -len(item[1])
+)
+
+
+def classify(text: str) -> tuple[str | None, float]:
+    """Best intent and the share of the utterance's content words its phrase covers."""
+    words = _words(text)
+    if not words:
+        return None, 0.0
+
+    best, best_coverage = None, 0.0
+    for intent, phrase in _PHRASES:
+        n = len(phrase)
+        for i in range(len(words) - n + 1):
+            if tuple(words[i:i + n]) == phrase:
+                coverage = n / len(words)
+                if coverage > best_coverage:
+                    best, best_coverage = intent, coverage
+                break
+    return best, best_coverage
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(TIMEZONE) if TIMEZONE else datetime.datetime.now().astimezone()
+
+
+def last_reply(convo_id: str) -> str | None:
+    with db.read() as conn:
+        row = conn.execute(
+            "SELECT content FROM transcript_items WHERE convo_id = ? AND speaker = 'LILY' ORDER BY timestamp DESC LIMIT 1",
+            (convo_id,)
+        ).fetchone()
+    return row["content"] if row else None
+
+
+def answer(intent: str, convo_id: str) -> str | None:
+    if intent == "thanks":
+        return "You're welcome!"
+    if intent == "ack":
+        return "Okay. Let me know if you need anything else."
+    if intent == "greeting":
+        return "Hi! I'm here. What can I do for you?"
+    if intent == "time":
+        return f"It's {_now().strftime('%I:%M %p').lstrip('0')}."
+    if intent == "date":
+        now = _now()
+        return f"Today is {now.strftime('%A, %B')} {now.day}."
+    if intent == "repeat":
+        return last_reply(convo_id) or "I haven't said anything yet. What can I help with?"
+    return None
+
+
+_stats_lock = threading.Lock()
+_stats = {"routed": 0, "escalated": 0, "llm_turns": 0, "llm_ms_avg": 0.0, "saved_ms": 0.0}
+_by_intent: dict[str, int] = {}
+
+
+def record_llm_turn(seconds: float) -> None:
+    """Feeds the running average that 'latency saved' is measured against."""
+    with _stats_lock:
+        _stats["llm_turns"] += 1
+        _stats["llm_ms_avg"] += (seconds * 1000 - _stats["llm_ms_avg"]) / _stats["llm_turns"]
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "by_intent": dict(_by_intent), "min_coverage": ROUTER_MIN_COVERAGE}
+
+
+metrics.register("router", stats)
+
+
+def route(text: str, convo_id: str) -> Route:
+    """Classifies `text` and, for a cheap intent, answers it. Blocking (the repeat intent reads the DB)."""
+    start = time.perf_counter()
+    intent, coverage = classify(text) if ROUTER_ENABLED else (None, 0.0)
+    min_coverage = 1.0 if intent in EXACT_INTENTS else ROUTER_MIN_COVERAGE
+    reply = answer(intent, convo_id) if intent and coverage >= min_coverage else None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    with _stats_lock:
+        if reply is None:
+            _stats["escalated"] += 1
+            saved_ms = 0.0
+        else:
+            _stats["routed"] += 1
+            _by_intent[intent] = _by_intent.get(intent, 0) + 1
+            saved_ms = max(0.0, _stats["llm_ms_avg"] - elapsed_ms)
+            _stats["saved_ms"] += saved_ms
+
+    decision = "local" if reply is not None else "llm"
+    print(f"[router] {decision} intent={intent} coverage={coverage:.2f} took={elapsed_ms:.2f}ms saved~{saved_ms:.0f}ms text={text[:60]!r}")
+    if reply is None:
+        return Route(None, coverage)
+    return Route(intent, coverage, reply)
@@ -0,0 +1,74 @@
+# ai/usage.py
+#
+# Token and latency accounting for every completion, per model, including
+# how much of each prompt the provider served from its prompt cache and how
+# often a model failed over to its fallback. Exposed under "llm" in
+# GET /metrics.
+import threading
+from collections import defaultdict
+
+from features import metrics
+
+_lock = threading.Lock()
+_totals: dict[str, dict[str, float]] = defaultdict(lambda: {
+    "calls": 0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "cache_read_tokens": 0,
+    "cache_write_tokens": 0,
+    "latency_ms_total": 0.0,
+    "latency_ms_max": 0.0,
+    "errors": 0,
+    "fallbacks": 0,
+})
+
+
+def cache_tokens(usage) -> tuple[int, int]:
+    """(read, written) prompt-cache tokens from a litellm Usage, whichever provider it came from."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    read = getattr(usage, "cache_read_input_tokens", None) or getattr(details, "cached_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or getattr(details, "cache_creation_tokens", None) or 0
+    return read, written
+
+
+def record(model: str, response, label: str = "", latency: float | None = None) -> None:
+    usage = getattr(response, "usage", None)
+    read, written = cache_tokens(usage) if usage is not None else (0, 0)
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    latency_ms = latency * 1000 if latency is not None else 0.0
+    with _lock:
+        totals = _totals[model]
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt
+        totals["completion_tokens"] += completion
+        totals["cache_read_tokens"] += read
+        totals["cache_write_tokens"] += written
+        totals["latency_ms_total"] += latency_ms
+        totals["latency_ms_max"] = max(totals["latency_ms_max"], latency_ms)
+    print(f"[ai] {label or 'completion'} model={model} latency={latency_ms:.0f}ms prompt={prompt} completion={completion} cache_read={read} cache_write={written}")
+
+
+def record_error(model: str, error: Exception) -> None:
+    with _lock:
+        _totals[model]["errors"] += 1
+    print(f"[ai] model={model} failed: {type(error).__name__}: {error}")
+
+
+def record_fallback(model: str, fallback: str, error: Exception) -> None:
+    with _lock:
+        _totals[model]["fallbacks"] += 1
+    print(f"[ai] falling back from {model} to {fallback} after {type(error).__name__}")
+
+
+def stats() -> dict:
+    with _lock:
+        snapshot = {model: dict(totals) for model, totals in _totals.items()}
+    for totals in snapshot.values():
+        prompt = totals["prompt_tokens"]
+        totals["cache_read_ratio"] = totals["cache_read_tokens"] / prompt if prompt else 0.0
+        totals["latency_ms_avg"] = totals["latency_ms_total"] / totals["calls"] if totals["calls"] else 0.0
+    return snapshot
+
+
+metrics.register("llm", stats)
@@ -0,0 +1,66 @@
+# bench_reads.py
+#
+# Read throughput of GET /convo/{convo_id} (get_convo) as reader threads are
+# added. Runs against a throwaway database, never db/app.db:
+#
+#     cd backend && python -m db.bench_reads [items] [seconds]
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from db.db import db
+from db import migrations
+from features.create_functions import create_convo, create_document
+from features.get_function import get_convo
+
+NEEDER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def seed(items: int) -> str:
+    convo_id = create_convo(NEEDER_ID)
+    with db.write() as conn:
+        conn.executemany(
+            "INSERT INTO transcript_items (transcript_item_id, convo_id, speaker, timestamp, content) VALUES (?, ?, ?, ?, ?)",
+            [(f"t{i}", convo_id, "careneeder" if i % 2 else "LILY", float(i), f"message number {i} " * 8) for i in range(items)]
+        )
+    for i in range(items // 50):
+        create_document(convo_id, overview=f"overview {i}", content="lorem ipsum " * 200)
+    return convo_id
+
+
+def measure(convo_id: str, threads: int, seconds: float) -> float:
+    stop = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(n: int):
+        while time.perf_counter() < stop:
+            with db.read() as conn:
+                get_convo(conn, convo_id)
+            counts[n] += 1
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(counts) / seconds
+
+
+if __name__ == "__main__":
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+
+    migrations.migrate()
+    convo_id = seed(items)
+
+    base = None
+    print(f"get_convo over {items} transcript items, {db.max_readers} pooled readers")
+    for threads in (1, 2, 4, 8):
+        rate = measure(convo_id, threads, seconds)
+        base = base or rate
+        print(f"  {threads:>2} threads: {rate:8.1f} reads/s  ({rate / base:.2f}x)")
+    db.close()
@@ -0,0 +1,87 @@
+# bench_search.py
+#
+# /search latency over a large index: seeds transcript items and documents
+# for a few households into a throwaway database (never db/app.db), then
+# times typical caretaker queries:
+#
+#     cd backend && python -m db.bench_search [transcript items]
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from db.db import db
+from db import migrations
+from features.create_functions import create_convo, create_document, create_transcript_items
+from features.search import search
+
+WORDS = (
+    "morning breakfast tea garden daughter son doctor appointment pills blood pressure walk weather "
+    "television news neighbor church lunch nap phone call birthday card grandchildren dinner soup "
+    "medicare insurance bill letter bank pharmacy refill prescription tuesday thursday knee back"
+).split()
+
+# Real speech is Zipf-distributed: a few words everywhere, most words rare.
+# The topic words above sit in the long tail, where caretakers' searches land.
+VOCABULARY = [f"w{i}" for i in range(200)] + list(WORDS) + [f"w{i}" for i in range(200, 5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+QUERIES = (
+    "when did mom mention the pharmacy",
+    "medicare letter",
+    "blood pressure pills",
+    "birthday",
+    "pharm",
+)
+
+
+def seed(items: int, households: int = 20) -> str:
+    rng = random.Random(7)
+    caretaker = str(uuid.uuid4())
+    with db.write() as conn:
+        for h in range(households):
+            household_id, needer_id = str(uuid.uuid4()), str(uuid.uuid4())
+            conn.execute("INSERT INTO users (id, provider, subject) VALUES (?, 'email', ?)", (needer_id, f"needer{h}@bench"))
+            conn.execute("INSERT INTO careneeders (user_id, first_name, last_name) VALUES (?, 'N', ?)", (needer_id, str(h)))
+            conn.execute("INSERT INTO households (household_id, name) VALUES (?, ?)", (household_id, f"h{h}"))
+            conn.execute("INSERT INTO household_members (household_id, user_id) VALUES (?, ?)", (household_id, needer_id))
+            if h == 0:
+                conn.execute("INSERT INTO users (id, provider, subject) VALUES (?, 'email', 'carol@bench')", (caretaker,))
+                conn.execute("INSERT INTO household_members (household_id, user_id) VALUES (?, ?)", (household_id, caretaker))
+        needers = [r[0] for r in conn.execute("SELECT user_id FROM careneeders WHERE last_name != 'Washington'")]
+
+    per_convo = 200
+    for start in range(0, items, per_convo):
+        needer_id = needers[(start // per_convo) % len(needers)]
+        convo_id = create_convo(needer_id)
+        create_transcript_items(convo_id, [
+            (rng.choice(("careneeder", "LILY")), " ".join(rng.choices(VOCABULARY, WEIGHTS, k=12)), float(start + i))
+            for i in range(per_convo)
+        ])
+        if start % 2000 == 0:
+            create_document(convo_id, overview=" ".join(rng.choices(WORDS, k=8)), content=" ".join(rng.choices(VOCABULARY, WEIGHTS, k=300)))
+    return caretaker
+
+
+if __name__ == "__main__":
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    migrations.migrate()
+    start = time.perf_counter()
+    caretaker = seed(items)
+    print(f"seeded {items} transcript items in {time.perf_counter() - start:.1f}s")
+
+    with db.read() as conn:
+        for q in QUERIES:
+            times = []
+            for _ in range(20):
+                t = time.perf_counter()
+                results = search(conn, caretaker, q)
+                times.append(time.perf_counter() - t)
+            print(f"  {q!r:<40} {statistics.median(times) * 1000:7.2f} ms p50  {max(times) * 1000:7.2f} ms max  {len(results)} results")
+    db.close()
@@ -0,0 +1,71 @@
+# bench_writes.py
+#
+# Write throughput of transcript items: one commit per row (what every
+# create_* call did on its own) against grouping rows into one db.write()
+# unit of work and against the bulk executemany path. Runs against a
+# throwaway database, never db/app.db:
+#
+#     cd backend && python -m db.bench_writes [rows] [batch]
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from db.db import db
+from db import migrations
+from features.create_functions import create_convo, create_transcript_item, create_transcript_items
+
+NEEDER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def commit_per_row(convo_id: str, rows: int, batch: int) -> None:
+    for i in range(rows):
+        create_transcript_item(convo_id, "careneeder", f"message number {i}")
+
+
+def unit_of_work(convo_id: str, rows: int, batch: int) -> None:
+    for start in range(0, rows, batch):
+        with db.write():
+            for i in range(start, min(rows, start + batch)):
+                create_transcript_item(convo_id, "careneeder", f"message number {i}")
+
+
+def bulk(convo_id: str, rows: int, batch: int) -> None:
+    for start in range(0, rows, batch):
+        create_transcript_items(convo_id, [("careneeder", f"message number {i}") for i in range(start, min(rows, start + batch))])
+
+
+def turns_two_commits(convo_id: str, rows: int, batch: int) -> None:
+    for i in range(0, rows, 2):
+        create_transcript_item(convo_id, "careneeder", f"question {i}")
+        create_transcript_item(convo_id, "LILY", f"answer {i}")
+
+
+def turns_one_commit(convo_id: str, rows: int, batch: int) -> None:
+    for i in range(0, rows, 2):
+        create_transcript_items(convo_id, [("careneeder", f"question {i}"), ("LILY", f"answer {i}")])
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    migrations.migrate()
+    print(f"{rows} transcript items, batches of {batch}")
+    base = None
+    for name, fn in (
+        ("commit per row", commit_per_row),
+        ("unit of work", unit_of_work),
+        ("bulk executemany", bulk),
+        ("/transcript/ turn, 2 commits", turns_two_commits),
+        ("/transcript/ turn, 1 commit", turns_one_commit),
+    ):
+        convo_id = create_convo(NEEDER_ID)
+        start = time.perf_counter()
+        fn(convo_id, rows, batch)
+        rate = rows / (time.perf_counter() - start)
+        base = base or rate
+        print(f"  {name:<30} {rate:10.0f} rows/s  ({rate / base:.1f}x)")
+    db.close()
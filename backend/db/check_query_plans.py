@@ -0,0 +1,138 @@
+# check_query_plans.py
+#
+# Regression check for the hot lookups: runs EXPLAIN QUERY PLAN for each one
+# against a freshly migrated throwaway database and exits non-zero if any of
+# them falls back to a full table SCAN, or if a paged list has to sort (a
+# keyset page is only constant-cost when it walks an index in order).
+#
+#     cd backend && python -m db.check_query_plans
+import os
+import sys
+import tempfile
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "plans.db")
+
+from db.db import db
+from db import migrations
+
+# Keep in sync with the queries in features/ and routes/
+HOT_QUERIES = {
+    "get_convo: transcript items": (
+        "SELECT rowid AS _rowid, * FROM transcript_items WHERE convo_id = ? AND rowid > ? ORDER BY timestamp ASC", ("c", 0)
+    ),
+    "get_convo: documents": (
+        "SELECT * FROM documents WHERE convo_id = ? AND rowid > ? ORDER BY created_at ASC", ("c", 0)
+    ),
+    "get_convo: alerts": (
+        """
+        SELECT a.rowid AS _rowid, a.* FROM alerts a
+        JOIN documents d ON d.document_id = a.doc_id
+        WHERE d.convo_id = ? AND a.rowid > ?
+        ORDER BY a.timestamp ASC
+        """, ("c", 0)
+    ),
+    "memory.load_context: recent turns": (
+        "SELECT rowid AS _rowid, speaker, content FROM transcript_items WHERE convo_id = ? AND rowid > ? ORDER BY timestamp DESC, rowid DESC LIMIT ?", ("c", 0, 20)
+    ),
+    "memory.load_context: summary": (
+        "SELECT summary, summarized_rowid FROM convo_memory WHERE convo_id = ?", ("c",)
+    ),
+    "router.last_reply": (
+        "SELECT content FROM transcript_items WHERE convo_id = ? AND speaker = 'LILY' ORDER BY timestamp DESC LIMIT 1", ("c",)
+    ),
+    "retrieval.search: candidate chunks": (
+        """
+        SELECT row, kind, ref_id, convo_id, at, text FROM embedding_chunks
+        WHERE model = ? AND needer_id = ? AND row IN (?, ?, ?, ?)
+          AND (kind = 'document' OR convo_id IS NOT ?)
+        """, ("m", "n", 1, 2, 3, 4, "c")
+    ),
+    "retrieval._store: replace chunks": (
+        "DELETE FROM embedding_chunks WHERE ref_id = ? AND model = ?", ("r", "m")
+    ),
+    "document_cache.lookup_image": (
+        "SELECT cache_id, extracted_text FROM document_cache WHERE needer_id = ? AND image_sha256 = ? LIMIT 1", ("n", "h")
+    ),
+    "document_cache.near_candidates": (
+        """
+        SELECT cache_id, phash, extracted_text, overview FROM document_cache WHERE cache_id IN (
+            SELECT cache_id FROM document_cache_bands WHERE needer_id = ? AND band = ? AND value = ?
+            UNION SELECT cache_id FROM document_cache_bands WHERE needer_id = ? AND band = ? AND value = ?
+        )
+        """, ("n", 0, 1, "n", 1, 2)
+    ),
+    "document_cache.lookup_text": (
+        "SELECT cache_id, extracted_text, overview FROM document_cache WHERE needer_id = ? AND text_hash = ? LIMIT 1", ("n", "h")
+    ),
+    "GET /convo/needer/{needer_id}": (
+        """
+        SELECT c.rowid AS _rowid, c.convo_id,
+            (SELECT MIN(t.timestamp) FROM transcript_items t WHERE t.convo_id = c.convo_id) AS started_at
+        FROM conversations c WHERE c.needer_id = ? AND c.rowid < ? ORDER BY c.rowid DESC LIMIT ?
+        """, ("n", 100, 21)
+    ),
+    "GET /convo/{convo_id}/transcript": (
+        "SELECT rowid AS _rowid, * FROM transcript_items WHERE convo_id = ? AND (timestamp, rowid) < (?, ?) ORDER BY timestamp DESC, rowid DESC LIMIT ?", ("c", 1.0, 100, 21)
+    ),
+    "GET /document/needer/{needer_id}": (
+        "SELECT rowid AS _rowid, document_id FROM documents WHERE needer_id = ? AND (created_at, rowid) < (?, ?) ORDER BY created_at DESC, rowid DESC LIMIT ?", ("n", "2026", 100, 21)
+    ),
+    "GET /convo/latest/{needer_id}": (
+        "SELECT * FROM conversations WHERE needer_id = ? ORDER BY rowid DESC LIMIT 1", ("n",)
+    ),
+    "ai.get_latest_doc_id": (
+        "SELECT document_id FROM documents WHERE convo_id = ? ORDER BY created_at DESC LIMIT 1", ("c",)
+    ),
+    "auth.getUser": (
+        "SELECT id FROM users WHERE provider = ? AND subject = ? LIMIT 1", ("email", "a@b.c")
+    ),
+    "auth.authenticate": (
+        "SELECT user_id, created_at FROM sessions WHERE token_hash = ? AND created_at > ? LIMIT 1", ("h", "2026")
+    ),
+    "document_jobs.claim_next_job": (
+        "SELECT job_id FROM document_jobs WHERE status = 'pending' ORDER BY created_at ASC LIMIT 1", ()
+    ),
+    "document_jobs.get_document_status": (
+        """
+        SELECT d.document_id, d.status, d.overview, j.error
+        FROM documents d
+        LEFT JOIN document_jobs j ON j.document_id = d.document_id
+        WHERE d.document_id = ?
+        ORDER BY j.created_at DESC
+        LIMIT 1
+        """, ("d",)
+    ),
+}
+
+PAGED_QUERIES = {
+    "GET /convo/needer/{needer_id}",
+    "GET /convo/{convo_id}/transcript",
+    "GET /document/needer/{needer_id}",
+}
+
+
+def full_scans(conn, sql: str, params: tuple, sort_free: bool = False) -> list[str]:
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [
+        row["detail"] for row in plan
+        if row["detail"].startswith("SCAN ") or (sort_free and "TEMP B-TREE" in row["detail"])
+    ]
+
+
+def check() -> int:
+    migrations.migrate()
+    failures = 0
+    with db.read() as conn:
+        for name, (sql, params) in HOT_QUERIES.items():
+            scans = full_scans(conn, sql, params, name in PAGED_QUERIES)
+            if scans:
+                failures += 1
+                print(f"FAIL  {name}: {'; '.join(scans)}")
+            else:
+                print(f"ok    {name}")
+    db.close()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check() else 0)
@@ -85,27 +85,241 @@ MIGRATIONS = [
         ('00000000-0000-0000-0000-000000000010', '00000000-0000-0000-0000-000000000001'),
         ('00000000-0000-0000-0000-000000000010', '00000000-0000-0000-0000-000000000002');
     """,
+
+    # 002 - background document processing (OCR + summary run after upload returns)
+    """
+    ALTER TABLE documents ADD COLUMN status TEXT NOT NULL DEFAULT 'done'
+        CHECK(status IN ('pending', 'done', 'failed'));
+
+    CREATE TABLE document_jobs (
+        job_id TEXT PRIMARY KEY,
+        document_id TEXT NOT NULL REFERENCES documents(document_id) ON DELETE CASCADE,
+        image_path TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'running', 'done', 'failed')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+        updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    );
+    CREATE INDEX idx_document_jobs_status ON document_jobs(status, created_at);
+    """,
+
+    # 003 - indexes for the hot lookups (checked by db/check_query_plans.py)
+    """
+    CREATE INDEX IF NOT EXISTS idx_transcript_items_convo_ts ON transcript_items(convo_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_documents_convo_created ON documents(convo_id, created_at, document_id);
+    CREATE INDEX IF NOT EXISTS idx_alerts_doc_ts ON alerts(doc_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_conversations_needer ON conversations(needer_id, convo_id);
+    CREATE INDEX IF NOT EXISTS idx_users_provider_subject ON users(provider, subject, id);
+    CREATE INDEX IF NOT EXISTS idx_document_jobs_document ON document_jobs(document_id, created_at);
+    ANALYZE;
+    """,
+
+    # 004 - OCR/summary cache for repeat scans of the same document
+    """
+    CREATE TABLE document_cache (
+        cache_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        phash INTEGER NOT NULL,
+        text_hash TEXT NOT NULL,
+        extracted_text TEXT NOT NULL,
+        overview TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+        last_used_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    );
+    CREATE INDEX idx_document_cache_text_hash ON document_cache(text_hash);
+    CREATE INDEX idx_document_cache_last_used ON document_cache(last_used_at);
+
+    -- The 64-bit perceptual hash split into 8 one-byte bands. Two hashes within
+    -- Hamming distance 7 always share at least one band, so near-duplicate
+    -- candidates come from an index lookup instead of a scan.
+    CREATE TABLE document_cache_bands (
+        band INTEGER NOT NULL,
+        value INTEGER NOT NULL,
+        cache_id INTEGER NOT NULL REFERENCES document_cache(cache_id) ON DELETE CASCADE,
+        PRIMARY KEY (band, value, cache_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_document_cache_bands_cache ON document_cache_bands(cache_id);
+    """,
+
+    # 005 - uploads stream straight to S3; jobs point at the object, not a local file
+    """
+    ALTER TABLE document_jobs RENAME COLUMN image_path TO object_key;
+    ALTER TABLE document_jobs ADD COLUMN sha256 TEXT;
+    ALTER TABLE document_jobs ADD COLUMN size_bytes INTEGER;
+    """,
+
+    # 006 - rolling summary of the turns that no longer fit in LILY's prompt
+    """
+    CREATE TABLE convo_memory (
+        convo_id TEXT PRIMARY KEY REFERENCES conversations(convo_id) ON DELETE CASCADE,
+        summary TEXT NOT NULL DEFAULT '',
+        summarized_rowid INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    );
+    """,
+
+    # 007 - keyset pagination: every list is walked along an index, never OFFSET.
+    # documents carry needer_id so a needer's documents across conversations
+    # come off one index instead of a join and sort.
+    """
+    ALTER TABLE documents ADD COLUMN needer_id TEXT REFERENCES careneeders(user_id);
+    UPDATE documents SET needer_id = (
+        SELECT c.needer_id FROM conversations c WHERE c.convo_id = documents.convo_id
+    );
+    CREATE INDEX IF NOT EXISTS idx_documents_needer_created ON documents(needer_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_conversations_needer_rowid ON conversations(needer_id);
+    -- Every needer lookup uses the rowid-ordered index now; keeping 003's just slows inserts
+    DROP INDEX IF EXISTS idx_conversations_needer;
+    ANALYZE;
+    """,
+
+    # 008 - full-text search over transcripts and documents (features/search.py).
+    # One FTS5 table so both kinds rank together; rowid is 2*rowid for a
+    # transcript item and 2*rowid+1 for a document. needer_id is indexed so
+    # household scoping happens inside the MATCH, before anything is ranked.
+    # `at` is epoch seconds.
+    """
+    CREATE VIRTUAL TABLE search_index USING fts5(
+        title, body, needer_id,
+        kind UNINDEXED, ref_id UNINDEXED, convo_id UNINDEXED, at UNINDEXED,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER search_transcript_insert AFTER INSERT ON transcript_items BEGIN
+        INSERT INTO search_index (rowid, title, body, kind, ref_id, convo_id, needer_id, at)
+        VALUES (
+            new.rowid * 2, '', new.content, 'transcript', new.transcript_item_id, new.convo_id,
+            (SELECT needer_id FROM conversations WHERE convo_id = new.convo_id), new.timestamp
+        );
+    END;
+    CREATE TRIGGER search_transcript_update AFTER UPDATE OF content ON transcript_items BEGIN
+        UPDATE search_index SET body = new.content WHERE rowid = old.rowid * 2;
+    END;
+    CREATE TRIGGER search_transcript_delete AFTER DELETE ON transcript_items BEGIN
+        DELETE FROM search_index WHERE rowid = old.rowid * 2;
+    END;
+
+    CREATE TRIGGER search_document_insert AFTER INSERT ON documents BEGIN
+        INSERT INTO search_index (rowid, title, body, kind, ref_id, convo_id, needer_id, at)
+        VALUES (
+            new.rowid * 2 + 1, COALESCE(new.overview, ''), COALESCE(new.content, ''), 'document',
+            new.document_id, new.convo_id, new.needer_id, (julianday(new.created_at) - 2440587.5) * 86400.0
+        );
+    END;
+    CREATE TRIGGER search_document_update AFTER UPDATE OF overview, content ON documents BEGIN
+        UPDATE search_index SET title = COALESCE(new.overview, ''), body = COALESCE(new.content, '')
+        WHERE rowid = old.rowid * 2 + 1;
+    END;
+    CREATE TRIGGER search_document_delete AFTER DELETE ON documents BEGIN
+        DELETE FROM search_index WHERE rowid = old.rowid * 2 + 1;
+    END;
+
+    INSERT INTO search_index (rowid, title, body, kind, ref_id, convo_id, needer_id, at)
+    SELECT t.rowid * 2, '', t.content, 'transcript', t.transcript_item_id, t.convo_id, c.needer_id, t.timestamp
+    FROM transcript_items t LEFT JOIN conversations c ON c.convo_id = t.convo_id;
+
+    INSERT INTO search_index (rowid, title, body, kind, ref_id, convo_id, needer_id, at)
+    SELECT rowid * 2 + 1, COALESCE(overview, ''), COALESCE(content, ''), 'document', document_id, convo_id, needer_id,
+        (julianday(created_at) - 2440587.5) * 86400.0
+    FROM documents;
+
+    CREATE INDEX IF NOT EXISTS idx_household_members_user ON household_members(user_id, household_id);
+    """,
+
+    # 009 - semantic retrieval (ai/retrieval.py). Vectors live in one flat
+    # float32 file per needer and embedding model; `row` is the chunk's
+    # position in it.
+    # Re-indexing a document drops its old chunks, so a file may hold a few
+    # orphaned rows until retrieval.compact() rewrites it (at every reindex).
+    """
+    CREATE TABLE embedding_chunks (
+        chunk_id INTEGER PRIMARY KEY,
+        model TEXT NOT NULL,
+        row INTEGER NOT NULL,
+        needer_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        ref_id TEXT NOT NULL,
+        convo_id TEXT REFERENCES conversations(convo_id) ON DELETE CASCADE,
+        at REAL,
+        text TEXT NOT NULL,
+        UNIQUE (model, needer_id, row)
+    );
+    CREATE INDEX IF NOT EXISTS idx_embedding_chunks_ref ON embedding_chunks(ref_id, model);
+
+    CREATE TRIGGER embedding_document_delete AFTER DELETE ON documents BEGIN
+        DELETE FROM embedding_chunks WHERE ref_id = old.document_id;
+    END;
+    CREATE TRIGGER embedding_transcript_delete AFTER DELETE ON transcript_items BEGIN
+        DELETE FROM embedding_chunks WHERE ref_id = old.transcript_item_id;
+    END;
+    """,
+
+    # 010 - the document cache is per care-needer and keyed only on exact
+    # hashes (features/document_cache.py). Perceptual-hash entries were shared
+    # across needers and matched lookalike letters, so they are dropped.
+    """
+    DROP TABLE document_cache_bands;
+    DROP TABLE document_cache;
+    CREATE TABLE document_cache (
+        cache_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        needer_id TEXT NOT NULL REFERENCES careneeders(user_id) ON DELETE CASCADE,
+        image_sha256 TEXT,
+        text_hash TEXT NOT NULL,
+        extracted_text TEXT NOT NULL,
+        overview TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+        last_used_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    );
+    CREATE INDEX idx_document_cache_needer_image ON document_cache(needer_id, image_sha256);
+    CREATE INDEX idx_document_cache_needer_text ON document_cache(needer_id, text_hash);
+    CREATE INDEX idx_document_cache_last_used ON document_cache(last_used_at);
+    """,
+
+    # 011 - near-duplicate photos are cached again, now per needer and only
+    # reused once the new photo's text confirms them. text_hash now covers just
+    # the OCR words (not the line boxes), so the old entries can't be looked up.
+    """
+    DELETE FROM document_cache;
+    ALTER TABLE document_cache ADD COLUMN phash INTEGER;
+    CREATE TABLE document_cache_bands (
+        needer_id TEXT NOT NULL,
+        band INTEGER NOT NULL,
+        value INTEGER NOT NULL,
+        cache_id INTEGER NOT NULL REFERENCES document_cache(cache_id) ON DELETE CASCADE,
+        PRIMARY KEY (needer_id, band, value, cache_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_document_cache_bands_cache ON document_cache_bands(cache_id);
+    """,
+
+    # 012 - databases already past 007 when it started dropping
+    # idx_conversations_needer still have it
+    """
+    DROP INDEX IF EXISTS idx_conversations_needer;
+    """,
 ]
 def migrate():
-    
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS _migrations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            version INTEGER NOT NULL,
-            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    db.commit()
-
-    applied = db.execute("SELECT COALESCE(MAX(version), -1) FROM _migrations").fetchone()[0]
-
-    for i, sql in enumerate(MIGRATIONS):
-        if i > applied:
-            print(f"Applying migration {i}...")
-            db.conn.executescript(sql)
-            db.execute("INSERT INTO _migrations (version) VALUES (?)", (i,))
-            db.commit()
-            print(f"Migration {i} done.")
+    with db.write() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS _migrations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                version INTEGER NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        applied = conn.execute("SELECT COALESCE(MAX(version), -1) FROM _migrations").fetchone()[0]
+
+        for i, sql in enumerate(MIGRATIONS):
+            if i > applied:
+                print(f"Applying migration {i}...")
+                conn.executescript(sql)
+                conn.execute("INSERT INTO _migrations (version) VALUES (?)", (i,))
+                conn.commit()
+                print(f"Migration {i} done.")
 
 if __name__ == "__main__":
     migrate()
\ No newline at end of file
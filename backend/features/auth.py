@@ -1,12 +1,26 @@
 import base64
+import binascii
+import datetime
 import uuid
 
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from db.db import db
+from features.cache import TTLCache
+from features import metrics
 import os
 import hashlib
 
+SESSION_TTL = datetime.timedelta(days=int(os.getenv("SESSION_TTL_DAYS", "30")))
+
+# token hash -> user_id, or None for tokens we know are invalid. Entries are
+# short-lived so a logout handled by another worker process still takes
+# effect within SESSION_CACHE_TTL seconds.
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+SESSION_NEGATIVE_TTL = float(os.getenv("SESSION_NEGATIVE_TTL", "30"))
+session_cache = TTLCache(maxsize=int(os.getenv("SESSION_CACHE_SIZE", "10000")), ttl=SESSION_CACHE_TTL)
+metrics.register("session_cache", session_cache.stats)
+
 def login(provider: str, oauth_code: str, local_email: str) -> str:
 
     match provider:
@@ -27,11 +41,12 @@ def login(provider: str, oauth_code: str, local_email: str) -> str:
 
 def logout(token: bytes) -> bool:
     token_hash = hash_token(token)
-    res = db.execute(
-        "DELETE FROM sessions WHERE token_hash = ?",
-        (token_hash.hex(),)
-    )
-    db.commit()
+    with db.write() as conn:
+        res = conn.execute(
+            "DELETE FROM sessions WHERE token_hash = ?",
+            (token_hash.hex(),)
+        )
+    session_cache.pop(token_hash.hex())
 
     if res.rowcount == 0:
         raise ValueError("Session not found")
@@ -39,45 +54,89 @@ def logout(token: bytes) -> bool:
 
 def getUser(provider: str, subject: str) -> str | None:
     query = """
-        SELECT * FROM users
+        SELECT id FROM users
         WHERE provider = ?
         AND subject = ?
         LIMIT 1
     """
     
-    row = db.execute(query, (provider, subject)).fetchone()
+    with db.read() as conn:
+        row = conn.execute(query, (provider, subject)).fetchone()
     if row is None:
         return None
 
     return row["id"]
 
-bearer_scheme = HTTPBearer()
-def authenticate(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    raw = base64.urlsafe_b64decode(credentials.credentials)
-    token_hash = hash_token(raw)
+def session_user(token: str) -> str | None:
+    try:
+        raw = base64.urlsafe_b64decode(token)
+    except (binascii.Error, ValueError):
+        return None
+    key = hash_token(raw).hex()
+
+    cached = session_cache.get(key, default=False)
+    if cached is not False:
+        return cached
 
     query = """
-        SELECT * FROM sessions WHERE token_hash = ? LIMIT 1
+        SELECT user_id, created_at FROM sessions
+        WHERE token_hash = ?
+        AND created_at > ?
+        LIMIT 1
     """
 
-    row = db.execute(query, (token_hash.hex(),)).fetchone()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with db.read() as conn:
+        row = conn.execute(query, (key, format_timestamp(now - SESSION_TTL))).fetchone()
     if row is None:
-        raise HTTPException(status_code=401, detail="Invalid or expired session")
+        session_cache.set(key, None, ttl=SESSION_NEGATIVE_TTL)
+        return None
 
+    # Never cache a session past the moment it expires
+    expires_at = datetime.datetime.fromisoformat(row["created_at"]) + SESSION_TTL
+    session_cache.set(key, row["user_id"], ttl=min(SESSION_CACHE_TTL, (expires_at - now).total_seconds()))
     return row["user_id"]
 
+bearer_scheme = HTTPBearer()
+def authenticate(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    user_id = session_user(credentials.credentials)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+
+    return user_id
+
+def delete_sessions(user_id: str) -> int:
+    with db.write() as conn:
+        rows = conn.execute(
+            "DELETE FROM sessions WHERE user_id = ? RETURNING token_hash",
+            (user_id,)
+        ).fetchall()
+    for row in rows:
+        session_cache.pop(row["token_hash"])
+    return len(rows)
+
+def purge_expired_sessions() -> int:
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - SESSION_TTL
+    with db.write() as conn:
+        rows = conn.execute(
+            "DELETE FROM sessions WHERE created_at <= ? RETURNING token_hash",
+            (format_timestamp(cutoff),)
+        ).fetchall()
+    for row in rows:
+        session_cache.pop(row["token_hash"])
+    return len(rows)
+
 def createUser(provider: str, subject: str) -> str | None:
     query = """
         INSERT INTO users (id, provider, subject) VALUES (?, ?, ?)
     """
 
     user_id = str(uuid.uuid4())
-    res = db.execute(query, (user_id, provider, subject))
+    with db.write() as conn:
+        res = conn.execute(query, (user_id, provider, subject))
     if res.rowcount == 0:
         return None
 
-    db.commit()
-
     return user_id
 
 def createSession(id: str) -> str:
@@ -87,11 +146,11 @@ def createSession(id: str) -> str:
     token, tokenHash = create_session_token()
 
 
-    res = db.execute(query, (id, tokenHash.hex()))
+    with db.write() as conn:
+        res = conn.execute(query, (id, tokenHash.hex()))
     if res.rowcount == 0:
         print("failed to create session")
-    
-    db.commit()
+
     token = base64.urlsafe_b64encode(token).decode()
 
     return token
@@ -103,4 +162,8 @@ def create_session_token() -> tuple[bytes, bytes]:
     return raw, hash_
 
 def hash_token(raw: bytes) -> bytes:
-    return hashlib.sha256(raw).digest()
\ No newline at end of file
+    return hashlib.sha256(raw).digest()
+
+def format_timestamp(ts: datetime.datetime) -> str:
+    # Same shape as the schema's strftime('%Y-%m-%dT%H:%M:%fZ', 'now') defaults
+    return ts.strftime("%Y-%m-%dT%H:%M:%S.") + f"{ts.microsecond // 1000:03d}Z"
@@ -0,0 +1,70 @@
+# bench_storage.py
+#
+# Per-upload overhead of a fresh boto3 client per request (the old
+# s3_client()) against the shared, pooled one. Point AWS_ENDPOINT_URL at a
+# local S3 stand-in (moto_server, MinIO); without it moto's in-process mock
+# is used, which still shows the client construction cost:
+#
+#     cd backend && python -m features.bench_storage [uploads] [size_kb]
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_BUCKET_NAME", "bench-uploads")
+
+from features.storage import S3StreamUpload, bucket_name, s3_client
+
+
+def fresh_client():
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
+    )
+
+
+def upload(client, body: bytes) -> float:
+    start = time.perf_counter()
+    stream = S3StreamUpload(f"bench/{uuid.uuid4()}.jpg", "image/jpeg", s3=client() if client else None)
+    for i in range(0, len(body), 64 * 1024):
+        stream.write(body[i:i + 64 * 1024])
+    stream.complete()
+    return time.perf_counter() - start
+
+
+def measure(label: str, client, uploads: int, body: bytes, threads: int = 1) -> None:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        times = list(pool.map(lambda _: upload(client, body), range(uploads)))
+    elapsed = time.perf_counter() - start
+    p95 = sorted(times)[int(len(times) * 0.95) - 1]
+    print(f"{label:<28} {statistics.median(times) * 1000:8.1f} ms p50 {p95 * 1000:8.1f} ms p95 {uploads / elapsed:8.1f} uploads/s")
+
+
+def main(uploads: int, size_kb: int) -> None:
+    body = os.urandom(size_kb * 1024)
+    s3_client().create_bucket(Bucket=bucket_name())
+    print(f"{uploads} uploads of {size_kb} KB")
+    measure("new client per upload", fresh_client, uploads, body)
+    measure("shared client", None, uploads, body)
+    measure("new client per upload, x8", fresh_client, uploads, body, threads=8)
+    measure("shared client, x8", None, uploads, body, threads=8)
+
+
+if __name__ == "__main__":
+    uploads = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    if os.getenv("AWS_ENDPOINT_URL"):
+        main(uploads, size_kb)
+    else:
+        from moto import mock_aws
+        with mock_aws():
+            main(uploads, size_kb)
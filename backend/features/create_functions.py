@@ -1,77 +1,125 @@
 import uuid
 import time
 from db.db import db
+from features.events import hub
+
+
+def needer_for_convo(conn, convo_id: str) -> str | None:
+    row = conn.execute(
+        "SELECT needer_id FROM conversations WHERE convo_id = ?", (convo_id,)
+    ).fetchone()
+    return row["needer_id"] if row else None
+
+
+def publish(needer_id: str | None, event: dict) -> None:
+    # Inside an outer db.write() the rows aren't visible until it commits
+    if needer_id:
+        db.after_commit(lambda: hub.publish(needer_id, event))
 
 
 def create_convo(needer_id: str) -> str:
     convo_id = str(uuid.uuid4())
-    db.execute(
-        "INSERT INTO conversations (convo_id, needer_id) VALUES (?, ?)",
-        (convo_id, needer_id)
-    )
-    db.commit()
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO conversations (convo_id, needer_id) VALUES (?, ?)",
+            (convo_id, needer_id)
+        )
+    publish(needer_id, {"type": "convo", "convo_id": convo_id})
     return convo_id
 
 
 def create_alert(doc_id: str, message: str, transcript_item_id: str = None) -> str:
     alert_id = str(uuid.uuid4())
-    db.execute(
-        "INSERT INTO alerts (alert_id, doc_id, transcript_item_id, message) VALUES (?, ?, ?, ?)",
-        (alert_id, doc_id, transcript_item_id, message)
-    )
-    db.commit()
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO alerts (alert_id, doc_id, transcript_item_id, message) VALUES (?, ?, ?, ?)",
+            (alert_id, doc_id, transcript_item_id, message)
+        )
+        row = conn.execute(
+            "SELECT c.convo_id, c.needer_id FROM documents d JOIN conversations c ON c.convo_id = d.convo_id WHERE d.document_id = ?",
+            (doc_id,)
+        ).fetchone()
+    if row:
+        publish(row["needer_id"], {"type": "alert", "convo_id": row["convo_id"], "alert_id": alert_id, "doc_id": doc_id})
     return alert_id
 
 
-def create_document(convo_id: str, overview: str, content: str, url: str = None) -> str:
+def create_document(convo_id: str, overview: str, content: str, url: str = None, status: str = "done") -> str:
     document_id = str(uuid.uuid4())
-    db.execute(
-        "INSERT INTO documents (document_id, convo_id, url, overview, content) VALUES (?, ?, ?, ?, ?)",
-        (document_id, convo_id, url, overview, content)
-    )
-    db.commit()
+    with db.write() as conn:
+        needer_id = needer_for_convo(conn, convo_id)
+        conn.execute(
+            "INSERT INTO documents (document_id, convo_id, needer_id, url, overview, content, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (document_id, convo_id, needer_id, url, overview, content, status)
+        )
+    publish(needer_id, {"type": "document", "convo_id": convo_id, "document_id": document_id, "status": status})
     return document_id
 
 
 def create_transcript_item(convo_id: str, speaker: str, content: str) -> str:
     transcript_item_id = str(uuid.uuid4())
-    db.execute(
-        "INSERT INTO transcript_items (transcript_item_id, convo_id, speaker, timestamp, content) VALUES (?, ?, ?, ?, ?)",
-        (transcript_item_id, convo_id, speaker, time.time(), content)
-    )
-    db.commit()
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO transcript_items (transcript_item_id, convo_id, speaker, timestamp, content) VALUES (?, ?, ?, ?, ?)",
+            (transcript_item_id, convo_id, speaker, time.time(), content)
+        )
+        needer_id = needer_for_convo(conn, convo_id)
+    publish(needer_id, {"type": "transcript_item", "convo_id": convo_id, "transcript_item_id": transcript_item_id})
     return transcript_item_id
 
 
+def create_transcript_items(convo_id: str, items: list[tuple]) -> list[str]:
+    """
+    Bulk insert for importers, replays and a turn's user/LILY pair: one
+    executemany, one commit and one event. Each item is (speaker, content)
+    or (speaker, content, timestamp).
+    """
+    now = time.time()
+    rows = [
+        (str(uuid.uuid4()), convo_id, item[0], item[2] if len(item) > 2 and item[2] is not None else now, item[1])
+        for item in items
+    ]
+    if not rows:
+        return []
+    with db.write() as conn:
+        conn.executemany(
+            "INSERT INTO transcript_items (transcript_item_id, convo_id, speaker, timestamp, content) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        needer_id = needer_for_convo(conn, convo_id)
+    publish(needer_id, {"type": "transcript_item", "convo_id": convo_id, "transcript_item_id": rows[-1][0], "count": len(rows)})
+    return [row[0] for row in rows]
+
+
 def create_household(name: str) -> str:
     household_id = str(uuid.uuid4())
-    db.execute(
-        "INSERT INTO households (household_id, name) VALUES (?, ?)",
-        (household_id, name)
-    )
-    db.commit()
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO households (household_id, name) VALUES (?, ?)",
+            (household_id, name)
+        )
     return household_id
 
 
 def add_household_member(household_id: str, user_id: str) -> None:
-    db.execute(
-        "INSERT INTO household_members (household_id, user_id) VALUES (?, ?)",
-        (household_id, user_id)
-    )
-    db.commit()
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO household_members (household_id, user_id) VALUES (?, ?)",
+            (household_id, user_id)
+        )
 
 
 def create_careneeder(user_id: str, first_name: str, last_name: str, pfp: str = None) -> None:
-    db.execute(
-        "INSERT INTO careneeders (user_id, first_name, last_name, pfp) VALUES (?, ?, ?, ?)",
-        (user_id, first_name, last_name, pfp)
-    )
-    db.commit()
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO careneeders (user_id, first_name, last_name, pfp) VALUES (?, ?, ?, ?)",
+            (user_id, first_name, last_name, pfp)
+        )
 
 
 def create_caretaker(user_id: str, first_name: str, last_name: str, pfp: str = None) -> None:
-    db.execute(
-        "INSERT INTO caretakers (user_id, first_name, last_name, pfp) VALUES (?, ?, ?, ?)",
-        (user_id, first_name, last_name, pfp)
-    )
-    db.commit()
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO caretakers (user_id, first_name, last_name, pfp) VALUES (?, ?, ?, ?)",
+            (user_id, first_name, last_name, pfp)
+        )
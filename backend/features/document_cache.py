@@ -0,0 +1,212 @@
+# backend/features/document_cache.py
+#
+# People scan the same letter or pill bottle again and again. Results are
+# cached per care-needer, three ways:
+#   - by the sha256 of the uploaded file, so re-sending the very same photo
+#     reuses its OCR text instead of running Tesseract again
+#   - by a perceptual hash of the photo, so a new photo of the same letter
+#     skips both Tesseract and the LLM. Lookalike letters share a layout, so a
+#     candidate only counts once a strip of the new photo (ocr.probe_text)
+#     reads like the stored text, down to every date, amount and number.
+#   - by the sha256 of the OCR words, so any other photo of the same document
+#     still skips the LLM. The `[LN:n][x y w h]` boxes differ in every photo,
+#     so only the lowercased words are hashed.
+# Nothing is shared between needers, so one household's overview can never be
+# read out for another's document.
+import difflib
+import hashlib
+import os
+import re
+import threading
+
+import cv2
+import numpy as np
+
+from db.db import db
+from features import metrics
+
+CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+MIN_TEXT_CHARS = 20          # below this the summary comes from the picture, not the text
+PHASH_BANDS = 8
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))   # must stay < PHASH_BANDS
+MIN_PROBE_WORDS = 8          # fewer than this and a probe can't tell two letters apart
+MIN_SIMILARITY = 0.9         # share of the probe's words found, in order, in the stored text
+
+_LINE_BOX = re.compile(r"^\[LN:\d+\]\[[^\]]*\]", re.MULTILINE)
+
+_stats_lock = threading.Lock()
+_stats = {"image_hits": 0, "near_hits": 0, "text_hits": 0, "misses": 0, "evictions": 0}
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def stats() -> dict:
+    with _stats_lock:
+        snapshot = dict(_stats)
+    # Every document ends in a near-duplicate hit or a text lookup; image_hits counts the OCR runs skipped on the way
+    lookups = snapshot["near_hits"] + snapshot["text_hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = (snapshot["near_hits"] + snapshot["text_hits"]) / lookups if lookups else 0.0
+    with db.read() as conn:
+        row = conn.execute("SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS size_bytes FROM document_cache").fetchone()
+    snapshot.update(entries=row["entries"], size_bytes=row["size_bytes"], max_bytes=CACHE_MAX_BYTES)
+    return snapshot
+
+
+metrics.register("document_cache", stats)
+
+
+def normalize(extracted_text: str) -> str:
+    """Just the words of ocr.extract_text output: no line boxes, lowercased, single-spaced."""
+    return " ".join(_LINE_BOX.sub("", extracted_text).lower().split())
+
+
+def text_hash(extracted_text: str) -> str:
+    return hashlib.sha256(normalize(extracted_text).encode()).hexdigest()
+
+
+def image_phash(image: bytes) -> int:
+    """64-bit difference hash: robust to rescaling, JPEG noise and small lighting changes."""
+    gray = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _signed(phash: int) -> int:
+    # SQLite integers are signed 64-bit
+    return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+
+def _bands(phash: int) -> list[tuple[int, int]]:
+    return [(band, (phash >> (8 * band)) & 0xFF) for band in range(PHASH_BANDS)]
+
+
+def _touch(conn, cache_id: int) -> None:
+    conn.execute(
+        "UPDATE document_cache SET hits = hits + 1, last_used_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE cache_id = ?",
+        (cache_id,)
+    )
+
+
+def image_hash(image: bytes) -> str:
+    return hashlib.sha256(image).hexdigest()
+
+
+def cacheable(extracted_text: str) -> bool:
+    """Too little text and the overview describes the photo itself, so the text can't key it."""
+    return len(normalize(extracted_text).replace(" ", "")) >= MIN_TEXT_CHARS
+
+
+def lookup_image(needer_id: str, image_sha256: str) -> dict | None:
+    """This needer's entry for exactly this file, if they've sent it before."""
+    with db.read() as conn:
+        row = conn.execute(
+            "SELECT cache_id, extracted_text FROM document_cache WHERE needer_id = ? AND image_sha256 = ? LIMIT 1",
+            (needer_id, image_sha256)
+        ).fetchone()
+    if row is None:
+        return None
+    _count("image_hits")
+    return dict(row)
+
+
+def near_candidates(needer_id: str, phash: int) -> list[dict]:
+    """This needer's entries whose photo hash is within PHASH_MAX_DISTANCE bits of `phash`, closest first."""
+    bands = _bands(phash)
+    # One primary-key lookup per band
+    per_band = " UNION ".join("SELECT cache_id FROM document_cache_bands WHERE needer_id = ? AND band = ? AND value = ?" for _ in bands)
+    with db.read() as conn:
+        rows = conn.execute(
+            f"SELECT cache_id, phash, extracted_text, overview FROM document_cache WHERE cache_id IN ({per_band})",
+            [v for band, value in bands for v in (needer_id, band, value)]
+        ).fetchall()
+
+    scored = [(((row["phash"] & 0xFFFFFFFFFFFFFFFF) ^ phash).bit_count(), dict(row)) for row in rows]
+    return [row for distance, row in sorted(scored, key=lambda s: s[0]) if distance <= PHASH_MAX_DISTANCE]
+
+
+def reads_like(probe: str, extracted_text: str) -> bool:
+    """
+    Whether at least MIN_SIMILARITY of the probe's words appear, in order, in
+    `extracted_text`, and none of the ones that don't has a digit in it: two
+    reminders that differ only in the date are different letters.
+    """
+    probe_words, words = normalize(probe).split(), normalize(extracted_text).split()
+    if not probe_words:
+        return False
+    matcher = difflib.SequenceMatcher(None, probe_words, words, autojunk=False)
+    matched = set()
+    for block in matcher.get_matching_blocks():
+        matched.update(range(block.a, block.a + block.size))
+    unmatched = [word for i, word in enumerate(probe_words) if i not in matched]
+    if any(c.isdigit() for word in unmatched for c in word):
+        return False
+    return 1 - len(unmatched) / len(probe_words) >= MIN_SIMILARITY
+
+
+def confirm(candidates: list[dict], probe: str) -> dict | None:
+    """The closest candidate whose text the probe reads like, if the probe says enough to tell."""
+    if len(normalize(probe).split()) < MIN_PROBE_WORDS:
+        return None
+    best = next((candidate for candidate in candidates if reads_like(probe, candidate["extracted_text"])), None)
+    if best is None:
+        return None
+    with db.write() as conn:
+        _touch(conn, best["cache_id"])
+    _count("near_hits")
+    return best
+
+
+def lookup_text(needer_id: str, extracted_text: str) -> dict | None:
+    if not cacheable(extracted_text):
+        _count("misses")
+        return None
+    with db.read() as conn:
+        row = conn.execute(
+            "SELECT cache_id, extracted_text, overview FROM document_cache WHERE needer_id = ? AND text_hash = ? LIMIT 1",
+            (needer_id, text_hash(extracted_text))
+        ).fetchone()
+    if row is None:
+        _count("misses")
+        return None
+    with db.write() as conn:
+        _touch(conn, row["cache_id"])
+    _count("text_hits")
+    return dict(row)
+
+
+def store(needer_id: str, image_sha256: str, phash: int, extracted_text: str, overview: str) -> None:
+    if not cacheable(extracted_text):
+        return
+    size = len(extracted_text.encode()) + len(overview.encode())
+    with db.write() as conn:
+        cache_id = conn.execute(
+            "INSERT INTO document_cache (needer_id, image_sha256, phash, text_hash, extracted_text, overview, size_bytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (needer_id, image_sha256, _signed(phash), text_hash(extracted_text), extracted_text, overview, size)
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO document_cache_bands (needer_id, band, value, cache_id) VALUES (?, ?, ?, ?)",
+            [(needer_id, band, value, cache_id) for band, value in _bands(phash)]
+        )
+        _count("evictions", _evict(conn))
+
+
+def _evict(conn) -> int:
+    # Drop least-recently-used entries until the cache fits in CACHE_MAX_BYTES
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM document_cache").fetchone()[0]
+    evicted = 0
+    while total > CACHE_MAX_BYTES:
+        row = conn.execute(
+            "SELECT cache_id, size_bytes FROM document_cache ORDER BY last_used_at ASC LIMIT 1"
+        ).fetchone()
+        if row is None:
+            break
+        conn.execute("DELETE FROM document_cache WHERE cache_id = ?", (row["cache_id"],))
+        total -= row["size_bytes"]
+        evicted += 1
+    return evicted
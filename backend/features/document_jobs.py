@@ -0,0 +1,267 @@
+# backend/features/document_jobs.py
+#
+# Uploads stream the image to S3 and enqueue a job; the slow part (Tesseract
+# OCR, vision LLM summary) runs here afterwards. Jobs live in the
+# document_jobs table so anything still queued when the server stops is picked
+# up again on the next start.
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from db.db import db
+from features.create_functions import publish
+from features.storage import download_from_s3, run_s3
+from features import document_cache
+from ai.ai import extract_text_from_image, adocument_summary
+from ai import ocr, retrieval
+
+MAX_ATTEMPTS = 3
+WORKERS = int(os.getenv("DOCUMENT_WORKERS", "4"))
+# No more OCR processes than jobs can run at once, each with its share of the cores
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", str(min(os.cpu_count() or 1, WORKERS))))
+OCR_THREADS = int(os.getenv("OCR_THREADS", str(max(1, (os.cpu_count() or 1) // OCR_PROCESSES))))
+HANDOFF_TTL = 600            # seconds an uploaded image waits for its job before it is dropped
+
+
+def enqueue_document_job(document_id: str, object_key: str, sha256: str = None, size_bytes: int = None) -> str:
+    job_id = str(uuid.uuid4())
+    with db.write() as conn:
+        conn.execute(
+            "INSERT INTO document_jobs (job_id, document_id, object_key, sha256, size_bytes) VALUES (?, ?, ?, ?, ?)",
+            (job_id, document_id, object_key, sha256, size_bytes)
+        )
+    return job_id
+
+
+def claim_next_job() -> dict | None:
+    with db.write() as conn:
+        row = conn.execute(
+            """
+            UPDATE document_jobs
+            SET status = 'running',
+                attempts = attempts + 1,
+                updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+            WHERE job_id = (
+                SELECT job_id FROM document_jobs
+                WHERE status = 'pending'
+                ORDER BY created_at ASC
+                LIMIT 1
+            )
+            RETURNING *
+            """
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def complete_job(job: dict, overview: str) -> None:
+    with db.write() as conn:
+        conn.execute(
+            "UPDATE documents SET overview = ?, content = ?, status = 'done' WHERE document_id = ?",
+            (overview, overview, job["document_id"])
+        )
+        conn.execute(
+            "UPDATE document_jobs SET status = 'done', error = NULL, updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE job_id = ?",
+            (job["job_id"],)
+        )
+        needer_id, event = document_event(conn, job["document_id"], "done")
+    publish(needer_id, event)
+    retrieval.schedule(retrieval.index_document, job["document_id"])
+
+
+def document_event(conn: sqlite3.Connection, document_id: str, status: str) -> tuple[str | None, dict]:
+    row = conn.execute(
+        "SELECT c.convo_id, c.needer_id FROM documents d JOIN conversations c ON c.convo_id = d.convo_id WHERE d.document_id = ?",
+        (document_id,)
+    ).fetchone()
+    if not row:
+        return None, {}
+    return row["needer_id"], {"type": "document", "convo_id": row["convo_id"], "document_id": document_id, "status": status}
+
+
+def document_needer(document_id: str) -> str | None:
+    with db.read() as conn:
+        row = conn.execute("SELECT needer_id FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+    return row["needer_id"] if row else None
+
+
+def fail_job(job: dict, error: str) -> None:
+    # Give up after MAX_ATTEMPTS, otherwise put it back in the queue
+    status = "failed" if job["attempts"] >= MAX_ATTEMPTS else "pending"
+    needer_id, event = None, {}
+    with db.write() as conn:
+        conn.execute(
+            "UPDATE document_jobs SET status = ?, error = ?, updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE job_id = ?",
+            (status, error, job["job_id"])
+        )
+        if status == "failed":
+            conn.execute(
+                "UPDATE documents SET status = 'failed' WHERE document_id = ?",
+                (job["document_id"],)
+            )
+            needer_id, event = document_event(conn, job["document_id"], "failed")
+    publish(needer_id, event)
+
+
+def requeue_interrupted_jobs() -> int:
+    # Anything left 'running' belonged to a process that died mid-job
+    with db.write() as conn:
+        res = conn.execute(
+            "UPDATE document_jobs SET status = 'pending' WHERE status = 'running'"
+        )
+    return res.rowcount
+
+
+def get_document_status(conn: sqlite3.Connection, document_id: str) -> dict | None:
+    row = conn.execute(
+        """
+        SELECT d.document_id, d.status, d.overview, j.error
+        FROM documents d
+        LEFT JOIN document_jobs j ON j.document_id = d.document_id
+        WHERE d.document_id = ?
+        ORDER BY j.created_at DESC
+        LIMIT 1
+        """,
+        (document_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+class DocumentWorker:
+    """
+    Pool of asyncio tasks draining document_jobs. OCR is CPU-bound so it goes to
+    a process pool and the LLM call is awaited.
+
+    The upload route hands over the image bytes it already has in memory via
+    submit(); only jobs recovered after a restart download them from S3.
+
+    `ocr`, `probe`, `summarize` and `download` are injectable so the worker
+    can be driven with the LLM (or S3) stubbed out.
+    """
+
+    def __init__(self, workers: int = WORKERS, ocr=extract_text_from_image, probe=ocr.probe_text, summarize=adocument_summary, download=download_from_s3, poll_interval: float = 5.0):
+        self.workers = workers
+        self.ocr = ocr
+        self.probe = probe
+        self.summarize = summarize
+        self.download = download
+        self.poll_interval = poll_interval
+        self._images: dict[str, tuple[float, bytes]] = {}
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._pool: ProcessPoolExecutor | None = None
+
+    async def start(self) -> None:
+        requeued = await asyncio.to_thread(requeue_interrupted_jobs)
+        if requeued:
+            print(f"[document_jobs] requeued {requeued} interrupted job(s)")
+        # Each OCR process loads its Tesseract engine once, up front. The server
+        # already runs threads (S3, retrieval, the threadpool), and forking it could
+        # copy a lock some thread holds, so processes come from a clean forkserver.
+        self._pool = ProcessPoolExecutor(
+            max_workers=OCR_PROCESSES,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=ocr.warm_up,
+            initargs=(OCR_THREADS,),
+        )
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def notify(self) -> None:
+        """Wake an idle worker right away instead of waiting for the next poll."""
+        self._wake.set()
+
+    def submit(self, object_key: str, image: bytes) -> None:
+        """
+        Keep the uploaded bytes around for the job so it skips the S3 round-trip.
+        Safe from any thread; call notify() from the event loop afterwards. Bytes
+        whose job never claims them (it already went to S3) expire after HANDOFF_TTL.
+        """
+        now = time.monotonic()
+        for key, (at, _) in list(self._images.items()):
+            if now - at > HANDOFF_TTL:
+                self._images.pop(key, None)
+        self._images[object_key] = (now, image)
+
+    async def load_image(self, object_key: str) -> bytes:
+        handoff = self._images.pop(object_key, None)
+        if handoff is not None:
+            return handoff[1]
+        # Jobs queued before uploads went to S3 directly still point at a local file
+        if os.path.exists(object_key):
+            return await asyncio.to_thread(Path(object_key).read_bytes)
+        return await run_s3(self.download, object_key)
+
+    async def _loop(self) -> None:
+        while True:
+            job = await asyncio.to_thread(claim_next_job)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+
+            await self.process(job)
+
+    async def process(self, job: dict) -> None:
+        try:
+            image = await self.load_image(job["object_key"])
+            needer_id = await asyncio.to_thread(document_needer, job["document_id"])
+            overview = await self.read_document(image, needer_id, job.get("sha256"))
+        except Exception as e:
+            print(f"[document_jobs] job {job['job_id']} failed: {e}")
+            await asyncio.to_thread(fail_job, job, str(e))
+            return
+
+        await asyncio.to_thread(complete_job, job, overview)
+
+    async def read_document(self, image: bytes, needer_id: str | None, image_sha256: str | None = None) -> str:
+        if needer_id is None:
+            raise ValueError("Document has no care-needer")
+        image_sha256 = image_sha256 or document_cache.image_hash(image)
+
+        loop = asyncio.get_running_loop()
+
+        # The very same file again: its OCR text is already known
+        seen = await asyncio.to_thread(document_cache.lookup_image, needer_id, image_sha256)
+        if seen:
+            extracted_text = seen["extracted_text"]
+        else:
+            phash = await asyncio.to_thread(document_cache.image_phash, image)
+            # A photo that looks like one this needer already sent: if a strip of
+            # it reads the same, skip OCR and the LLM
+            candidates = await asyncio.to_thread(document_cache.near_candidates, needer_id, phash)
+            if candidates:
+                probe = await loop.run_in_executor(self._pool, self.probe, image)
+                near = await asyncio.to_thread(document_cache.confirm, candidates, probe)
+                if near:
+                    return near["overview"]
+            extracted_text = await loop.run_in_executor(self._pool, self.ocr, image)
+
+        # Same text as a document this needer has already had read: skip the LLM
+        hit = await asyncio.to_thread(document_cache.lookup_text, needer_id, extracted_text)
+        if hit:
+            overview = hit["overview"]
+        else:
+            overview = await self.summarize(image, extracted_text=extracted_text)
+
+        if not seen:
+            await asyncio.to_thread(document_cache.store, needer_id, image_sha256, phash, extracted_text, overview)
+        return overview
+
+
+document_worker = DocumentWorker()
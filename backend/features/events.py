@@ -0,0 +1,88 @@
+# backend/features/events.py
+#
+# Pub/sub for pushing changes to the caretaker app instead of having it poll.
+# Writers publish after their transaction commits; subscribers are keyed by
+# topic, which is the care-needer's user id.
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Sent in place of whatever was dropped when a subscriber falls behind; the
+# client answers it with one delta fetch (GET /convo/{id}?since=...).
+RESYNC = {"type": "resync"}
+
+
+@dataclass(eq=False)
+class Subscription:
+    topic: str
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(SUBSCRIBER_QUEUE_SIZE))
+    dropped: int = 0
+
+    def offer(self, event: dict) -> None:
+        # Runs on the subscriber's loop. A full queue means the client is not
+        # keeping up: drop the backlog rather than grow without bound.
+        if self.queue.full():
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class Hub(ABC):
+    """
+    Interface every backend implements. InProcessHub only reaches subscribers
+    in this process; a multi-worker deployment swaps in one that relays through
+    e.g. Redis pub/sub, without touching publishers or the websocket route.
+    """
+
+    @abstractmethod
+    def publish(self, topic: str, event: dict) -> None: ...
+
+    @abstractmethod
+    def subscribe(self, topic: str) -> Subscription: ...
+
+    @abstractmethod
+    def unsubscribe(self, sub: Subscription) -> None: ...
+
+
+class InProcessHub(Hub):
+    def __init__(self):
+        self._subs: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic: str, event: dict) -> None:
+        # Publishers are usually threadpool workers, so hand the event to each
+        # subscriber's own event loop rather than touching its queue here.
+        with self._lock:
+            subs = list(self._subs.get(topic, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, event)
+            except RuntimeError:
+                # Loop already closed; the subscriber is going away
+                self.unsubscribe(sub)
+
+    def subscribe(self, topic: str) -> Subscription:
+        sub = Subscription(topic=topic, loop=asyncio.get_running_loop())
+        with self._lock:
+            self._subs.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.topic)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.topic]
+
+
+hub: Hub = InProcessHub()
@@ -1,32 +1,154 @@
 # backend/features/get_function.py
-from db.db import db
+import base64
+import json
+import sqlite3
 
+DOCUMENT_COLUMNS = "rowid AS _rowid, document_id, convo_id, created_at, url, overview, status"
 
-def get_convo(convo_id: str):
-    # All transcript items
-    transcripts = [dict(r) for r in db.execute(
-        "SELECT * FROM transcript_items WHERE convo_id = ? ORDER BY timestamp ASC",
-        (convo_id,)
+
+def parse_cursor(cursor: str | None) -> tuple[int, int, int]:
+    # "<transcript rowid>.<document rowid>.<alert rowid>", as handed out by get_convo
+    if not cursor:
+        return 0, 0, 0
+    try:
+        transcript, document, alert = (int(part) for part in cursor.split("."))
+    except ValueError:
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    return transcript, document, alert
+
+
+def get_convo(conn: sqlite3.Connection, convo_id: str, since: str | None = None, include_content: bool = True):
+    """
+    Everything in a conversation, or with `since` only what was added after
+    that cursor. The returned `cursor` goes into the next call.
+
+    Documents are filled in by a background job after upload, so the document
+    part of the cursor never moves past a still-pending document; it keeps
+    being re-sent until it is done.
+    """
+    after_transcript, after_document, after_alert = parse_cursor(since)
+
+    # Transcript items since the cursor
+    transcripts = [dict(r) for r in conn.execute(
+        "SELECT rowid AS _rowid, * FROM transcript_items WHERE convo_id = ? AND rowid > ? ORDER BY timestamp ASC",
+        (convo_id, after_transcript)
+    ).fetchall()]
+
+    # Documents since the cursor
+    columns = DOCUMENT_COLUMNS + (", content" if include_content else "")
+    documents = [dict(r) for r in conn.execute(
+        f"SELECT {columns} FROM documents WHERE convo_id = ? AND rowid > ? ORDER BY created_at ASC",
+        (convo_id, after_document)
     ).fetchall()]
 
-    # All documents
-    documents = [dict(r) for r in db.execute(
-        "SELECT * FROM documents WHERE convo_id = ? ORDER BY created_at ASC",
-        (convo_id,)
+    # Alerts since the cursor, across every document in this convo
+    alerts = [dict(r) for r in conn.execute(
+        """
+        SELECT a.rowid AS _rowid, a.* FROM alerts a
+        JOIN documents d ON d.document_id = a.doc_id
+        WHERE d.convo_id = ? AND a.rowid > ?
+        ORDER BY a.timestamp ASC
+        """,
+        (convo_id, after_alert)
     ).fetchall()]
 
-    # All alerts across all documents in this convo
-    alerts = []
-    if documents:
-        doc_ids = [d["document_id"] for d in documents]
-        placeholders = ",".join("?" * len(doc_ids))
-        alerts = [dict(r) for r in db.execute(
-            f"SELECT * FROM alerts WHERE doc_id IN ({placeholders}) ORDER BY timestamp ASC",
-            doc_ids
-        ).fetchall()]
+    next_transcript = max((t.pop("_rowid") for t in transcripts), default=after_transcript)
+    next_alert = max((a.pop("_rowid") for a in alerts), default=after_alert)
+
+    next_document = after_document
+    pending = []
+    for d in documents:
+        rowid = d.pop("_rowid")
+        next_document = max(next_document, rowid)
+        if d["status"] == "pending":
+            pending.append(rowid)
+    if pending:
+        next_document = min(pending) - 1
 
     return {
         "transcripts": transcripts,
         "alerts": alerts,
         "documents": documents,
-    }
\ No newline at end of file
+        "cursor": f"{next_transcript}.{next_document}.{next_alert}",
+    }
+
+
+# Paged lists, newest first. Each page is a keyset seek along an index
+# ("rows before the last one I saw"), so page 500 costs the same as page 1;
+# OFFSET would read and throw away every earlier row.
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_page_cursor(*key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_page_cursor(cursor: str | None, size: int) -> list | None:
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    return key
+
+
+def _page(rows: list, limit: int, key) -> dict:
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = encode_page_cursor(*key(items[-1])) if len(rows) > limit else None
+    for item in items:
+        item.pop("_rowid", None)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def list_convos(conn: sqlite3.Connection, needer_id: str, cursor: str | None = None, limit: int = PAGE_SIZE) -> dict:
+    """A needer's conversations, most recent first, with when each started and last saw activity."""
+    after = decode_page_cursor(cursor, 1)
+    rows = conn.execute(
+        f"""
+        SELECT c.rowid AS _rowid, c.convo_id, c.needer_id,
+            (SELECT MIN(t.timestamp) FROM transcript_items t WHERE t.convo_id = c.convo_id) AS started_at,
+            (SELECT MAX(t.timestamp) FROM transcript_items t WHERE t.convo_id = c.convo_id) AS last_activity_at
+        FROM conversations c
+        WHERE c.needer_id = ? {"AND c.rowid < ?" if after else ""}
+        ORDER BY c.rowid DESC
+        LIMIT ?
+        """,
+        (needer_id, *(after or ()), limit + 1)
+    ).fetchall()
+    return _page(rows, limit, lambda item: (item["_rowid"],))
+
+
+def list_documents(conn: sqlite3.Connection, needer_id: str, cursor: str | None = None, limit: int = PAGE_SIZE, include_content: bool = False) -> dict:
+    """A needer's documents across all conversations, newest first."""
+    after = decode_page_cursor(cursor, 2)
+    columns = DOCUMENT_COLUMNS + (", content" if include_content else "")
+    rows = conn.execute(
+        f"""
+        SELECT {columns} FROM documents
+        WHERE needer_id = ? {"AND (created_at, rowid) < (?, ?)" if after else ""}
+        ORDER BY created_at DESC, rowid DESC
+        LIMIT ?
+        """,
+        (needer_id, *(after or ()), limit + 1)
+    ).fetchall()
+    return _page(rows, limit, lambda item: (item["created_at"], item["_rowid"]))
+
+
+def list_transcript_items(conn: sqlite3.Connection, convo_id: str, cursor: str | None = None, limit: int = PAGE_SIZE) -> dict:
+    """A conversation's transcript, newest first; follow next_cursor to scroll back."""
+    after = decode_page_cursor(cursor, 2)
+    rows = conn.execute(
+        f"""
+        SELECT rowid AS _rowid, * FROM transcript_items
+        WHERE convo_id = ? {"AND (timestamp, rowid) < (?, ?)" if after else ""}
+        ORDER BY timestamp DESC, rowid DESC
+        LIMIT ?
+        """,
+        (convo_id, *(after or ()), limit + 1)
+    ).fetchall()
+    return _page(rows, limit, lambda item: (item["timestamp"], item["_rowid"]))
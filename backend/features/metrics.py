@@ -0,0 +1,15 @@
+# backend/features/metrics.py
+#
+# Anything that keeps counters registers a callable here; GET /metrics
+# returns all of them in one JSON document for scraping.
+from typing import Callable
+
+_sources: dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, source: Callable[[], dict]) -> None:
+    _sources[name] = source
+
+
+def snapshot() -> dict:
+    return {name: source() for name, source in _sources.items()}
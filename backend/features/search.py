@@ -0,0 +1,84 @@
+# backend/features/search.py
+#
+# Full-text search over transcript items and documents through the
+# search_index FTS5 table (migration 008), which triggers keep in sync.
+# Results are ranked with BM25 (document overviews weigh double) and are
+# limited to care-needers who share a household with the caller. That scope
+# is part of the MATCH itself (needer_id is an indexed column), so only the
+# caller's rows are ever ranked, however large the index grows.
+import re
+import sqlite3
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+KINDS = ("transcript", "document")
+
+# Too common to help ranking; dropping them also keeps OR queries small
+STOPWORDS = {
+    "a", "an", "and", "are", "about", "did", "do", "does", "for", "from", "how", "i", "in", "is", "it",
+    "me", "mention", "mentioned", "my", "of", "on", "or", "say", "said", "that", "the", "to", "was",
+    "what", "when", "where", "which", "who", "with",
+}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Needers the caller may see: everyone in a household with them (and themselves)
+SCOPE = """
+    SELECT m2.user_id FROM household_members m1
+    JOIN household_members m2 ON m2.household_id = m1.household_id
+    WHERE m1.user_id = :user_id AND (:household_id IS NULL OR m1.household_id = :household_id)
+    UNION SELECT :user_id WHERE :household_id IS NULL
+"""
+
+
+def can_see(conn: sqlite3.Connection, user_id: str, needer_id: str) -> bool:
+    """Whether `needer_id` is within the caller's SCOPE."""
+    row = conn.execute(
+        f"SELECT 1 FROM ({SCOPE}) WHERE user_id = :needer_id LIMIT 1",
+        {"user_id": user_id, "household_id": None, "needer_id": needer_id}
+    ).fetchone()
+    return row is not None
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def match_expression(q: str, needer_ids: list[str]) -> str | None:
+    """
+    Plain words into an FTS5 query: every term is quoted (so user input can't
+    inject FTS syntax), terms are OR-ed so BM25 ranks the rows with the rarest
+    matches first, and the last term is a prefix so partial words still hit.
+    """
+    terms = [t for t in _TOKEN.findall(q.lower()) if t not in STOPWORDS]
+    if not terms or not needer_ids:
+        return None
+    quoted = [_quote(t) for t in terms]
+    quoted[-1] += "*"
+    return f"needer_id : ({' OR '.join(_quote(n) for n in needer_ids)}) AND ({' OR '.join(quoted)})"
+
+
+def search(conn: sqlite3.Connection, user_id: str, q: str, kind: str | None = None, needer_id: str | None = None,
+           household_id: str | None = None, limit: int = SEARCH_LIMIT) -> list[dict]:
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    needer_ids = [r[0] for r in conn.execute(SCOPE, {"user_id": user_id, "household_id": household_id})]
+    if needer_id:
+        needer_ids = [n for n in needer_ids if n == needer_id]
+    expression = match_expression(q, needer_ids)
+    if expression is None:
+        return []
+
+    rows = conn.execute(
+        f"""
+        SELECT kind, ref_id AS id, convo_id, needer_id, at, title,
+            snippet(search_index, 1, '[', ']', '…', 12) AS snippet,
+            bm25(search_index, 2.0, 1.0, 0.0) AS score
+        FROM search_index
+        WHERE search_index MATCH :expression {"AND kind = :kind" if kind else ""}
+        ORDER BY score
+        LIMIT :limit
+        """,
+        {"expression": expression, "kind": kind, "limit": limit}
+    ).fetchall()
+    return [dict(r) for r in rows]
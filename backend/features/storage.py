@@ -0,0 +1,144 @@
+# backend/features/storage.py
+#
+# The endpoint comes from AWS_ENDPOINT_URL when set (boto3 reads it itself),
+# which is how tests point this at moto or another local S3 stand-in.
+import asyncio
+import functools
+import hashlib
+import io
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+# S3 wants every multipart part but the last to be at least 5 MB
+PART_SIZE = 8 * 1024 * 1024
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32")),
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=30,
+    retries={"max_attempts": 3, "mode": "adaptive"},
+)
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=PART_SIZE,
+    multipart_chunksize=PART_SIZE,
+    max_concurrency=S3_MAX_CONCURRENCY,
+    use_threads=True,
+)
+
+# All blocking S3 calls run here, so S3 latency never ties up the event loop
+# or the threadpool FastAPI uses for sync routes.
+s3_executor = ThreadPoolExecutor(max_workers=S3_MAX_CONCURRENCY, thread_name_prefix="s3")
+
+
+@functools.cache
+def s3_client():
+    """
+    One client per process. Building a client loads the botocore service
+    model and resolves credentials (hundreds of ms); the shared one also keeps
+    its connection pool warm. boto3 clients are thread-safe.
+    """
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        config=CLIENT_CONFIG,
+    )
+
+
+async def run_s3(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(s3_executor, fn, *args)
+
+
+def bucket_name() -> str:
+    return os.getenv("AWS_BUCKET_NAME")
+
+
+def object_url(key: str) -> str:
+    return f"https://{bucket_name()}.s3.amazonaws.com/{key}"
+
+
+def download_from_s3(key: str) -> bytes:
+    # Ranged GETs in parallel for anything over PART_SIZE
+    buffer = io.BytesIO()
+    s3_client().download_fileobj(bucket_name(), key, buffer, Config=TRANSFER_CONFIG)
+    return buffer.getvalue()
+
+
+def delete_from_s3(key: str) -> None:
+    s3_client().delete_object(Bucket=bucket_name(), Key=key)
+
+
+class S3StreamUpload:
+    """
+    Uploads an object chunk by chunk as it arrives, hashing and sizing it on
+    the way, and keeps the bytes in memory so OCR never has to go to disk.
+
+    Small objects (under PART_SIZE, i.e. nearly every phone photo) end up as
+    a single put_object; larger ones switch to a multipart upload as soon as
+    the first part is full, and parts upload concurrently on s3_executor
+    while the rest of the body is still arriving.
+    """
+
+    def __init__(self, key: str, content_type: str = "application/octet-stream", s3=None):
+        self.key = key
+        self.content_type = content_type
+        self.s3 = s3 or s3_client()
+        self.bucket = bucket_name()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.data = io.BytesIO()
+        self._pending = bytearray()
+        self._upload_id: str | None = None
+        self._parts: list[Future] = []
+
+    def write(self, chunk: bytes) -> None:
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        self.data.write(chunk)
+        self._pending += chunk
+        if len(self._pending) >= PART_SIZE:
+            self._flush_part()
+
+    def _flush_part(self) -> None:
+        if self._upload_id is None:
+            self._upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+            )["UploadId"]
+        number = len(self._parts) + 1
+        self._parts.append(s3_executor.submit(self._upload_part, number, bytes(self._pending)))
+        self._pending.clear()
+
+    def _upload_part(self, number: int, body: bytes) -> dict:
+        res = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            PartNumber=number, Body=body
+        )
+        return {"PartNumber": number, "ETag": res["ETag"]}
+
+    def complete(self) -> str:
+        if self._upload_id is None:
+            self.s3.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._pending), ContentType=self.content_type
+            )
+        else:
+            if self._pending:
+                self._flush_part()
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": [part.result() for part in self._parts]}
+            )
+        self._pending.clear()
+        return object_url(self.key)
+
+    def abort(self) -> None:
+        for part in self._parts:
+            part.cancel()
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
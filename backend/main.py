@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -9,11 +10,28 @@ from routes import convo
 from routes import households
 from routes import transcript
 from routes import document
+from routes import events
+from routes import metrics
+from routes import search
+from features.document_jobs import document_worker
+from features.auth import purge_expired_sessions
+from features.storage import run_s3, s3_client, s3_executor
+from ai import retrieval
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     migrations.migrate()
+    purge_expired_sessions()
+    # Build the shared S3 client now rather than on the first upload
+    await run_s3(s3_client)
+    # Load the embedding model up front, then catch the index up in the background
+    await asyncio.to_thread(retrieval.embedder)
+    retrieval.schedule(retrieval.reindex)
+    await document_worker.start()
     yield
+    await document_worker.stop()
+    s3_executor.shutdown(wait=False)
+    retrieval.index_executor.shutdown(wait=False, cancel_futures=True)
     db.close()
 
 
@@ -25,6 +43,9 @@ app.include_router(convo.router)
 app.include_router(households.router)
 app.include_router(transcript.router)
 app.include_router(document.router)
+app.include_router(events.router)
+app.include_router(metrics.router)
+app.include_router(search.router)
 
 
 if __name__ == "__main__":
@@ -31,3 +31,9 @@ async def delete_session(credentials: HTTPAuthorizationCredentials = Depends(HTT
     raw = base64.urlsafe_b64decode(credentials.credentials)
 
     auth.logout(raw)
+
+
+@router.delete("/sessions")
+def delete_all_sessions(current_user=Depends(auth.authenticate)):
+    """Signs the caller out everywhere, e.g. after a lost phone."""
+    return {"deleted": auth.delete_sessions(current_user)}
@@ -1,9 +1,11 @@
 # backend/routes/convo.py
-from fastapi import APIRouter, HTTPException
+import sqlite3
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from features.create_functions import create_convo
-from features.get_function import get_convo
-from db.db import db
+from features.get_function import MAX_PAGE_SIZE, PAGE_SIZE, get_convo, list_convos, list_transcript_items
+from db.db import get_db
 
 router = APIRouter(prefix="/convo", tags=["convo"])
 
@@ -16,8 +18,8 @@ def create_convo_route(req: CreateConvoRequest):
     return {"convo_id": convo_id}
 
 @router.get("/latest/{needer_id}")
-def get_latest_convo(needer_id: str):
-    row = db.execute(
+def get_latest_convo(needer_id: str, conn: sqlite3.Connection = Depends(get_db)):
+    row = conn.execute(
         "SELECT * FROM conversations WHERE needer_id = ? ORDER BY rowid DESC LIMIT 1",
         (needer_id,)
     ).fetchone()
@@ -25,6 +27,23 @@ def get_latest_convo(needer_id: str):
         raise HTTPException(status_code=404, detail="No conversations found")
     return dict(row)
 
+@router.get("/needer/{needer_id}")
+def list_convos_route(needer_id: str, cursor: str | None = None, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), conn: sqlite3.Connection = Depends(get_db)):
+    try:
+        return list_convos(conn, needer_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{convo_id}/transcript")
+def list_transcript_route(convo_id: str, cursor: str | None = None, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), conn: sqlite3.Connection = Depends(get_db)):
+    try:
+        return list_transcript_items(conn, convo_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/{convo_id}")
-def get_convo_route(convo_id: str):
-    return get_convo(convo_id)
\ No newline at end of file
+def get_convo_route(convo_id: str, since: str | None = None, include_content: bool = True, conn: sqlite3.Connection = Depends(get_db)):
+    try:
+        return get_convo(conn, convo_id, since=since, include_content=include_content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
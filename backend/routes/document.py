@@ -1,57 +1,114 @@
 # backend/routes/document.py
+import asyncio
+import sqlite3
 import uuid
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from features.create_functions import create_document
-from ai.ai import document_summary
-from db.db import db
-import shutil
-import os
-import boto3
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from features.create_functions import create_document, needer_for_convo
+from features.document_jobs import document_worker, enqueue_document_job, get_document_status
+from features.get_function import MAX_PAGE_SIZE, PAGE_SIZE, list_documents
+from features.storage import S3StreamUpload, delete_from_s3, run_s3
+from db.db import db, get_db
 
 router = APIRouter(prefix="/document", tags=["document"])
 
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "uploads")
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/tiff": ".tiff"}
 
 
-def upload_to_s3(file_path: str, filename: str) -> str:
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-    bucket_name = os.getenv("AWS_BUCKET_NAME")
-    s3.upload_file(file_path, bucket_name, filename)
+async def body_chunks(request: Request):
+    """
+    The image bytes as they arrive. Raw `image/*` bodies are read straight off
+    the socket; multipart form uploads (field `file`) are still accepted, but
+    Starlette buffers those itself before we see them.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=422, detail="Missing file")
+        while chunk := await upload.read(64 * 1024):
+            yield chunk
+        return
 
-    return f"https://{bucket_name}.s3.amazonaws.com/{filename}"
+    async for chunk in request.stream():
+        yield chunk
+
+
+def convo_exists(convo_id: str) -> bool:
+    with db.read() as conn:
+        return needer_for_convo(conn, convo_id) is not None
+
+
+def record_upload(convo_id: str, url: str, key: str, sha256: str, size_bytes: int, image: bytes) -> str:
+    # Document row and its job land in one commit; the worker gets the bytes only once they have
+    with db.write():
+        document_id = create_document(convo_id=convo_id, overview=None, content=None, url=url, status="pending")
+        enqueue_document_job(document_id, key, sha256, size_bytes)
+        db.after_commit(lambda: document_worker.submit(key, image))
+    return document_id
 
 
 @router.post("/")
-async def upload_document(convo_id: str, file: UploadFile = File(...)):
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
+async def upload_document(convo_id: str, request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0]
+    ext = EXTENSIONS.get(content_type, ".jpg")
+    key = f"{uuid.uuid4()}{ext}"
+    if not await run_in_threadpool(convo_exists, convo_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    # Hash, size and push to S3 chunk by chunk; nothing touches local disk.
+    # write/complete stay on the default threadpool because complete() waits
+    # on part uploads running on s3_executor.
+    upload = S3StreamUpload(key, "image/jpeg" if ext == ".jpg" else content_type)
+    try:
+        async for chunk in body_chunks(request):
+            if upload.size + len(chunk) > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Image too large")
+            await asyncio.to_thread(upload.write, chunk)
+        if upload.size == 0:
+            raise HTTPException(status_code=422, detail="Empty upload")
+        url = await asyncio.to_thread(upload.complete)
+    except BaseException:
+        await asyncio.to_thread(upload.abort)
+        raise
 
-    s3_url = upload_to_s3(file_path, str(uuid.uuid4()))  # ← was missing
-    overview = document_summary(file_path)
+    try:
+        document_id = await run_in_threadpool(
+            record_upload, convo_id, url, key, upload.sha256.hexdigest(), upload.size, upload.data.getvalue()
+        )
+    except BaseException:
+        # No row points at the object, so nothing would ever clean it up
+        await run_s3(delete_from_s3, key)
+        raise
+    document_worker.notify()
 
-    document_id = create_document(
-        convo_id=convo_id,
-        overview=overview,
-        content=overview,
-        url=s3_url,              # ← was saving local path
-    )
+    return {"document_id": document_id, "status": "pending"}
 
-    return {"document_id": document_id, "overview": overview}
+
+@router.get("/needer/{needer_id}")
+def list_documents_route(needer_id: str, cursor: str | None = None, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), include_content: bool = False, conn: sqlite3.Connection = Depends(get_db)):
+    try:
+        return list_documents(conn, needer_id, cursor=cursor, limit=limit, include_content=include_content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{document_id}/status")
+def get_document_status_route(document_id: str, conn: sqlite3.Connection = Depends(get_db)):
+    status = get_document_status(conn, document_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return status
 
 
 @router.get("/{document_id}")
-def get_document(document_id: str):
-    row = db.execute(
+def get_document(document_id: str, conn: sqlite3.Connection = Depends(get_db)):
+    row = conn.execute(
         "SELECT * FROM documents WHERE document_id = ?", (document_id,)
     ).fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Document not found")
-    return dict(row)
\ No newline at end of file
+    return dict(row)
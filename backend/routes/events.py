@@ -0,0 +1,55 @@
+# backend/routes/events.py
+import asyncio
+import json
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from db.db import db
+from features.auth import session_user
+from features.events import hub
+from features.search import can_see
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+HEARTBEAT_SECONDS = 25
+
+
+def websocket_user(websocket: WebSocket, needer_id: str) -> str | None:
+    """The signed-in user, if they share a household with `needer_id` (or are them)."""
+    # Browsers can't set headers on a websocket, so accept ?token= as well
+    header = websocket.headers.get("authorization", "")
+    token = header.removeprefix("Bearer ").strip() or websocket.query_params.get("token")
+    if not token:
+        return None
+    user_id = session_user(token)
+    if user_id is None:
+        return None
+    with db.read() as conn:
+        return user_id if can_see(conn, user_id, needer_id) else None
+
+
+@router.websocket("/{needer_id}")
+async def needer_events(websocket: WebSocket, needer_id: str):
+    """
+    Pushes {"type": "convo" | "transcript_item" | "document" | "alert", ...}
+    as rows are written for this care-needer. {"type": "resync"} means events
+    were dropped because the client fell behind, so it should delta-fetch.
+    """
+    user_id = await run_in_threadpool(websocket_user, websocket, needer_id)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    sub = hub.subscribe(needer_id)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                event = {"type": "heartbeat"}
+            await websocket.send_text(json.dumps(event))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(sub)
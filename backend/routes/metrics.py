@@ -0,0 +1,9 @@
+# backend/routes/metrics.py
+from fastapi import APIRouter
+from features import metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("/")
+def get_metrics():
+    return metrics.snapshot()
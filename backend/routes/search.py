@@ -0,0 +1,26 @@
+# backend/routes/search.py
+import sqlite3
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+import features.auth as auth
+from features.search import MAX_SEARCH_LIMIT, SEARCH_LIMIT, search
+from db.db import get_db
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get("/")
+def search_route(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: str | None = None,
+    needer_id: str | None = None,
+    household_id: str | None = None,
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    user_id: str = Depends(auth.authenticate),
+    conn: sqlite3.Connection = Depends(get_db),
+):
+    """Best matches first; `snippet` marks the matched terms with [brackets]."""
+    try:
+        results = search(conn, user_id, q, kind=kind, needer_id=needer_id, household_id=household_id, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results}
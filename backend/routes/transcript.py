@@ -1,7 +1,14 @@
+import json
+import time
+
+import anyio
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from features.create_functions import create_transcript_item
-from ai.ai import run
+from ai.ai import arun, astream_run, stream_sentences
+from ai import retrieval, router as intent_router
 
 router = APIRouter(prefix="/transcript", tags=["transcript"])
 
@@ -9,20 +16,69 @@ class SendMessageRequest(BaseModel):
     convo_id: str
     content: str
 
-@router.post("/")
-def send_message(req: SendMessageRequest):
-    create_transcript_item(
-        convo_id=req.convo_id,
-        speaker="careneeder",
-        content=req.content
-    )
 
-    lily_response = run(req.content)
+def record_utterance(convo_id: str, content: str) -> str:
+    """Stored as soon as it is heard, so caretakers watching the convo see it before LILY answers."""
+    return create_transcript_item(convo_id, "careneeder", content)
+
 
-    create_transcript_item(
-        convo_id=req.convo_id,
-        speaker="LILY",
-        content=lily_response
-    )
+def record_reply(convo_id: str, utterance_id: str, heard_at: float, content: str, lily_response: str | None, recall: bool = True) -> None:
+    """LILY's reply, if the turn produced one. Answered turns are then embedded for later recall,
+    unless `recall` is off (local small talk)."""
+    if lily_response is None:
+        return
+    create_transcript_item(convo_id, "LILY", lily_response)
+    if recall:
+        retrieval.schedule(retrieval.index_turn, convo_id, utterance_id, content, lily_response, heard_at)
+
+
+@router.post("/")
+async def send_message(req: SendMessageRequest):
+    heard_at = time.time()
+    utterance_id = await run_in_threadpool(record_utterance, req.convo_id, req.content)
+    lily_response = None
+    route = None
+    try:
+        route = await run_in_threadpool(intent_router.route, req.content, req.convo_id)
+        if route.reply is not None:
+            lily_response = route.reply
+        else:
+            start = time.perf_counter()
+            lily_response = await arun(req.content, convo_id=req.convo_id)
+            intent_router.record_llm_turn(time.perf_counter() - start)
+    finally:
+        await run_in_threadpool(record_reply, req.convo_id, utterance_id, heard_at, req.content, lily_response, route is None or route.reply is None)
 
     return {"response": lily_response}
+
+@router.post("/stream")
+async def stream_message(req: SendMessageRequest):
+    """Same turn as POST /transcript/, but streamed back as NDJSON: one
+    {"text": ...} line per sentence, then {"done": true, "response": ...}."""
+    heard_at = time.time()
+    utterance_id = await run_in_threadpool(record_utterance, req.convo_id, req.content)
+    route = await run_in_threadpool(intent_router.route, req.content, req.convo_id)
+
+    async def events():
+        sentences = []
+        lily_response = None
+        try:
+            if route.reply is not None:
+                sentences.append(route.reply)
+                yield json.dumps({"text": route.reply}) + "\n"
+            else:
+                start = time.perf_counter()
+                async for sentence in stream_sentences(astream_run(req.content, convo_id=req.convo_id)):
+                    sentences.append(sentence)
+                    yield json.dumps({"text": sentence}) + "\n"
+                intent_router.record_llm_turn(time.perf_counter() - start)
+            lily_response = " ".join(sentences)
+        finally:
+            # A client that stops reading (the device after a barge-in) cancels this
+            # generator; whatever was already spoken is saved regardless
+            spoken = lily_response if lily_response is not None else " ".join(sentences) or None
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(record_reply, req.convo_id, utterance_id, heard_at, req.content, spoken, route.reply is None and lily_response is not None)
+        yield json.dumps({"done": True, "response": lily_response}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -0,0 +1,142 @@
+"""
+microcontroller/audio.py  —  one always-open microphone stream
+
+The mic is opened once at startup and never closed. PortAudio's callback
+thread copies every block into a preallocated ring buffer of int16 samples;
+nothing is allocated per block. Wake-word detection and speech recognition
+are consumers: each keeps its own Tap (a read cursor into the ring), so
+switching from one to the other never drops audio, and a new Tap can start
+up to RING_SECONDS in the past to replay pre-roll.
+"""
+
+import threading
+
+import numpy as np
+
+SAMPLE_RATE = 16000          # Vosk expects 16 kHz mono
+BLOCK_SIZE  = 1600           # 100 ms per callback
+RING_SECONDS = 30.0
+PREROLL_SECONDS = 1.0        # replayed when listening picks up where the wake word left off
+
+
+# ---------------------------------------------------------------------------
+# Ring buffer
+# ---------------------------------------------------------------------------
+
+class RingBuffer:
+    """
+    Fixed-size int16 ring with one writer and any number of readers.
+
+    Positions are absolute sample counts since the ring was created, so a
+    reader's cursor stays meaningful across wrap-arounds. A reader that falls
+    more than `capacity` samples behind loses the overwritten audio and skips
+    ahead to the oldest sample still held.
+    """
+
+    def __init__(self, seconds: float = RING_SECONDS, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.capacity = int(seconds * sample_rate)
+        self._data = np.zeros(self.capacity, dtype=np.int16)
+        self._written = 0                      # total samples ever written
+        self._cond = threading.Condition()
+        self.overruns = 0                      # samples readers lost by falling behind
+
+    @property
+    def position(self) -> int:
+        return self._written
+
+    def write(self, samples: np.ndarray) -> None:
+        total = len(samples)
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        with self._cond:
+            start = (self._written + total - n) % self.capacity
+            first = min(n, self.capacity - start)
+            self._data[start:start + first] = samples[:first]
+            self._data[:n - first] = samples[first:]
+            self._written += total
+            self._cond.notify_all()
+
+    def read(self, cursor: int, max_samples: int | None = None, timeout: float | None = None) -> tuple[np.ndarray, int]:
+        """
+        Samples from `cursor` up to the write position (at most `max_samples`),
+        waiting up to `timeout` seconds for some to arrive. Returns a copy and
+        the cursor to pass next time; an empty array means the wait timed out.
+        """
+        with self._cond:
+            if cursor >= self._written:
+                self._cond.wait_for(lambda: self._written > cursor, timeout)
+            oldest = max(0, self._written - self.capacity)
+            if cursor < oldest:
+                self.overruns += oldest - cursor
+                cursor = oldest
+            end = self._written if max_samples is None else min(self._written, cursor + max_samples)
+
+            start, n = cursor % self.capacity, end - cursor
+            first = min(n, self.capacity - start)
+            out = np.empty(n, dtype=np.int16)
+            out[:first] = self._data[start:start + first]
+            out[first:] = self._data[:n - first]
+        return out, end
+
+
+class Tap:
+    """One consumer's view of the ring: remembers where it has read up to."""
+
+    def __init__(self, ring: RingBuffer, start: int):
+        self.ring = ring
+        self.cursor = max(start, ring.position - ring.capacity)
+
+    def read(self, max_samples: int | None = None, timeout: float | None = 0.2) -> np.ndarray:
+        samples, self.cursor = self.ring.read(self.cursor, max_samples, timeout)
+        return samples
+
+    def rewind(self, seconds: float) -> None:
+        """Steps back so the last `seconds` of audio are read again."""
+        self.cursor = max(self.cursor - int(seconds * self.ring.sample_rate), self.ring.position - self.ring.capacity, 0)
+
+    def skip_to_now(self) -> None:
+        self.cursor = self.ring.position
+
+
+# ---------------------------------------------------------------------------
+# Capture
+# ---------------------------------------------------------------------------
+
+class AudioCapture:
+    """The microphone stream, open for the life of the process."""
+
+    def __init__(self, ring: RingBuffer | None = None, block_size: int = BLOCK_SIZE):
+        self.ring = ring or RingBuffer()
+        self.block_size = block_size
+        self.status_errors = 0
+        self._stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        # Runs on PortAudio's thread: copy into the ring and return, no allocation
+        if status:
+            self.status_errors += 1
+        self.ring.write(indata[:, 0])
+
+    def start(self) -> "AudioCapture":
+        import sounddevice as sd
+
+        self._stream = sd.InputStream(
+            samplerate=self.ring.sample_rate,
+            blocksize=self.block_size,
+            dtype="int16",
+            channels=1,
+            callback=self._callback,
+        )
+        self._stream.start()
+        print(f"[audio] capturing at {self.ring.sample_rate} Hz, {self.block_size}-sample blocks")
+        return self
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def tap(self, preroll: float = 0.0) -> Tap:
+        """A new consumer starting `preroll` seconds before now."""
+        return Tap(self.ring, self.ring.position - int(preroll * self.ring.sample_rate))
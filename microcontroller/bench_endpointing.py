@@ -0,0 +1,138 @@
+"""
+microcontroller/bench_endpointing.py  —  offline check of end-of-turn detection
+
+Replays recorded WAVs through the Endpointer in 100 ms blocks, exactly as
+listen() feeds it, and reports how long after the speaker stopped the turn
+was ended (endpoint latency) and how often it ended before they had
+finished (truncation). Every file is replayed as recorded, with background
+noise mixed in, and with a 450 ms pause spliced into the middle of the speech.
+Two seconds of the recording's own background are appended so there is
+something to endpoint on.
+
+Where the speech ends is read from `<name>.json` next to the WAV
+({"speech_end": seconds}) if there is one, otherwise estimated offline
+from the whole file.
+
+    cd microcontroller && python bench_endpointing.py [file.wav ...]
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import medfilt, resample_poly
+
+from audio import BLOCK_SIZE, SAMPLE_RATE
+from vad import FRAME_MS, Endpointer, frame_features
+
+DEFAULT_FIXTURES = [Path(__file__).resolve().parent / "recording.wav"]
+TAIL_SECONDS = 2.0
+PAUSE_SECONDS = 0.45
+NOISE_SNR_DB = 15.0
+FRAME = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def load(path: Path) -> np.ndarray:
+    """Mono int16 at 16 kHz, whatever the file's format."""
+    rate, audio = wavfile.read(path)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if np.issubdtype(audio.dtype, np.integer):
+        audio = audio / float(np.iinfo(audio.dtype).max)
+    if rate != SAMPLE_RATE:
+        g = np.gcd(rate, SAMPLE_RATE)
+        audio = resample_poly(audio, SAMPLE_RATE // g, rate // g)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def reference_speech(audio: np.ndarray, path: Path) -> tuple[int, int]:
+    """(start, end) of the speech in samples: labelled, or from the smoothed energy of the whole file."""
+    energy_db, _ = frame_features(audio[:len(audio) // FRAME * FRAME].reshape(-1, FRAME))
+    smooth = medfilt(energy_db, 5)
+    speech = np.flatnonzero(smooth > np.percentile(energy_db, 10) + 8.0)
+    start, end = (int(speech[0]) * FRAME, int(speech[-1] + 1) * FRAME) if len(speech) else (0, len(audio))
+
+    labels = path.with_suffix(".json")
+    if labels.exists():
+        end = int(json.loads(labels.read_text())["speech_end"] * SAMPLE_RATE)
+    return start, end
+
+
+def background(audio: np.ndarray, seconds: float) -> np.ndarray:
+    """The quietest 300 ms of the recording, tiled to `seconds`."""
+    n = int(0.3 * SAMPLE_RATE)
+    windows = audio[:len(audio) // n * n].reshape(-1, n).astype(np.float32)
+    quietest = windows[np.argmin((windows ** 2).mean(axis=1))]
+    return np.resize(quietest, int(seconds * SAMPLE_RATE)).astype(np.int16)
+
+
+def emphasized_power(x: np.ndarray) -> float:
+    x = x.astype(np.float32)
+    return float(np.mean((x[1:] - 0.97 * x[:-1]) ** 2))
+
+
+def with_noise(audio: np.ndarray, speech: tuple[int, int], snr_db: float, rng: np.random.Generator) -> np.ndarray:
+    """White noise at `snr_db` below the speech, measured after pre-emphasis (as the VAD hears it;
+    raw power would be dominated by low-frequency hum)."""
+    noise = rng.standard_normal(len(audio)).astype(np.float32)
+    noise *= np.sqrt(emphasized_power(audio[speech[0]:speech[1]]) / 10 ** (snr_db / 10) / emphasized_power(noise))
+    return np.clip(audio.astype(np.float32) + noise, -32768, 32767).astype(np.int16)
+
+
+def endpoint(audio: np.ndarray) -> tuple[Endpointer, float]:
+    """Runs the Endpointer over `audio` block by block; returns it and the CPU seconds it took."""
+    vad = Endpointer()
+    start = time.process_time()
+    for i in range(0, len(audio), BLOCK_SIZE):
+        if vad.feed(audio[i:i + BLOCK_SIZE]):
+            break
+    return vad, time.process_time() - start
+
+
+def cases(path: Path, rng: np.random.Generator):
+    audio = load(path)
+    speech_start, speech_end = reference_speech(audio, path)
+    tail = background(audio, TAIL_SECONDS)
+    clean = np.concatenate((audio[:speech_end], tail))
+    yield "clean", clean, speech_end
+
+    yield f"noise {NOISE_SNR_DB:.0f} dB", with_noise(clean, (speech_start, speech_end), NOISE_SNR_DB, rng), speech_end
+
+    middle = (speech_start + speech_end) // 2
+    pause = background(audio, PAUSE_SECONDS)
+    yield f"pause {PAUSE_SECONDS * 1000:.0f} ms", np.concatenate((audio[:middle], pause, audio[middle:speech_end], tail)), speech_end + len(pause)
+
+
+def main(paths: list[Path]) -> None:
+    rng = np.random.default_rng(7)
+    latencies, truncated, total, cpu, audio_seconds = [], 0, 0, 0.0, 0.0
+
+    print(f"{'file':<22} {'case':<14} {'speech end':>10} {'endpoint':>9} {'latency':>9}  result")
+    for path in paths:
+        for name, audio, speech_end in cases(path, rng):
+            vad, seconds = endpoint(audio)
+            cpu += seconds
+            audio_seconds += vad.position / SAMPLE_RATE
+            total += 1
+
+            if vad.ended_at is None:
+                print(f"{path.name:<22} {name:<14} {speech_end / SAMPLE_RATE:>9.2f}s {'never':>9} {'':>9}  missed")
+                continue
+            latency = (vad.ended_at - speech_end) / SAMPLE_RATE * 1000
+            cut = vad.ended_at < speech_end
+            truncated += cut
+            if not cut:
+                latencies.append(latency)
+            print(f"{path.name:<22} {name:<14} {speech_end / SAMPLE_RATE:>9.2f}s {vad.ended_at / SAMPLE_RATE:>8.2f}s {latency:>7.0f}ms  {'TRUNCATED' if cut else 'ok'}")
+
+    if latencies:
+        print(f"\nendpoint latency: median {np.median(latencies):.0f} ms, max {max(latencies):.0f} ms")
+    print(f"truncation rate: {truncated}/{total} ({truncated / max(total, 1):.0%})")
+    print(f"VAD cost: {cpu / max(audio_seconds, 1e-9) * 1000:.2f} ms CPU per second of audio")
+
+
+if __name__ == "__main__":
+    main([Path(p) for p in sys.argv[1:]] or DEFAULT_FIXTURES)
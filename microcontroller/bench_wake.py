@@ -0,0 +1,110 @@
+"""
+microcontroller/bench_wake.py  —  offline CPU and false-accept check of wake-word detection
+
+Replays audio through WakeDetector in 100 ms blocks, exactly as
+listen_for_wake() feeds it, and compares three setups: the full-vocabulary
+recognizer decoding every block (how idle listening used to work), the
+wake-phrase grammar decoding every block, and the grammar behind the
+EnergyGate. For each it reports CPU per second of audio, the share of
+blocks that reached the decoder, and how many wake phrases were "heard".
+
+Two scenes are built from each recording: a minute of its own background
+(an idle room), and the recording repeated with background in between
+(people talking nearby). Neither should wake the device unless the
+recording's `<name>.json` says it contains the wake phrase ({"wake": n}).
+
+Decoding needs the Vosk model in model/en (or VOSK_MODEL). Without it only
+the gate is measured.
+
+    cd microcontroller && python bench_wake.py [file.wav ...]
+"""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from audio import BLOCK_SIZE, SAMPLE_RATE
+from bench_endpointing import background, load
+from vad import EnergyGate
+from wake import WAKE_GRAMMAR, WakeDetector
+
+DEFAULT_FIXTURES = [Path(__file__).resolve().parent / "recording.wav"]
+MODEL_PATH = os.getenv("VOSK_MODEL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model", "en"))
+SCENE_SECONDS = 60.0
+GAP_SECONDS = 5.0
+
+
+class NullRecognizer:
+    """Stands in for Vosk when there is no model, so the gate can still be measured."""
+
+    def Reset(self): pass
+    def AcceptWaveform(self, data): return False
+    def Result(self): return '{"text": ""}'
+    def PartialResult(self): return '{"partial": ""}'
+    def FinalResult(self): return '{"text": ""}'
+
+
+def load_model():
+    try:
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        return Model(MODEL_PATH)
+    except Exception as e:
+        print(f"[bench] no Vosk model ({e}); measuring the gate only\n")
+        return None
+
+
+def setups(model):
+    if model is None:
+        yield "gate only", lambda: WakeDetector(NullRecognizer(), EnergyGate())
+        return
+    from vosk import KaldiRecognizer
+    yield "full vocabulary", lambda: WakeDetector(KaldiRecognizer(model, SAMPLE_RATE))
+    yield "grammar", lambda: WakeDetector(KaldiRecognizer(model, SAMPLE_RATE, WAKE_GRAMMAR))
+    yield "grammar + gate", lambda: WakeDetector(KaldiRecognizer(model, SAMPLE_RATE, WAKE_GRAMMAR), EnergyGate())
+
+
+def scenes(path: Path):
+    audio = load(path)
+    labels = path.with_suffix(".json")
+    wakes = json.loads(labels.read_text()).get("wake", 0) if labels.exists() else 0
+
+    yield "idle room", background(audio, SCENE_SECONDS), 0
+
+    gap = background(audio, GAP_SECONDS)
+    repeats = max(1, int(SCENE_SECONDS // (len(audio) / SAMPLE_RATE + GAP_SECONDS)))
+    yield "talking nearby", np.concatenate([gap, *([audio, gap] * repeats)]), wakes * repeats
+
+
+def run(detector: WakeDetector, audio: np.ndarray) -> tuple[int, float]:
+    """Feeds `audio` block by block; returns how many times it woke and the CPU seconds it took."""
+    accepts = 0
+    start = time.process_time()
+    for i in range(0, len(audio), BLOCK_SIZE):
+        if detector.feed(audio[i:i + BLOCK_SIZE]):
+            accepts += 1
+            detector.reset()
+    return accepts, time.process_time() - start
+
+
+def main(paths: list[Path]) -> None:
+    model = load_model()
+    print(f"{'file':<18} {'scene':<15} {'setup':<16} {'CPU/s audio':>11} {'decoded':>8} {'wakes':>6} {'false':>6}")
+    for path in paths:
+        for scene, audio, expected in scenes(path):
+            baseline = None
+            for name, make in setups(model):
+                accepts, seconds = run(detector := make(), audio)
+                cost = seconds / (len(audio) / SAMPLE_RATE) * 1000
+                baseline = baseline or cost
+                vs = f"  ({baseline / max(cost, 1e-9):.0f}x less)" if cost < baseline else ""
+                print(f"{path.name:<18} {scene:<15} {name:<16} {cost:>9.2f}ms {detector.decoded_share:>8.0%} "
+                      f"{accepts:>6} {max(0, accepts - expected):>6}{vs}")
+
+
+if __name__ == "__main__":
+    main([Path(p) for p in sys.argv[1:]] or DEFAULT_FIXTURES)
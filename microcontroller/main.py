@@ -2,7 +2,7 @@
 microcontroller/main.py  —  fully offline, no internet required
 
 STT:  Vosk  (local model, ~50MB)
-TTS:  pyttsx3 / espeak  (local, no API)
+TTS:  pyttsx3 / espeak  (local, no API), played by tts.Speaker
 
 Setup:
     1. pip install -r requirements.txt
@@ -19,18 +19,19 @@ Setup:
 
 import json
 import os
-import queue
 import tempfile
-import threading
 import time
 
 import cv2
-import pyttsx3
 import requests
-import sounddevice as sd
 from vosk import KaldiRecognizer, Model
 from dotenv import load_dotenv
 
+from audio import BLOCK_SIZE, PREROLL_SECONDS, SAMPLE_RATE, AudioCapture, Tap
+from tts import Speaker
+from vad import BargeIn, EchoPath, Endpointer, EnergyGate
+from wake import WAKE_GRAMMAR, WAKE_PHRASES, WakeDetector
+
 load_dotenv()
 
 # ---------------------------------------------------------------------------
@@ -39,7 +40,8 @@ load_dotenv()
 
 BASE_URL   = os.getenv("BACKEND_URL", "http://localhost:3000")
 NEEDER_ID  = os.getenv("NEEDER_ID")
-SAMPLE_RATE = 16000          # Vosk expects 16 kHz mono
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"   # speak sentence-by-sentence
+BARGE_IN   = os.getenv("BARGE_IN", "1") == "1"             # stop talking when the user talks over LILY
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "model", "en")
 
@@ -51,114 +53,138 @@ print("[vosk] loading model…")
 _model = Model(MODEL_PATH)
 print("[vosk] model ready")
 
+# One recognizer per job, reused (Reset) rather than rebuilt on every call
+_listen_rec = KaldiRecognizer(_model, SAMPLE_RATE)
+_listen_rec.SetWords(False)   # faster without word timestamps
+# The wake recognizer only knows the wake phrases, and sleeps through silence
+_wake = WakeDetector(KaldiRecognizer(_model, SAMPLE_RATE, WAKE_GRAMMAR), EnergyGate())
+
+# The mic stays open from startup; listen() and listen_for_wake() read it through Taps
+_capture = AudioCapture()
+
+# Decides when the user has finished a turn; keeps its noise floor between turns
+_endpointer = Endpointer()
+
 # ---------------------------------------------------------------------------
 # TTS
 # ---------------------------------------------------------------------------
 
-_tts = pyttsx3.init()
-_tts.setProperty("rate", 155)
-_tts_lock = threading.Lock()
+GREETING      = "Hi! I'm Lily. How can I help you today?"
+STILL_HERE    = "I'm still here whenever you're ready."
+GOODBYE       = "Goodbye! Take care."
+HOLD_DOCUMENT = "Hold the document up to the camera and stay still."
+BAD_PHOTO     = "I couldn't get a clear photo. Can you try again?"
+READING       = "Got it — let me read that for you."
+BAD_READ      = "I had trouble reading that. Can you hold it a bit closer?"
+MISSED        = "Sorry, I missed that. Could you say it again?"
+NO_SERVER     = "I'm having trouble connecting to the server."
+RESTARTING    = "Something went wrong. I'll restart."
+
+# How loud LILY comes back through the mic; measured while she talks, kept for the session
+_echo = EchoPath()
+
+# Fixed prompts are rendered once to disk; everything else as it comes
+_speaker = Speaker(
+    cached=(GREETING, STILL_HERE, GOODBYE, HOLD_DOCUMENT, BAD_PHOTO, READING, BAD_READ, MISSED, NO_SERVER, RESTARTING),
+    capture=_capture if BARGE_IN else None,
+    barge_in=lambda: BargeIn(_endpointer.noise_db, _echo),
+)
+BARGE_IN_PREROLL = 0.5       # the start of what the user said over LILY, before barge-in was detected
 
 
-def speak(text: str):
+def speak(text: str) -> bool:
+    """Says `text` and waits for it to finish; True if the user talked over it."""
     print(f"[LILY] {text}")
-    with _tts_lock:
-        _tts.say(text)
-        _tts.runAndWait()
+    _speaker.say(text)
+    return _speaker.wait()
 
 # ---------------------------------------------------------------------------
-# STT  —  stream mic audio through Vosk until a pause, return transcript
+# STT  —  feed mic audio from a Tap through Vosk until a pause, return transcript
 # ---------------------------------------------------------------------------
 
-def listen(silence_timeout: float = 3.0, max_duration: float = 20.0) -> str | None:
+WAKE_FOLLOW_UP = 1.0         # how long to wait for a request said in the same breath as the wake word
+
+
+def listen(tap: Tap, silence_timeout: float = 3.0, max_duration: float = 20.0) -> str | None:
     """
-    Record from mic, run Vosk locally, return lowercased transcript.
-    Returns None if nothing was heard within `silence_timeout` seconds.
+    Run Vosk over audio from `tap`, return lowercased transcript.
+    Returns None if nobody started speaking within `silence_timeout` seconds.
     `max_duration` is a hard cap so we never block forever mid-conversation.
-    """
-    q: queue.Queue[bytes] = queue.Queue()
-
-    def _callback(indata, frames, time_info, status):
-        q.put(bytes(indata))
+    Reading starts at the tap's cursor, so audio already in the ring (e.g.
+    pre-roll after the wake word) is transcribed too.
 
-    rec = KaldiRecognizer(_model, SAMPLE_RATE)
-    rec.SetWords(False)       # faster without word timestamps
+    The Endpointer, not Vosk, decides when the turn is over: Vosk may
+    finalize a segment at a pause, but we keep listening until the VAD says
+    the speaker has stopped, then take Vosk's final result right away.
+    """
+    rec = _listen_rec
+    rec.Reset()
+    vad = _endpointer
+    vad.reset()
 
-    result_text = None
+    parts = []
+    partial = ""
     deadline = time.time() + max_duration
-    last_speech_at = time.time()
 
     print("[listening…]")
-    with sd.RawInputStream(
-        samplerate=SAMPLE_RATE,
-        blocksize=4000,
-        dtype="int16",
-        channels=1,
-        callback=_callback,
-    ):
-        while True:
-            if time.time() > deadline:
-                break
-
-            try:
-                data = q.get(timeout=0.2)
-            except queue.Empty:
-                continue
+    while time.time() < deadline:
+        samples = tap.read(BLOCK_SIZE)
+        if not len(samples):
+            continue
 
-            if rec.AcceptWaveform(data):
-                # Vosk returned a final result for this utterance
-                text = json.loads(rec.Result()).get("text", "").strip()
-                if text:
-                    result_text = text.lower()
-                    break
-                # Empty final result — keep going
-            else:
-                # Check partial to detect speech activity
-                partial = json.loads(rec.PartialResult()).get("partial", "")
-                if partial:
-                    last_speech_at = time.time()
-                elif time.time() - last_speech_at > silence_timeout:
-                    # Long silence with nothing partial → bail out
-                    # Grab whatever Vosk has finalised so far
-                    text = json.loads(rec.FinalResult()).get("text", "").strip()
-                    if text:
-                        result_text = text.lower()
-                    break
+        if rec.AcceptWaveform(samples.tobytes()):
+            # Vosk finalized a segment; the turn may still go on
+            text = json.loads(rec.Result()).get("text", "").strip()
+            if text:
+                parts.append(text)
+            partial = ""
+        else:
+            partial = json.loads(rec.PartialResult()).get("partial", "")
+
+        if vad.feed(samples):
+            break
+        # Nobody has spoken (judged on audio time, since pre-roll replays faster than real time)
+        if not vad.started and not partial and not parts and vad.heard_seconds > silence_timeout:
+            break
+
+    text = json.loads(rec.FinalResult()).get("text", "").strip()
+    if text:
+        parts.append(text)
+
+    if vad.ended:
+        print(f"[vad] turn ended {(vad.ended_at - vad.speech_end) / SAMPLE_RATE * 1000:.0f} ms after speech")
 
+    result_text = " ".join(parts).lower() or None
     if result_text:
         print(f"[heard] {result_text}")
     return result_text
 
 
-def listen_for_wake() -> bool:
+def listen_for_wake(tap: Tap) -> bool:
     """
-    Lightweight hot-word loop: short clips, just look for the wake phrase.
-    Uses a smaller buffer and short silence timeout so idle CPU is low.
+    Hot-word loop over `tap`: just look for the wake phrase. Returns once it
+    is heard, leaving the tap's cursor just past it.
     """
-    q: queue.Queue[bytes] = queue.Queue()
-
-    def _callback(indata, frames, time_info, status):
-        q.put(bytes(indata))
-
-    rec = KaldiRecognizer(_model, SAMPLE_RATE)
-
-    with sd.RawInputStream(
-        samplerate=SAMPLE_RATE,
-        blocksize=4000,
-        dtype="int16",
-        channels=1,
-        callback=_callback,
-    ):
-        while True:
-            data = q.get()
-            if rec.AcceptWaveform(data):
-                text = json.loads(rec.Result()).get("text", "").lower()
-            else:
-                text = json.loads(rec.PartialResult()).get("partial", "").lower()
+    _wake.reset()
+
+    while True:
+        heard = _wake.feed(tap.read(BLOCK_SIZE, timeout=None))
+        if heard:
+            print(f"[wake] detected: '{heard}' (decoded {_wake.decoded_share:.0%} of idle audio)")
+            return True
 
-            if any(w in text for w in ("hey lily", "hi lily", "okay lily")):
-                print(f"[wake] detected: '{text}'")
-                return True
+
+def strip_wake(text: str | None) -> str | None:
+    """What was said after the wake phrase, or None if nothing was."""
+    if not text:
+        return None
+    for phrase in WAKE_PHRASES:
+        if phrase in text:
+            text = text.rsplit(phrase, 1)[1]
+    words = text.split()
+    while words and words[0] in ("lily", "hey", "hi", "okay"):
+        words.pop(0)
+    return " ".join(words) or None
 
 # ---------------------------------------------------------------------------
 # Camera
@@ -212,17 +238,58 @@ def api_send_message(convo_id: str, text: str) -> str | None:
         return None
 
 
-def api_upload_document(convo_id: str, photo_path: str) -> dict | None:
+def api_stream_message(convo_id: str, text: str):
+    """
+    Yields LILY's reply one sentence at a time from /transcript/stream, so
+    speak() can start on the first sentence while the rest is still generating.
+    """
     try:
+        with requests.post(
+            f"{BASE_URL}/transcript/stream",
+            json={"convo_id": convo_id, "content": text},
+            stream=True,
+            timeout=30,
+        ) as res:
+            res.raise_for_status()
+            for line in res.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("text"):
+                    yield event["text"]
+    except Exception as e:
+        print(f"[api] stream_message: {e}")
+
+
+def api_upload_document(convo_id: str, photo_path: str, wait: float = 60.0) -> dict | None:
+    """
+    Uploads the photo, then polls /document/{id}/status until the backend's
+    worker has filled in the overview (or `wait` seconds pass).
+    """
+    try:
+        # Sent as a raw image body so the backend can stream it straight to S3
         with open(photo_path, "rb") as f:
             res = requests.post(
                 f"{BASE_URL}/document/",
                 params={"convo_id": convo_id},
-                files={"file": ("document.jpg", f, "image/jpeg")},
-                timeout=60,
+                data=f,
+                headers={"Content-Type": "image/jpeg"},
+                timeout=30,
             )
         res.raise_for_status()
-        return res.json()
+        document_id = res.json()["document_id"]
+
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            res = requests.get(f"{BASE_URL}/document/{document_id}/status", timeout=10)
+            res.raise_for_status()
+            status = res.json()
+            if status["status"] != "pending":
+                return status
+            time.sleep(1.0)
+
+        print(f"[api] upload_document: {document_id} still pending after {wait:.0f}s")
+        return None
     except Exception as e:
         print(f"[api] upload_document: {e}")
         return None
@@ -256,43 +323,66 @@ def wants_scan(text: str) -> bool:
 # Conversation
 # ---------------------------------------------------------------------------
 
-def run_conversation(convo_id: str):
-    speak("Hi! I'm Lily. How can I help you today?")
+def run_conversation(convo_id: str, tap: Tap):
+    # The tap starts just before the wake word, so a request said in the same
+    # breath ("hey lily, what day is it?") becomes the first turn
+    pending = strip_wake(listen(tap, silence_timeout=WAKE_FOLLOW_UP))
+    interrupted = False
+    if pending is None:
+        interrupted = speak(GREETING)
 
     while True:
-        user_text = listen()
+        if pending is not None:
+            user_text, pending = pending, None
+        else:
+            tap.skip_to_now()       # don't transcribe LILY's own voice…
+            if interrupted:
+                tap.rewind(BARGE_IN_PREROLL)   # …but do hear whoever talked over her
+            user_text = listen(tap)
+        interrupted = False
 
         if user_text is None:
-            speak("I'm still here whenever you're ready.")
+            interrupted = speak(STILL_HERE)
             continue
 
         if is_end(user_text):
-            speak("Goodbye! Take care.")
+            speak(GOODBYE)
             break
 
         if wants_scan(user_text):
-            speak("Hold the document up to the camera and stay still.")
+            speak(HOLD_DOCUMENT)
             time.sleep(1.5)
             photo_path = take_photo()
 
             if not photo_path:
-                speak("I couldn't get a clear photo. Can you try again?")
+                interrupted = speak(BAD_PHOTO)
                 continue
 
-            speak("Got it — let me read that for you.")
+            speak(READING)
             result = api_upload_document(convo_id, photo_path)
 
             if result and result.get("overview"):
-                speak(result["overview"])
+                interrupted = speak(result["overview"])
             else:
-                speak("I had trouble reading that. Can you hold it a bit closer?")
+                interrupted = speak(BAD_READ)
+            continue
+
+        if STREAM_REPLIES:
+            spoke = False
+            for sentence in api_stream_message(convo_id, user_text):
+                # Queued, not awaited: the next sentence renders while this one plays
+                print(f"[LILY] {sentence}")
+                _speaker.say(sentence)
+                spoke = True
+                if _speaker.barged_in:
+                    break
+            interrupted = _speaker.wait()
+            if not spoke:
+                interrupted = speak(MISSED)
             continue
 
         reply = api_send_message(convo_id, user_text)
-        if reply:
-            speak(reply)
-        else:
-            speak("Sorry, I missed that. Could you say it again?")
+        interrupted = speak(reply or MISSED)
 
 
 # ---------------------------------------------------------------------------
@@ -306,23 +396,28 @@ def main():
         )
 
     print("=== LILY ready (fully offline STT) ===")
+    _capture.start()
+    _speaker.warm()
+    tap = _capture.tap()
 
     while True:
         print("[idle] waiting for wake word…")
-        listen_for_wake()           # blocks until "hey lily"
+        tap.skip_to_now()
+        listen_for_wake(tap)        # blocks until "hey lily"
+        tap.rewind(PREROLL_SECONDS)  # replay the tail of the wake phrase and whatever followed it
 
         convo_id = api_create_convo()
         if not convo_id:
-            speak("I'm having trouble connecting to the server.")
+            speak(NO_SERVER)
             time.sleep(5)
             continue
 
         print(f"[session] convo_id={convo_id}")
         try:
-            run_conversation(convo_id)
+            run_conversation(convo_id, tap)
         except Exception as e:
             print(f"[error] {e}")
-            speak("Something went wrong. I'll restart.")
+            speak(RESTARTING)
 
         print("[session] ended")
 
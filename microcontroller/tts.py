@@ -0,0 +1,219 @@
+"""
+microcontroller/tts.py  —  speech output off the main thread
+
+speak() used to hold the engine for the whole of runAndWait(), so nothing
+else could happen while LILY talked. The Speaker splits what it's given into
+sentences and runs two threads: one renders each sentence to audio with
+pyttsx3's save_to_file (the engine only ever lives on that thread), the
+other plays the rendered clips through sounddevice. Sentence two is being
+synthesized while sentence one plays.
+
+While a clip plays, the player also reads the always-open mic through its
+own Tap. The detector is told the level of every chunk played and learns
+how much of it reaches the mic, so only a voice clearly louder than LILY's
+own echo counts. If it hears the user talking
+over her, playback stops and everything still queued is dropped.
+
+Fixed prompts are rendered once into TTS_CACHE_DIR (keyed on the text and
+speaking rate) and kept in memory, so they start playing immediately.
+"""
+
+import hashlib
+import os
+import queue
+import re
+import tempfile
+import threading
+from collections.abc import Callable, Iterable
+
+import numpy as np
+import pyttsx3
+from scipy.io import wavfile
+
+from audio import AudioCapture
+from vad import BargeIn
+
+TTS_RATE = 155
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache"))
+CHUNK_SECONDS = 0.1          # playback granularity, and how often the mic is checked for barge-in
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+class Speaker:
+    """
+    say() queues text and returns at once; wait() blocks until it has all
+    been played (or dropped) and reports whether the user barged in. After a
+    barge-in, say() ignores further text until wait() has been called, so
+    the rest of a streamed reply isn't spoken over the user.
+    """
+
+    def __init__(
+        self,
+        rate: int = TTS_RATE,
+        cached: Iterable[str] = (),
+        cache_dir: str = TTS_CACHE_DIR,
+        capture: AudioCapture | None = None,
+        barge_in: Callable[[], BargeIn] | None = None,
+    ):
+        self.rate = rate
+        self.cached = set(cached)
+        self.cache_dir = cache_dir
+        self.capture = capture
+        self.barge_in = barge_in
+        self.barged_in = False
+
+        self._texts: queue.Queue[tuple[int, str]] = queue.Queue()
+        self._clips: queue.Queue[tuple[int, int, np.ndarray]] = queue.Queue()
+        self._memory: dict[str, tuple[int, np.ndarray]] = {}
+        self._generation = 0         # bumped by interrupt(); older work is dropped
+        self._pending = 0            # sentences queued but not yet played
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._out = None             # sd.OutputStream, reopened if the sample rate changes
+
+        threading.Thread(target=self._synth_loop, name="tts-synth", daemon=True).start()
+        threading.Thread(target=self._play_loop, name="tts-play", daemon=True).start()
+
+    # -- public ---------------------------------------------------------------
+
+    def say(self, text: str) -> None:
+        with self._cond:
+            if self.barged_in:
+                return
+            parts = [text] if text in self.cached else split_sentences(text)
+            for part in parts:
+                self._pending += 1
+                self._texts.put((self._generation, part))
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until everything said has played; returns True if the user interrupted."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending == 0, timeout)
+            barged, self.barged_in = self.barged_in, False
+        return barged
+
+    def interrupt(self) -> None:
+        """Stops playback now and drops whatever is still queued."""
+        with self._cond:
+            self._generation += 1
+            self._pending = 0
+            self._stop.set()
+            self._cond.notify_all()
+
+    def warm(self) -> None:
+        """Renders the cached phrases in the background, so the first use doesn't wait on synthesis."""
+        for text in self.cached:
+            self._texts.put((-1, text))
+
+    # -- synthesis ------------------------------------------------------------
+
+    def _cache_path(self, text: str) -> str:
+        key = hashlib.sha1(f"{self.rate}:{text}".encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _render(self, engine, text: str) -> tuple[int, np.ndarray]:
+        if text in self._memory:
+            return self._memory[text]
+
+        cached = text in self.cached
+        path = self._cache_path(text) if cached else tempfile.mktemp(suffix=".wav")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp.wav"
+            engine.save_to_file(text, tmp)
+            engine.runAndWait()
+            os.replace(tmp, path)
+
+        sample_rate, data = wavfile.read(path)
+        if not cached:
+            os.remove(path)
+        if data.ndim > 1:
+            data = data[:, 0]
+        if data.dtype != np.int16:
+            data = (np.clip(data.astype(np.float32), -1.0, 1.0) * 32767).astype(np.int16)
+
+        clip = (sample_rate, np.ascontiguousarray(data))
+        if cached:
+            self._memory[text] = clip
+        return clip
+
+    def _synth_loop(self) -> None:
+        engine = pyttsx3.init()
+        engine.setProperty("rate", self.rate)
+        while True:
+            generation, text = self._texts.get()
+            if generation != -1 and generation != self._generation:
+                continue
+            try:
+                sample_rate, data = self._render(engine, text)
+            except Exception as e:
+                # Rendering to a file isn't supported everywhere: speak it directly instead
+                print(f"[tts] render failed ({e}); speaking directly")
+                if generation != -1:
+                    engine.say(text)
+                    engine.runAndWait()
+                    self._done(generation)
+                continue
+            if generation != -1:
+                self._clips.put((generation, sample_rate, data))
+
+    # -- playback -------------------------------------------------------------
+
+    def _done(self, generation: int) -> None:
+        with self._cond:
+            if generation == self._generation:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def _stream(self, sample_rate: int):
+        import sounddevice as sd
+
+        if self._out is None or self._out.samplerate != sample_rate:
+            if self._out is not None:
+                self._out.close()
+            self._out = sd.OutputStream(samplerate=sample_rate, channels=1, dtype="int16")
+            self._out.start()
+        return self._out
+
+    def _play(self, generation: int, sample_rate: int, data: np.ndarray) -> None:
+        out = self._stream(sample_rate)
+        watch = self.capture is not None and self.barge_in is not None
+        tap = self.capture.tap() if watch else None
+        detector = self.barge_in() if watch else None
+
+        chunk = int(CHUNK_SECONDS * sample_rate)
+        for i in range(0, len(data), chunk):
+            if self._stop.is_set() or generation != self._generation:
+                break
+            out.write(data[i:i + chunk])
+            if detector is None:
+                continue
+            detector.played(data[i:i + chunk], sample_rate)
+            if detector.feed(tap.read(timeout=0)):
+                print("[tts] barge-in: stopping playback")
+                with self._cond:
+                    self.barged_in = True
+                self.interrupt()
+                break
+
+        if self._stop.is_set():
+            # Drop what's buffered in the device rather than letting it finish
+            out.abort()
+            out.start()
+
+    def _play_loop(self) -> None:
+        while True:
+            generation, sample_rate, data = self._clips.get()
+            if generation != self._generation:
+                continue
+            self._stop.clear()
+            try:
+                self._play(generation, sample_rate, data)
+            except Exception as e:
+                print(f"[tts] playback: {e}")
+            self._done(generation)
@@ -0,0 +1,264 @@
+"""
+microcontroller/vad.py  —  end-of-turn detection from frame energy
+
+Vosk's own endpointing waits for a long stretch of silence, so turns used to
+end seconds after the user stopped talking. The Endpointer decides instead:
+it splits audio into 20 ms frames, computes each frame's energy (after
+pre-emphasis, which strips the hum and rumble a Pi's mic picks up) and
+zero-crossing rate in one vectorized pass, and compares them against a noise
+floor it keeps adapting. The turn ends once speech has been absent for the
+hangover. The hangover grows with the longest pause the speaker has already
+made in this utterance, so someone who pauses between phrases isn't cut off,
+while a fluent sentence ends ~350 ms after the last word.
+"""
+
+from collections import deque
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+
+FRAME_MS = 20
+SPEECH_MARGIN_DB = 6.0       # above the noise floor
+FRICATIVE_MARGIN_DB = 3.0    # quieter, but noisy like an "s" or "f"
+FRICATIVE_ZCR = 0.3
+MIN_ENERGY_DB = -55.0        # never call anything this quiet speech
+ONSET_FRAMES = 3             # 60 ms of speech before an utterance counts as started
+HANGOVER_BASE = 0.35         # seconds of silence that end a fluent utterance
+HANGOVER_MAX = 0.8
+PAUSE_GAIN = 1.0             # hangover grows by the longest pause so far, times this
+NOISE_FALL = 0.2             # the floor drops quickly when it gets quieter…
+NOISE_RISE = 0.02            # …and creeps up (~1 s) during non-speech
+
+
+def frame_features(frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per-frame energy in dBFS (pre-emphasized) and zero-crossing rate, for int16 frames of shape (n, frame)."""
+    x = frames.astype(np.float32) / 32768.0
+    emphasized = x[:, 1:] - 0.97 * x[:, :-1]
+    energy_db = 10.0 * np.log10(np.mean(emphasized * emphasized, axis=1) + 1e-10)
+    zcr = np.mean(np.signbit(x[:, 1:]) != np.signbit(x[:, :-1]), axis=1)
+    return energy_db, zcr
+
+
+class Endpointer:
+    """
+    Feed it int16 blocks of any size; feed() returns True once an utterance
+    has started and then ended. Positions are in samples fed since reset().
+    The noise floor survives reset(), so each turn starts calibrated.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.frame = sample_rate * FRAME_MS // 1000
+        self.sample_rate = sample_rate
+        self.noise_db: float | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        self._pending = np.zeros(0, dtype=np.int16)
+        self.position = 0            # samples consumed as whole frames
+        self.started = False
+        self.ended = False
+        self.speech_start: int | None = None
+        self.speech_end: int | None = None     # end of the last speech frame
+        self.ended_at: int | None = None       # where the end was declared
+        self._onset = 0
+        self._silence = 0
+        self._longest_pause = 0
+
+    @property
+    def hangover_frames(self) -> int:
+        pause = self._longest_pause * FRAME_MS / 1000
+        return int(min(HANGOVER_MAX, HANGOVER_BASE + PAUSE_GAIN * pause) * 1000 / FRAME_MS)
+
+    def is_speech(self, energy_db: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+        floor = self.noise_db if self.noise_db is not None else float(np.min(energy_db))
+        loud = energy_db > floor + SPEECH_MARGIN_DB
+        hiss = (energy_db > floor + FRICATIVE_MARGIN_DB) & (zcr > FRICATIVE_ZCR)
+        return (loud | hiss) & (energy_db > MIN_ENERGY_DB)
+
+    def feed(self, samples: np.ndarray) -> bool:
+        if self.ended:
+            return True
+        samples = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        n = len(samples) // self.frame
+        self._pending = samples[n * self.frame:].copy()
+        if n == 0:
+            return False
+
+        energy_db, zcr = frame_features(samples[:n * self.frame].reshape(n, self.frame))
+        speech = self.is_speech(energy_db, zcr)
+
+        for i in range(n):
+            e = float(energy_db[i])
+            if self.noise_db is None:
+                self.noise_db = e
+            elif e < self.noise_db:
+                self.noise_db += NOISE_FALL * (e - self.noise_db)
+            elif not speech[i]:
+                self.noise_db += NOISE_RISE * (e - self.noise_db)
+
+            end = self.position + (i + 1) * self.frame
+            if speech[i]:
+                if self.started and self._silence:
+                    self._longest_pause = max(self._longest_pause, self._silence)
+                self._silence = 0
+                self._onset += 1
+                if not self.started and self._onset >= ONSET_FRAMES:
+                    self.started = True
+                    self.speech_start = end - self._onset * self.frame
+                if self.started:
+                    self.speech_end = end
+            else:
+                self._onset = 0
+                if self.started:
+                    self._silence += 1
+                    if self._silence >= self.hangover_frames:
+                        self.ended = True
+                        self.ended_at = end
+                        break
+
+        self.position += n * self.frame
+        return self.ended
+
+    @property
+    def heard_seconds(self) -> float:
+        return self.position / self.sample_rate
+
+
+# ---------------------------------------------------------------------------
+# Energy gate  —  lets the wake-word decoder sleep through silence
+# ---------------------------------------------------------------------------
+
+GATE_MARGIN_DB = 6.0         # a frame this far above the room opens the gate
+GATE_HOLD = 0.6              # seconds the gate stays open after the last loud frame
+GATE_RISE = 0.05             # per block (~2 s) — the floor follows a room that gets louder
+
+
+class EnergyGate:
+    """
+    Per-block check for "is anything louder than the room happening?". The
+    floor is tracked on the quietest frame of each block, so the gaps
+    between words keep it honest even while someone is talking.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.frame = sample_rate * FRAME_MS // 1000
+        self.hold = int(GATE_HOLD * sample_rate)
+        self.noise_db: float | None = None
+        self.position = 0
+        self._open_until = -1
+
+    def update(self, samples: np.ndarray) -> bool:
+        """Feeds one block; returns whether the gate is open for it."""
+        n = len(samples) // self.frame
+        self.position += len(samples)
+        if n == 0:
+            return self.position <= self._open_until
+
+        energy_db, _ = frame_features(samples[:n * self.frame].reshape(n, self.frame))
+        quietest, loudest = float(energy_db.min()), float(energy_db.max())
+        if self.noise_db is None:
+            self.noise_db = quietest
+        else:
+            self.noise_db += (NOISE_FALL if quietest < self.noise_db else GATE_RISE) * (quietest - self.noise_db)
+
+        if loudest > self.noise_db + GATE_MARGIN_DB and loudest > MIN_ENERGY_DB:
+            self._open_until = self.position + self.hold
+        return self.position <= self._open_until
+
+
+# ---------------------------------------------------------------------------
+# Barge-in  —  the user talking over playback
+# ---------------------------------------------------------------------------
+
+BARGE_IN_MARGIN_DB = 12.0    # over the floor, and over LILY's own voice in the mic
+BARGE_IN_FRAMES = 12         # 240 ms of it
+BARGE_IN_ECHO_CHUNKS = 3     # played chunks that may still be coming back through the mic
+ECHO_WINDOW = 50             # coupling measurements kept (~5 s of LILY talking)
+ECHO_MIN_MEASUREMENTS = 10   # ~1 s of her talking before the coupling is trusted
+ECHO_MIN_PLAYED_DB = -45.0   # quieter playback says nothing about the coupling
+
+
+def level_db(samples: np.ndarray, sample_rate: int) -> float | None:
+    """Mean power of `samples` in dBFS, measured like frame_features; None if under one frame."""
+    frame = sample_rate * FRAME_MS // 1000
+    n = len(samples) // frame
+    if n == 0:
+        return None
+    energy_db, _ = frame_features(samples[:n * frame].reshape(n, frame))
+    return float(10.0 * np.log10(np.mean(10.0 ** (energy_db / 10.0))))
+
+
+class EchoPath:
+    """
+    How loud LILY comes back through the mic compared to what was played:
+    mic level minus played level, measured while she talks. It depends on
+    the speaker volume, the mic gain and the room, so it is measured each
+    session rather than assumed. Someone talking over her only ever raises
+    a measurement, so the estimate is the median of the recent ones.
+    """
+
+    def __init__(self):
+        self._coupling: deque[float] = deque(maxlen=ECHO_WINDOW)
+
+    def measure(self, mic_db: float, played_db: float) -> None:
+        if played_db > ECHO_MIN_PLAYED_DB:
+            self._coupling.append(mic_db - played_db)
+
+    @property
+    def coupling_db(self) -> float | None:
+        if len(self._coupling) < ECHO_MIN_MEASUREMENTS:
+            return None
+        return float(np.median(self._coupling))
+
+
+class BargeIn:
+    """
+    Watches the mic while LILY speaks. There's no echo cancellation, so the
+    mic hears her too: played() is told every chunk sent to the speaker, and
+    a mic frame only counts while it is BARGE_IN_MARGIN_DB louder than her
+    echo (the loudest of the last few chunks, plus the session's measured
+    coupling) and than the noise floor, held for longer than the Endpointer
+    needs. Until the coupling is known it doesn't fire. feed() returns True
+    once someone is talking over her.
+    """
+
+    def __init__(self, noise_db: float | None, echo: EchoPath, sample_rate: int = SAMPLE_RATE):
+        self.frame = sample_rate * FRAME_MS // 1000
+        self.sample_rate = sample_rate
+        self.threshold = (noise_db if noise_db is not None else MIN_ENERGY_DB) + BARGE_IN_MARGIN_DB
+        self.echo = echo
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._playback: deque[float] = deque(maxlen=BARGE_IN_ECHO_CHUNKS)
+        self._run = 0
+
+    def played(self, samples: np.ndarray, sample_rate: int) -> None:
+        """Records the level of a chunk just written to the speaker."""
+        played_db = level_db(samples, sample_rate)
+        if played_db is not None:
+            self._playback.append(played_db)
+
+    def feed(self, samples: np.ndarray) -> bool:
+        samples = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        n = len(samples) // self.frame
+        self._pending = samples[n * self.frame:].copy()
+        if n == 0:
+            return self._run >= BARGE_IN_FRAMES
+
+        threshold = self.threshold
+        if self._playback:
+            played_db = max(self._playback)
+            if self._run == 0:
+                # Nobody seems to be talking over her, so this is her echo
+                self.echo.measure(level_db(samples[:n * self.frame], self.sample_rate), played_db)
+            coupling_db = self.echo.coupling_db
+            if coupling_db is None:
+                return False
+            threshold = max(threshold, played_db + coupling_db + BARGE_IN_MARGIN_DB)
+
+        energy_db, _ = frame_features(samples[:n * self.frame].reshape(n, self.frame))
+        for loud in energy_db > threshold:
+            self._run = self._run + 1 if loud else 0
+            if self._run >= BARGE_IN_FRAMES:
+                return True
+        return False
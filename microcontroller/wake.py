@@ -0,0 +1,82 @@
+"""
+microcontroller/wake.py  —  wake-word detection at idle
+
+The wake recognizer only knows the wake phrases (anything else decodes to
+[unk]), which makes Vosk's search tiny, and an EnergyGate keeps it from
+decoding at all while the room is quiet. When the gate opens, the few
+blocks just before it are fed first so the start of "hey" isn't clipped.
+"""
+
+import json
+from collections import deque
+
+import numpy as np
+
+from vad import EnergyGate
+
+WAKE_PHRASES = ("hey lily", "hi lily", "okay lily")
+WAKE_GRAMMAR = json.dumps([*WAKE_PHRASES, "[unk]"])
+GATE_PREROLL_BLOCKS = 3      # 300 ms of 100 ms blocks
+
+
+def wake_phrase(result: str) -> str | None:
+    """The wake phrase in a Vosk Result()/PartialResult() JSON string, if any."""
+    if "lily" not in result:          # skip the JSON parse for the common case
+        return None
+    parsed = json.loads(result)
+    text = (parsed.get("text") or parsed.get("partial") or "").lower()
+    return next((phrase for phrase in WAKE_PHRASES if phrase in text), None)
+
+
+class WakeDetector:
+    """
+    Wraps a KaldiRecognizer (ideally built with WAKE_GRAMMAR). feed() takes
+    int16 blocks and returns the wake phrase once it is heard. With no gate
+    every block is decoded.
+    """
+
+    def __init__(self, recognizer, gate: EnergyGate | None = None):
+        self.rec = recognizer
+        self.gate = gate
+        self._recent: deque[np.ndarray] = deque(maxlen=GATE_PREROLL_BLOCKS)
+        self.blocks = 0
+        self.decoded = 0
+        self.reset()
+
+    def reset(self) -> None:
+        self.rec.Reset()
+        self._recent.clear()
+        self._decoding = False
+
+    def _decode(self, samples: np.ndarray) -> str | None:
+        self.decoded += 1
+        if self.rec.AcceptWaveform(samples.tobytes()):
+            return wake_phrase(self.rec.Result())
+        return wake_phrase(self.rec.PartialResult())
+
+    def feed(self, samples: np.ndarray) -> str | None:
+        self.blocks += 1
+        if self.gate is None:
+            return self._decode(samples)
+
+        if not self.gate.update(samples):
+            if self._decoding:
+                # The sound stopped: flush what Vosk has, then sleep again
+                self._decoding = False
+                heard = wake_phrase(self.rec.FinalResult())
+                self.rec.Reset()
+                if heard:
+                    return heard
+            self._recent.append(samples)
+            return None
+
+        if not self._decoding:
+            self._decoding = True
+            for block in self._recent:
+                self._decode(block)
+            self._recent.clear()
+        return self._decode(samples)
+
+    @property
+    def decoded_share(self) -> float:
+        return self.decoded / self.blocks if self.blocks else 0.0
@@ -13,6 +13,7 @@ type UserContextType = {
     signOut: () => Promise<void>
 
     fetchWithAuth: (url: string, options?: RequestInit) => Promise<Response>,
+    getAccessToken: () => Promise<string | null>,
     error: Error | null,
 }
 
@@ -148,6 +149,7 @@ export function UserContextProvider({children} : {children: React.ReactNode}){
         signOut: signOut,
 
         fetchWithAuth: fetchWithAuth,
+        getAccessToken: getAccessToken,
         error: error
     }    
 
@@ -1,15 +1,23 @@
 // mobile/features/convo/convo-context.tsx
 
 import { BASE_URL } from '@/constants/urls';
-import React, { createContext, useContext, useEffect, useState } from 'react';
+import React, { createContext, useContext, useEffect, useRef, useState } from 'react';
 import { useUser } from '../auth/user-context';
 
 const NEEDER_ID = '00000000-0000-0000-0000-000000000001';
-const POLL_MS = 5000;
+const RECONNECT_MAX_MS = 30000;
+
+export type ConvoEvent = {
+    type: 'convo' | 'transcript_item' | 'document' | 'alert' | 'resync' | 'heartbeat';
+    convo_id?: string;
+};
+
+type ConvoEventListener = (event: ConvoEvent) => void;
 
 type ConvoContextType = {
     convoId: string | null;
     isLoading: boolean;
+    subscribe: (listener: ConvoEventListener) => () => void;
 };
 
 const ConvoContext = createContext<ConvoContextType | undefined>(undefined);
@@ -17,7 +25,8 @@ const ConvoContext = createContext<ConvoContextType | undefined>(undefined);
 export function ConvoContextProvider({ children }: { children: React.ReactNode }) {
     const [convoId, setConvoId] = useState<string | null>(null);
     const [isLoading, setIsLoading] = useState(true);
-    const { fetchWithAuth, isLoggedIn } = useUser();
+    const { fetchWithAuth, getAccessToken, isLoggedIn } = useUser();
+    const listeners = useRef(new Set<ConvoEventListener>());
 
     const fetchLatestConvo = async () => {
         try {
@@ -33,18 +42,56 @@ export function ConvoContextProvider({ children }: { children: React.ReactNode }
         }
     };
 
+    const subscribe = (listener: ConvoEventListener) => {
+        listeners.current.add(listener);
+        return () => { listeners.current.delete(listener); };
+    };
+
     useEffect(() => {
         if (!isLoggedIn) return;
 
+        let socket: WebSocket | null = null;
+        let retryTimer: ReturnType<typeof setTimeout> | null = null;
+        let retryMs = 1000;
+        let closed = false;
+
+        // The backend pushes an event whenever the microcontroller writes
+        // something, so we only fetch when told to instead of polling.
+        const connect = async () => {
+            const token = await getAccessToken();
+            if (closed) return;
+            socket = new WebSocket(`${BASE_URL.replace(/^http/, 'ws')}/events/${NEEDER_ID}?token=${encodeURIComponent(token ?? '')}`);
+
+            socket.onopen = () => {
+                retryMs = 1000;
+                // We may have missed events while disconnected
+                fetchLatestConvo();
+                listeners.current.forEach(l => l({ type: 'resync' }));
+            };
+            socket.onmessage = (msg) => {
+                const event = JSON.parse(msg.data) as ConvoEvent;
+                if (event.type === 'convo' && event.convo_id) setConvoId(event.convo_id);
+                listeners.current.forEach(l => l(event));
+            };
+            socket.onclose = () => {
+                if (closed) return;
+                retryTimer = setTimeout(connect, retryMs);
+                retryMs = Math.min(retryMs * 2, RECONNECT_MAX_MS);
+            };
+        };
+
         fetchLatestConvo();
+        connect();
 
-        // Keep polling so the app picks up new convos as the microcontroller creates them
-        const interval = setInterval(fetchLatestConvo, POLL_MS);
-        return () => clearInterval(interval);
+        return () => {
+            closed = true;
+            if (retryTimer) clearTimeout(retryTimer);
+            socket?.close();
+        };
     }, [isLoggedIn]);
 
     return (
-        <ConvoContext.Provider value={{ convoId, isLoading }}>
+        <ConvoContext.Provider value={{ convoId, isLoading, subscribe }}>
             {children}
         </ConvoContext.Provider>
     );
@@ -54,4 +101,4 @@ export const useConvo = () => {
     const ctx = useContext(ConvoContext);
     if (!ctx) throw new Error('useConvo must be inside ConvoContextProvider');
     return ctx;
-};
\ No newline at end of file
+};
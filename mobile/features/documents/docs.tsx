@@ -2,7 +2,7 @@
 
 import { BASE_URL } from '@/constants/urls';
 import { useConvo } from '@/features/convo/convo-context';
-import { useEffect, useRef, useState } from "react";
+import { useEffect, useState } from "react";
 import {
     ActivityIndicator,
     Dimensions,
@@ -36,7 +36,6 @@ const ITEM_WIDTH_CLOSED    = 300;
 const SNAP_INTERVAL_CLOSED = ITEM_WIDTH_CLOSED + ITEM_GAP;
 const ITEM_WIDTH_OPEN      = 200;
 const SNAP_INTERVAL_OPEN   = ITEM_WIDTH_OPEN + ITEM_GAP;
-const POLL_MS              = 5000;
 
 // ─────────────────────────────────────────────────────────────────────────────
 
@@ -48,23 +47,15 @@ export function DocumentScreen() {
     const progress   = useSharedValue(0);
     const scrollRef  = useAnimatedRef<Animated.ScrollView>();
     const currentIdx = useSharedValue(0);
-    const pollRef    = useRef<ReturnType<typeof setInterval> | null>(null);
 
     const { convoId }                               = useConvo();
-    const { documents, alerts, isLoading, refresh } = useConvoData(convoId);
+    const { documents, alerts, isLoading }          = useConvoData(convoId);
 
     const selectedDoc: DocumentData | null    = documents[pageIndex] ?? null;
     const selectedAlerts: AlertData[]         = selectedDoc
         ? alerts.filter(a => a.doc_id === selectedDoc.document_id)
         : [];
 
-    // Poll for new docs while screen is mounted
-    useEffect(() => {
-        if (!convoId) return;
-        pollRef.current = setInterval(refresh, POLL_MS);
-        return () => { if (pollRef.current) clearInterval(pollRef.current); };
-    }, [convoId]);
-
     // Animate open/close
     useEffect(() => {
         progress.value = withTiming(barOpen ? 1 : 0, {
@@ -1,8 +1,9 @@
 // mobile/features/documents/use-convo-data.ts
 
 import { BASE_URL } from '@/constants/urls';
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { useUser } from '../auth/user-context';
+import { useConvo } from '../convo/convo-context';
 
 export type DocumentData = {
     document_id: string;
@@ -10,7 +11,8 @@ export type DocumentData = {
     created_at: string;
     url: string | null;
     overview: string;
-    content: string;
+    content?: string;
+    status: 'pending' | 'done' | 'failed';
 };
 
 export type AlertData = {
@@ -24,25 +26,40 @@ type ConvoData = {
     transcripts: any[];
     alerts: AlertData[];
     documents: DocumentData[];
+    cursor: string;
 };
 
+// Replace rows we already have (e.g. a document that finished processing), append new ones
+function mergeById<T>(current: T[], incoming: T[], key: keyof T): T[] {
+    if (incoming.length === 0) return current;
+    const byId = new Map(current.map(item => [item[key], item]));
+    for (const item of incoming) byId.set(item[key], item);
+    return Array.from(byId.values());
+}
+
 export function useConvoData(convoId: string | null) {
     const { fetchWithAuth } = useUser();
+    const { subscribe } = useConvo();
     const [documents, setDocuments] = useState<DocumentData[]>([]);
     const [alerts, setAlerts] = useState<AlertData[]>([]);
     const [isLoading, setIsLoading] = useState(false);
     const [error, setError] = useState<string | null>(null);
+    const cursorRef = useRef<string | null>(null);
 
     const refresh = async () => {
         if (!convoId) return;
         setIsLoading(true);
         setError(null);
         try {
-            const res = await fetchWithAuth(`${BASE_URL}/convo/${convoId}`);
+            // Only ask for what changed since the last sync; the app never shows `content`
+            const params = new URLSearchParams({ include_content: 'false' });
+            if (cursorRef.current) params.set('since', cursorRef.current);
+            const res = await fetchWithAuth(`${BASE_URL}/convo/${convoId}?${params}`);
             if (!res.ok) throw new Error('Failed to fetch convo data');
             const data: ConvoData = await res.json() as ConvoData;
-            setDocuments(data.documents ?? []);
-            setAlerts(data.alerts ?? []);
+            cursorRef.current = data.cursor;
+            setDocuments(prev => mergeById(prev, data.documents ?? [], 'document_id'));
+            setAlerts(prev => mergeById(prev, data.alerts ?? [], 'alert_id'));
         } catch (e: any) {
             setError(e.message);
         } finally {
@@ -51,8 +68,19 @@ export function useConvoData(convoId: string | null) {
     };
 
     useEffect(() => {
+        cursorRef.current = null;
+        setDocuments([]);
+        setAlerts([]);
         refresh();
     }, [convoId]);
 
+    // Re-sync (a cheap delta fetch) whenever the server says this convo changed
+    useEffect(() => {
+        if (!convoId) return;
+        return subscribe((event) => {
+            if (event.type === 'resync' || event.convo_id === convoId) refresh();
+        });
+    }, [convoId]);
+
     return { documents, alerts, isLoading, error, refresh };
 }
\ No newline at end of file